@@ -0,0 +1,112 @@
+"""Topluluk / alt grup yetki çözümleyici.
+
+Bir kullanıcının bir alt grup ve/veya topluluktaki etkin rolleri memberships
+koleksiyonunda tek sorguyla çözülür ve kısa bir TTL ile bellekte tutulur:
+- Alt grubun topluluğu (değişmez) ayrıca önbelleğe alınır; alt grup
+  dokümanını yüklemeyen uç noktalar da ek sorgu yapmadan topluluk rolünü alır.
+- Rol değiştiren yazmalar (MembershipStore.grant/revoke) bu worker'daki
+  kayıtları hemen geçersiz kılar; çok düğümlü kurulumda geçersizleştirme
+  istemci yöneticisinin kanalıyla diğer düğümlere de duyurulur (server.py).
+  Duyuru kaybolursa diğer worker'lardaki kopyalar en geç TTL sonunda yenilenir.
+Global yönetici bilgisi kullanıcı dokümanından gelir ve önbelleğe alınmaz.
+"""
+import time
+from typing import Dict, Optional, Tuple
+
+from memberships import MembershipStore, ROLE_ADMIN, ROLE_MEMBER, ROLE_SUPER_ADMIN
+
+
+class EffectiveRoles:
+    __slots__ = ('is_member', 'is_group_admin', 'is_super_admin', 'is_global_admin')
+
+    def __init__(self, is_member: bool = False, is_group_admin: bool = False,
+                 is_super_admin: bool = False, is_global_admin: bool = False):
+        self.is_member = is_member
+        self.is_group_admin = is_group_admin
+        self.is_super_admin = is_super_admin
+        self.is_global_admin = is_global_admin
+
+    @property
+    def can_manage_community(self) -> bool:
+        """Süper yönetici veya global yönetici"""
+        return self.is_super_admin or self.is_global_admin
+
+    @property
+    def can_manage_subgroup(self) -> bool:
+        """Grup yöneticisi, süper yönetici veya global yönetici"""
+        return self.is_group_admin or self.can_manage_community
+
+
+class AuthorizationService:
+    def __init__(self, memberships: MembershipStore, ttl: float = 10.0, max_users: int = 10000):
+        self.memberships = memberships
+        self.ttl = ttl
+        self.max_users = max_users
+        # uid -> (subgroup_id, community_id) -> (geçerlilik sonu, alt grup rolleri, topluluk rolleri)
+        self._cache: Dict[str, Dict[Tuple[Optional[str], Optional[str]], tuple]] = {}
+        self._community_of: Dict[str, str] = {}
+        memberships.listeners.append(self.invalidate)
+
+    async def community_of(self, subgroup_id: str) -> Optional[str]:
+        """Alt grubun topluluk ID'si (alt gruplar topluluk değiştirmez)"""
+        community_id = self._community_of.get(subgroup_id)
+        if community_id is None:
+            subgroup = await self.memberships.db.subgroups.find_one(
+                {"id": subgroup_id}, {"_id": 0, "communityId": 1}
+            )
+            if not subgroup:
+                return None
+            community_id = subgroup.get('communityId')
+            if len(self._community_of) >= self.max_users:
+                self._community_of.clear()
+            self._community_of[subgroup_id] = community_id
+        return community_id
+
+    async def roles(self, uid: str, subgroup_id: Optional[str] = None, community_id: Optional[str] = None,
+                    global_admin: bool = False) -> EffectiveRoles:
+        """Kullanıcının alt grup ve/veya topluluktaki etkin rolleri"""
+        if subgroup_id and not community_id:
+            community_id = await self.community_of(subgroup_id)
+
+        key = (subgroup_id, community_id)
+        now = time.monotonic()
+        entry = self._cache.get(uid, {}).get(key)
+        if entry is None or entry[0] <= now:
+            scopes = await self.memberships.roles_by_scope([subgroup_id, community_id], uid)
+            entry = (
+                now + self.ttl,
+                frozenset(scopes.get(subgroup_id, ())),
+                frozenset(scopes.get(community_id, ()))
+            )
+            self._store(uid, key, entry, now)
+
+        _, subgroup_roles, community_roles = entry
+        return EffectiveRoles(
+            is_member=ROLE_MEMBER in (subgroup_roles if subgroup_id else community_roles),
+            is_group_admin=ROLE_ADMIN in subgroup_roles,
+            is_super_admin=ROLE_SUPER_ADMIN in community_roles,
+            is_global_admin=global_admin
+        )
+
+    def _store(self, uid: str, key: tuple, entry: tuple, now: float):
+        if uid not in self._cache and len(self._cache) >= self.max_users:
+            # Süresi dolanları at; yine doluysa önbelleği sıfırla
+            for cached_uid in [u for u, entries in self._cache.items()
+                               if all(e[0] <= now for e in entries.values())]:
+                del self._cache[cached_uid]
+            if len(self._cache) >= self.max_users:
+                self._cache.clear()
+        self._cache.setdefault(uid, {})[key] = entry
+
+    def invalidate(self, scope_id: Optional[str] = None, uid: Optional[str] = None):
+        """Rol değişikliğinde önbelleği temizle (uid verilmezse kapsamın tüm kayıtları)"""
+        if uid is not None:
+            self._cache.pop(uid, None)
+            return
+        if scope_id is None:
+            self._cache.clear()
+            return
+        for entries in self._cache.values():
+            for key in [key for key in entries if scope_id in key]:
+                del entries[key]
+        self._community_of.pop(scope_id, None)
@@ -0,0 +1,161 @@
+"""MongoDB index kayıt defteri.
+
+Her koleksiyonun index'leri burada tanımlanır; uygulama başlarken
+ensure_indexes ile idempotent olarak oluşturulur, verify_indexes ile
+veritabanındaki durumla karşılaştırılır. Yeni bir sorgu şekli eklendiğinde
+index'i de buraya eklenmelidir.
+"""
+import logging
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def _index(keys, **options) -> IndexModel:
+    """İsmi pymongo'nun varsayılan kuralıyla (alan_yön) sabitlenmiş index"""
+    name = options.pop('name', None) or '_'.join(f"{field}_{direction}" for field, direction in keys)
+    return IndexModel(keys, name=name, **options)
+
+
+INDEX_REGISTRY = {
+    "users": [
+        _index([("uid", ASCENDING)], unique=True),
+        _index([("email", ASCENDING)]),
+        _index([("createdAt", DESCENDING)]),
+        # Admin kullanıcı araması (Türkçe katlanmış kelime önekleri, eşitlikle)
+        _index([("searchPrefixes", ASCENDING), ("uid", ASCENDING)]),
+    ],
+    "messages": [
+        _index([("id", ASCENDING)], unique=True),
+        # Alt grup / eski grup / duyuru geçmişi ve keyset sayfalama
+        _index([("groupId", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)]),
+        # Özel sohbet geçmişi ve keyset sayfalama
+        _index([("chatId", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)]),
+        # Sabitlenmiş mesajlar
+        _index([("groupId", ASCENDING), ("isPinned", ASCENDING), ("timestamp", DESCENDING)]),
+        # Mesaj arama: oda + kelime eşitliği, zaman sırasıyla (keyset)
+        _index([("groupId", ASCENDING), ("searchTokens", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)]),
+        _index([("chatId", ASCENDING), ("searchTokens", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)],
+               partialFilterExpression={"chatId": {"$exists": True}}),
+    ],
+    "subgroups": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("communityId", ASCENDING), ("level", ASCENDING)]),
+    ],
+    "communities": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("city", ASCENDING)]),
+        _index([("name", ASCENDING)]),
+        # Admin paneli: en kalabalık topluluklar
+        _index([("memberCount", DESCENDING)]),
+    ],
+    "announcement_channels": [
+        _index([("id", ASCENDING)], unique=True),
+    ],
+    "posts": [
+        _index([("id", ASCENDING)], unique=True),
+        # Akış ve "gönderilerim" keyset sayfalama
+        _index([("timestamp", DESCENDING), ("id", DESCENDING)]),
+        _index([("userId", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "comments": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("postId", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "polls": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("groupId", ASCENDING), ("createdAt", DESCENDING)]),
+    ],
+    "groups": [
+        _index([("id", ASCENDING)], unique=True),
+        _index([("admins", ASCENDING)]),
+    ],
+    "read_states": [
+        # Kullanıcının oda başına tek okundu imleci
+        _index([("uid", ASCENDING), ("roomId", ASCENDING)], unique=True),
+        # Odadaki okundu durumlarını türetmek için
+        _index([("roomId", ASCENDING), ("lastReadAt", DESCENDING)]),
+    ],
+    "memberships": [
+        # Yetki/üyelik kontrolü: kapsamda kullanıcının rolü (tek doküman)
+        _index([("scopeId", ASCENDING), ("uid", ASCENDING), ("role", ASCENDING)], unique=True),
+        # Kapsamın üye/yönetici listesi (uid sırasıyla sayfalama) ve sayımı
+        _index([("scopeId", ASCENDING), ("role", ASCENDING), ("uid", ASCENDING)]),
+        # Kullanıcının toplulukları / alt grupları
+        _index([("uid", ASCENDING), ("scopeType", ASCENDING), ("role", ASCENDING)]),
+    ],
+    "files": [
+        _index([("id", ASCENDING)], unique=True),
+    ],
+    # FILE_STORAGE=gridfs:// ile yüklenen dosyaların parçaları
+    "fs.chunks": [
+        _index([("files_id", ASCENDING), ("n", ASCENDING)], unique=True),
+    ],
+    "room_counters": [
+        # Kullanıcının özel sohbetleri, son mesaja göre
+        _index([("participants", ASCENDING), ("updatedAt", DESCENDING)]),
+    ],
+    "device_tokens": [
+        _index([("token", ASCENDING)], unique=True),
+        # Bildirim alıcılarının token'ları
+        _index([("uid", ASCENDING)]),
+    ],
+    "services": [
+        _index([("timestamp", DESCENDING)]),
+    ],
+}
+
+
+async def ensure_indexes(db) -> dict:
+    """Kayıt defterindeki tüm index'leri oluştur (mevcut olanlara dokunmaz).
+
+    Bir index oluşturulamazsa (ör. unique index için çakışan veri) hata
+    loglanır ve diğer index'lere devam edilir.
+    """
+    failed = {}
+    for collection, models in INDEX_REGISTRY.items():
+        for model in models:
+            try:
+                await db[collection].create_indexes([model])
+            except OperationFailure as e:
+                name = model.document['name']
+                failed.setdefault(collection, []).append(name)
+                logger.error(f"Index oluşturulamadı {collection}.{name}: {e}")
+    return failed
+
+
+async def verify_indexes(db) -> dict:
+    """Veritabanındaki index'leri kayıt defteriyle karşılaştır.
+
+    Her koleksiyon için eksik (missing), fazladan (extra) ve anahtarı/seçenekleri
+    farklı (mismatched) index isimlerini döndürür.
+    """
+    report = {}
+    for collection, models in INDEX_REGISTRY.items():
+        existing = await db[collection].index_information()
+        existing.pop('_id_', None)
+
+        missing, mismatched = [], []
+        for model in models:
+            spec = model.document
+            name = spec['name']
+            current = existing.get(name)
+            if current is None:
+                missing.append(name)
+                continue
+            expected_keys = [(field, direction) for field, direction in spec['key'].items()]
+            if [tuple(k) for k in current['key']] != expected_keys or \
+                    bool(current.get('unique')) != bool(spec.get('unique')):
+                mismatched.append(name)
+
+        expected_names = {model.document['name'] for model in models}
+        extra = sorted(name for name in existing if name not in expected_names)
+
+        report[collection] = {
+            "missing": missing,
+            "extra": extra,
+            "mismatched": mismatched,
+            "ok": not missing and not extra and not mismatched
+        }
+    return report
@@ -0,0 +1,34 @@
+"""Mongo dokümanları için hızlı JSON yanıtı.
+
+Liste uç noktaları dokümanları önce clean_doc ile Python'da alan alan dolaşıp
+datetime/ObjectId dönüştürüyor, FastAPI de ardından jsonable_encoder ile her
+şeyi yeniden kodluyordu. Bunun yerine:
+- _id sorguda projeksiyonla dışlanır ({"_id": 0}),
+- datetime'ları orjson yerel olarak yazar (isoformat ile aynı çıktı),
+  ObjectId gibi kalan BSON tipleri default ile str'ye çevrilir,
+- uç nokta MongoJSONResponse döndürdüğü için jsonable_encoder adımı atlanır.
+"""
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} JSON'a çevrilemez")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class MongoJSONResponse(JSONResponse):
+    """Mongo dokümanlarını (projeksiyonla _id'siz) doğrudan serileştiren yanıt"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
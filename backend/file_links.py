@@ -0,0 +1,95 @@
+"""Yüklenen dosyalar için imzalı, kısa ömürlü bağlantılar.
+
+<img>/<video> etiketleri Authorization başlığı gönderemez. İstemci yetkisi
+kontrol edilen GET /files/{id}/link ile dosyanın ve görsel varyantlarının
+imzalı URL'lerini alır; imza (HMAC-SHA256) yolu ve son geçerlilik anını
+kapsar, süresi dolan bağlantı yeniden istenir. Dokümanlarda imzasız kalıcı
+yol (/api/files/<id>, /api/media/<özet>/<varyant>) saklanır; yanıtlardaki
+dosya alanları (mesaj ekleri, önizlemeler, profil fotoğrafları) istemciye
+gönderilirken imzalanır (sign_fields). Son geçerlilik anı ttl'lik pencerelere
+yuvarlanır; aynı pencerede üretilen URL'ler aynı kalır, tarayıcı önbelleği
+listeler her yüklendiğinde görselleri yeniden indirmez.
+
+İmza anahtarı FILE_URL_SECRET ile verilir; verilmezse ilk açılışta üretilip
+app_secrets koleksiyonunda saklanır, böylece tüm worker'lar aynı anahtarı
+kullanır.
+"""
+import hashlib
+import hmac
+import re
+import secrets
+import time
+from typing import Any, Optional
+from urllib.parse import urlencode
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+SECRET_ID = "file-links"
+
+# Bu sunucuya yüklenen dosyaların göreli URL'leri (/api/files/<id>, /api/media/<özet>/<varyant>)
+LOCAL_FILE_URL_PATTERN = re.compile(r'^/api/(files/[0-9a-f-]{36}|media/[0-9a-f]{64}/[a-z]+)$')
+# Yanıtlarda imzalanan alanlar
+SIGNED_URL_FIELDS = frozenset({
+    "fileUrl", "thumbnailUrl", "previewUrl", "imageUrl", "cvUrl",
+    "profileImageUrl", "profileImageThumbUrl", "senderProfileImage", "userProfileImage"
+})
+
+
+class FileLinkSigner:
+    def __init__(self, secret: Optional[str] = None, ttl: int = 3600):
+        self.ttl = ttl
+        self._key = secret.encode('utf-8') if secret else None
+
+    async def load(self, db):
+        """Anahtar ortamdan verilmediyse veritabanından al (yoksa üret)"""
+        if self._key:
+            return
+        for attempt in range(2):
+            try:
+                doc = await db.app_secrets.find_one_and_update(
+                    {"_id": SECRET_ID},
+                    {"$setOnInsert": {"secret": secrets.token_hex(32)}},
+                    upsert=True, return_document=ReturnDocument.AFTER
+                )
+                break
+            except DuplicateKeyError:
+                # Başka bir worker aynı anda üretti; tekrar dene (bu kez eşleşir)
+                if attempt:
+                    raise
+        self._key = doc['secret'].encode('utf-8')
+
+    def _signature(self, path: str, expires: int) -> str:
+        if self._key is None:
+            raise RuntimeError("Dosya bağlantı anahtarı yüklenmedi")
+        return hmac.new(self._key, f"{path}\n{expires}".encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def sign(self, path: str, now: Optional[float] = None) -> str:
+        """Yolun en az ttl saniye (en çok 2 * ttl) geçerli imzalı hali"""
+        expires = (int(now if now is not None else time.time()) // self.ttl + 2) * self.ttl
+        return f"{path}?{urlencode({'expires': expires, 'signature': self._signature(path, expires)})}"
+
+    def remaining(self, path: str, expires: Optional[int], signature: Optional[str],
+                  now: Optional[float] = None) -> Optional[int]:
+        """İmza geçerliyse kalan süre (saniye), değilse veya süresi dolduysa None"""
+        if expires is None or not signature or self._key is None:
+            return None
+        left = expires - int(now if now is not None else time.time())
+        if left <= 0 or not hmac.compare_digest(self._signature(path, expires), signature):
+            return None
+        return left
+
+    def sign_fields(self, content: Any) -> Any:
+        """Doküman/listelerdeki SIGNED_URL_FIELDS alanlarında duran yerel yolları imzala"""
+        if self._key is None:
+            return content
+        if isinstance(content, list):
+            return [self.sign_fields(item) for item in content]
+        if isinstance(content, dict):
+            return {
+                key: self.sign(value)
+                if key in SIGNED_URL_FIELDS and isinstance(value, str) and LOCAL_FILE_URL_PATTERN.match(value)
+                else self.sign_fields(value)
+                for key, value in content.items()
+            }
+        return content
@@ -0,0 +1,188 @@
+"""Dosya depolama arka uçları.
+
+Yüklemeler parça parça (resumable) gelir: her istek gövdesi, depoda kayıtlı
+son ofsetten devam eder ve doğrudan depoya akıtılır; dosyanın tamamı hiçbir
+zaman bellekte tutulmaz. İndirmeler bayt aralığı okuyabilir (Range).
+
+FILE_STORAGE ile seçilir:
+- boş veya local:///dizin -> yerel disk (varsayılan backend/uploads)
+- gridfs:// veya gridfs://<bucket> -> MongoDB GridFS (birden fazla pod için)
+
+Yarıda kalan bir yazma, kayıtlı ofsetin ötesine veri bırakmış olabilir;
+append() her zaman verilen ofsetten itibaren üzerine yazar, fazlası atılır.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+from bson import Binary
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 256 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Tek aralıklı 'bytes=a-b', 'bytes=a-' veya 'bytes=-n' -> (başlangıç, bitiş); geçersizse None"""
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    first, _, last = spec.strip().partition('-')
+    try:
+        if not first:
+            suffix = int(last)
+            return (max(size - suffix, 0), size - 1) if suffix > 0 else None
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return None
+    return start, end
+
+
+class LocalStorage:
+    """Yerel disk; yazma/okuma thread havuzunda, event loop bloklanmaz"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    async def append(self, key: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Parçaları ofsetten itibaren yaz, yeni boyutu döndür"""
+        path = self._path(key)
+        f = await asyncio.to_thread(open, path, 'r+b' if path.exists() else 'w+b')
+        try:
+            await asyncio.to_thread(f.truncate, offset)
+            await asyncio.to_thread(f.seek, offset)
+            buffer = bytearray()
+            async for chunk in chunks:
+                buffer += chunk
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    await asyncio.to_thread(f.write, bytes(buffer))
+                    offset += len(buffer)
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(f.write, bytes(buffer))
+                offset += len(buffer)
+        finally:
+            await asyncio.to_thread(f.close)
+        return offset
+
+    async def commit(self, key: str, size: int, filename: str, content_type: str):
+        """Yükleme tamamlandı (yerel diskte ek işlem gerekmez)"""
+
+    async def read(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """[start, end] aralığını (end dahil) parça parça oku"""
+        f = await asyncio.to_thread(open, self._path(key), 'rb')
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def delete(self, key: str):
+        try:
+            await asyncio.to_thread(os.remove, self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class GridFSStorage:
+    """GridFS biçiminde (files + chunks) MongoDB'de depolama.
+
+    Parçalar sabit chunkSize'lık dokümanlar olarak yazılır; istek sonundaki
+    eksik parça da kaydedilir ve bir sonraki istek onu tamamlar. files
+    dokümanı yükleme bitince eklenir, böylece standart GridFS araçları da
+    dosyayı okuyabilir.
+    """
+
+    chunk_size = 255 * 1024
+
+    def __init__(self, db, bucket: str = 'fs'):
+        self.files = db[f'{bucket}.files']
+        self.chunks = db[f'{bucket}.chunks']
+
+    async def append(self, key: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        n, partial = divmod(offset, self.chunk_size)
+        buffer = bytearray()
+        if partial:
+            doc = await self.chunks.find_one({"files_id": key, "n": n}, {"_id": 0, "data": 1})
+            if not doc or len(doc['data']) < partial:
+                raise ValueError(f"{key} için {offset} ofsetinde eksik parça")
+            buffer += doc['data'][:partial]
+
+        async for chunk in chunks:
+            buffer += chunk
+            while len(buffer) >= self.chunk_size:
+                await self._write_chunk(key, n, buffer[:self.chunk_size])
+                del buffer[:self.chunk_size]
+                n += 1
+        last = n
+        if buffer:
+            await self._write_chunk(key, n, buffer)
+        else:
+            last = n - 1
+        # Yarıda kalmış eski yazmalardan kalan parçalar
+        await self.chunks.delete_many({"files_id": key, "n": {"$gt": last}})
+        return n * self.chunk_size + len(buffer)
+
+    async def _write_chunk(self, key: str, n: int, data: bytearray):
+        await self.chunks.replace_one(
+            {"files_id": key, "n": n},
+            {"files_id": key, "n": n, "data": Binary(bytes(data))},
+            upsert=True
+        )
+
+    async def commit(self, key: str, size: int, filename: str, content_type: str):
+        await self.files.replace_one({"_id": key}, {
+            "_id": key,
+            "length": size,
+            "chunkSize": self.chunk_size,
+            "uploadDate": datetime.utcnow(),
+            "filename": filename,
+            "metadata": {"contentType": content_type}
+        }, upsert=True)
+
+    async def read(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        first, last = start // self.chunk_size, end // self.chunk_size
+        cursor = self.chunks.find(
+            {"files_id": key, "n": {"$gte": first, "$lte": last}}, {"_id": 0, "n": 1, "data": 1}
+        ).sort("n", 1)
+        async for doc in cursor:
+            base = doc['n'] * self.chunk_size
+            data = doc['data']
+            yield bytes(data[max(start - base, 0):end - base + 1])
+
+    async def delete(self, key: str):
+        await self.chunks.delete_many({"files_id": key})
+        await self.files.delete_one({"_id": key})
+
+
+def create_storage(db, url=None, default_root=None):
+    """FILE_STORAGE'a göre depolama arka ucunu oluştur"""
+    url = url if url is not None else os.environ.get('FILE_STORAGE', '')
+    scheme, _, location = url.partition('://') if url else ('local', '', '')
+    scheme = scheme.lower()
+    if scheme == 'local':
+        storage = LocalStorage(location or default_root)
+    elif scheme == 'gridfs':
+        storage = GridFSStorage(db, location or 'fs')
+    else:
+        raise ValueError(f"Desteklenmeyen dosya deposu: {scheme}")
+
+    logger.info(f"Dosya deposu: {scheme}")
+    return storage
@@ -1,9 +1,11 @@
 import firebase_admin
 from firebase_admin import credentials, auth
 from pathlib import Path
+from token_verifier import TokenVerifier
 
 # Initialize Firebase Admin SDK with service account
 service_account_path = Path(__file__).parent / 'firebase-service-account.json'
+FIREBASE_PROJECT_ID = 'networksolution-a9480'
 
 try:
     # Check if already initialized
@@ -12,7 +14,7 @@ except ValueError:
     # Initialize with service account credentials
     cred = credentials.Certificate(str(service_account_path))
     firebase_admin.initialize_app(cred, {
-        'projectId': 'networksolution-a9480',
+        'projectId': FIREBASE_PROJECT_ID,
         'storageBucket': 'networksolution-a9480.firebasestorage.app'
     })
 
@@ -29,3 +31,6 @@ def verify_firebase_token(token: str):
         raise Exception(f"Invalid token: {str(e)}")
     except Exception as e:
         raise Exception(f"Token verification failed: {str(e)}")
+
+# Önbellekli, event loop'u bloklamayan doğrulayıcı (get_current_user bunu kullanır)
+token_verifier = TokenVerifier(FIREBASE_PROJECT_ID)
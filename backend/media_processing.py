@@ -0,0 +1,170 @@
+"""Yüklenen dosyalar için içerik adresli depolama ve görsel varyantları.
+
+Tamamlanan her yüklemenin SHA-256 özeti hesaplanır. Aynı içerik daha önce
+yüklendiyse (ör. tekrar gönderilen bir fotoğraf) yeni kopya silinir ve dosya
+var olan blob'a bağlanır; blob'lar media_blobs koleksiyonunda özetle
+(_id) tutulur. Görseller için sabit boyutlu varyantlar (thumb, preview) bir
+process havuzunda üretilir; çözme/ölçekleme event loop'u ve diğer istekleri
+bloklamaz. Varyantlar blob başına bir kez üretilir.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Varyant adı -> en uzun kenar (px)
+VARIANT_SIZES = {"thumb": 160, "preview": 640}
+# Varyant adı -> istemciye dönen alan
+VARIANT_FIELDS = {"thumb": "thumbnailUrl", "preview": "previewUrl"}
+MAX_SOURCE_BYTES = 25 * 1024 * 1024  # Bundan büyük görseller için varyant üretilmez
+MAX_SOURCE_PIXELS = 50_000_000  # Sıkıştırma bombalarına karşı
+
+
+def render_variants(data: bytes, sizes: Dict[str, int]) -> Dict[str, tuple]:
+    """Worker process'te çalışır: {ad: (bayt, genişlik, yükseklik, mime)}"""
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {}
+    for name, edge in sizes.items():
+        variant = image.copy()
+        variant.thumbnail((edge, edge), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if has_alpha:
+            variant.save(buffer, 'WEBP', quality=80)
+            mime_type = 'image/webp'
+        else:
+            variant.save(buffer, 'JPEG', quality=80, optimize=True, progressive=True)
+            mime_type = 'image/jpeg'
+        variants[name] = (buffer.getvalue(), variant.width, variant.height, mime_type)
+    return variants
+
+
+def variant_urls(blob_hash: Optional[str], variants: Optional[dict]) -> dict:
+    """Varyantların istemciye dönen URL alanları (thumbnailUrl, previewUrl)"""
+    if not blob_hash or not variants:
+        return {}
+    return {
+        VARIANT_FIELDS[name]: f"/api/media/{blob_hash}/{name}"
+        for name in variants if name in VARIANT_FIELDS
+    }
+
+
+class MediaProcessor:
+    def __init__(self, db, storage, workers: int = None):
+        self.blobs = db.media_blobs
+        self.storage = storage
+        self.workers = workers or int(os.environ.get('MEDIA_WORKERS', '2'))
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        if self._pool is None:
+            # spawn: worker'lar sunucunun event loop'unu/bağlantılarını kopyalamaz
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+            )
+
+    async def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def process(self, storage_key: str, size: int, mime_type: str) -> dict:
+        """Yüklemeyi blob'a bağla, görselse varyantları üret.
+
+        {blobHash, storageKey, variants} döner; storageKey, içerik daha önce
+        yüklendiyse var olan blob'un anahtarıdır.
+        """
+        is_image = (mime_type or '').startswith('image/') and mime_type != 'image/svg+xml'
+        keep_data = is_image and size <= MAX_SOURCE_BYTES
+        digest, data = await self._digest(storage_key, size, keep_data)
+
+        blob = await self._link_blob(digest, storage_key, size, mime_type)
+        if blob['storageKey'] != storage_key:
+            # Aynı içerik zaten depoda; yeni kopyaya gerek yok
+            await self.storage.delete(storage_key)
+
+        variants = blob.get('variants')
+        if variants is None and data is not None:
+            variants = await self._render(digest, data)
+            await self.blobs.update_one({"_id": digest}, {"$set": {"variants": variants}})
+
+        return {"blobHash": digest, "storageKey": blob['storageKey'], "variants": variants or {}}
+
+    async def variant(self, blob_hash: str, name: str) -> Optional[dict]:
+        blob = await self.blobs.find_one({"_id": blob_hash}, {f"variants.{name}": 1})
+        return ((blob or {}).get('variants') or {}).get(name)
+
+    async def _digest(self, storage_key: str, size: int, keep_data: bool):
+        sha = hashlib.sha256()
+        data = bytearray() if keep_data else None
+        async for chunk in self.storage.read(storage_key, 0, size - 1):
+            sha.update(chunk)
+            if data is not None:
+                data += chunk
+        return sha.hexdigest(), (bytes(data) if data is not None else None)
+
+    async def _link_blob(self, digest: str, storage_key: str, size: int, mime_type: str) -> dict:
+        for attempt in range(2):
+            try:
+                return await self.blobs.find_one_and_update(
+                    {"_id": digest},
+                    {
+                        "$setOnInsert": {
+                            "storageKey": storage_key,
+                            "size": size,
+                            "mimeType": mime_type,
+                            "createdAt": datetime.utcnow()
+                        },
+                        "$inc": {"refCount": 1}
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Aynı içerik eşzamanlı yüklendi; tekrar dene (bu kez eşleşir)
+                if attempt:
+                    raise
+
+    async def _render(self, digest: str, data: bytes) -> dict:
+        self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            rendered = await loop.run_in_executor(self._pool, render_variants, data, VARIANT_SIZES)
+        except Exception as e:
+            # Bozuk/desteklenmeyen görsel: orijinal yine de sunulur
+            logger.warning(f"Görsel varyantları üretilemedi ({digest}): {e}")
+            return {}
+
+        variants = {}
+        for name, (content, width, height, mime_type) in rendered.items():
+            key = f"{digest}-{name}"
+            await self.storage.append(key, 0, _single(content))
+            await self.storage.commit(key, len(content), f"{name}.{mime_type.split('/')[1]}", mime_type)
+            variants[name] = {
+                "storageKey": key,
+                "width": width,
+                "height": height,
+                "size": len(content),
+                "mimeType": mime_type
+            }
+        return variants
+
+
+async def _single(content: bytes):
+    yield content
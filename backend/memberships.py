@@ -0,0 +1,438 @@
+"""Topluluk ve alt grup üyelikleri.
+
+Üyelikler, topluluk/alt grup dokümanlarındaki sınırsız büyüyen diziler
+(members, superAdmins, groupAdmins) yerine memberships koleksiyonunda
+(scopeId, uid, role) başına bir doküman olarak tutulur:
+- yetki kontrolleri index üzerinden tek doküman varlık sorgusudur,
+- üye listeleri uid sırasıyla sayfalanır,
+- üye sayısı kapsam dokümanındaki memberCount alanında tutulur.
+
+Geçiş (online): migrate() gömülü dizileri toplu upsert ile bu koleksiyona
+kopyalar ve dokümanı membershipsMigratedAt ile işaretler. Geçiş süresince
+yazmalar hem koleksiyona hem dizilere yapılır (embedded=True). Diziler
+kullanılmadığında MEMBERSHIP_EMBEDDED_ARRAYS=false ile dizilere yazma
+durdurulur ve migrate(drop_embedded=True) dizileri dokümanlardan kaldırır.
+
+Geçiş tek bir worker'da sürerken diğerleri istek karşılar: henüz
+taşınmamış (membershipsMigratedAt'sız) kapsamlar için okumalar gömülü
+dizilere de bakar. Bir kapsam tipinde taşınmamış doküman kalmadığında bu
+geri dönüş kalıcı olarak kapanır.
+"""
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+SCOPE_COMMUNITY = 'community'
+SCOPE_SUBGROUP = 'subgroup'
+
+ROLE_MEMBER = 'member'
+ROLE_ADMIN = 'admin'  # Alt grup yöneticisi (groupAdmins)
+ROLE_SUPER_ADMIN = 'superAdmin'  # Topluluk süper yöneticisi (superAdmins)
+
+# Kapsam tipi -> (koleksiyon, {rol: gömülü dizi alanı})
+SCOPES = {
+    SCOPE_COMMUNITY: ("communities", {ROLE_MEMBER: "members", ROLE_SUPER_ADMIN: "superAdmins"}),
+    SCOPE_SUBGROUP: ("subgroups", {ROLE_MEMBER: "members", ROLE_ADMIN: "groupAdmins"}),
+}
+
+MEMBER_PAGE_LIMIT = 100
+MIGRATION_CHECK_INTERVAL = 5.0  # Taşınmamış kapsam kalıp kalmadığının yeniden kontrolü (sn)
+NOT_MIGRATED = {"membershipsMigratedAt": {"$exists": False}}
+
+
+class MembershipStore:
+    def __init__(self, db, embedded: bool = True):
+        self.db = db
+        self.collection = db.memberships
+        self.embedded = embedded
+        # Rol değişikliklerinde (scope_id, uid) ile çağrılır (ör. yetki önbelleği)
+        self.listeners: List[Callable[[Optional[str], Optional[str]], None]] = []
+        # Geçişi tamamlanmış kapsam tipleri ve son kontrol zamanları
+        self._migrated: Set[str] = set()
+        self._migration_checked_at: Dict[str, float] = {}
+
+    def _notify(self, scope_id: Optional[str], uid: Optional[str]):
+        for listener in self.listeners:
+            listener(scope_id, uid)
+
+    def _scope_collection(self, scope_type: str):
+        return self.db[SCOPES[scope_type][0]]
+
+    @staticmethod
+    def _array_field(scope_type: str, role: str) -> Optional[str]:
+        return SCOPES[scope_type][1].get(role)
+
+    # ---------- geçiş sırasında gömülü diziler ----------
+
+    async def pending_scope_types(self) -> List[str]:
+        """Henüz taşınmamış dokümanı olan kapsam tipleri (kısa aralıklarla kontrol edilir)"""
+        now = time.monotonic()
+        pending = []
+        for scope_type in SCOPES:
+            if scope_type in self._migrated:
+                continue
+            checked_at = self._migration_checked_at.get(scope_type)
+            if checked_at is None or now - checked_at >= MIGRATION_CHECK_INTERVAL:
+                self._migration_checked_at[scope_type] = now
+                if await self._scope_collection(scope_type).find_one(NOT_MIGRATED, {"_id": 1}) is None:
+                    self._migrated.add(scope_type)
+                    continue
+            pending.append(scope_type)
+        return pending
+
+    async def _embedded_roles(self, scope_ids: List[str], uid: str) -> Dict[str, Set[str]]:
+        """Taşınmamış kapsamlarda kullanıcının gömülü dizilerdeki rolleri"""
+        roles: Dict[str, Set[str]] = {}
+        for scope_type in await self.pending_scope_types():
+            role_fields = SCOPES[scope_type][1]
+            # Yalnızca kullanıcının kendisi döner; büyük diziler taşınmaz
+            cursor = self._scope_collection(scope_type).find(
+                {"id": {"$in": scope_ids}, **NOT_MIGRATED, "$or": [{field: uid} for field in role_fields.values()]},
+                {"_id": 0, "id": 1, **{field: {"$elemMatch": {"$eq": uid}} for field in role_fields.values()}}
+            )
+            async for doc in cursor:
+                roles.setdefault(doc['id'], set()).update(
+                    role for role, field in role_fields.items() if doc.get(field)
+                )
+        return roles
+
+    async def _embedded_uids(self, scope_id: str, role: str) -> Optional[List[str]]:
+        """Kapsam taşınmamışsa roldeki gömülü uid dizisi, taşınmışsa None"""
+        for scope_type in await self.pending_scope_types():
+            field = self._array_field(scope_type, role)
+            if not field:
+                continue
+            doc = await self._scope_collection(scope_type).find_one(
+                {"id": scope_id, **NOT_MIGRATED}, {"_id": 0, field: 1}
+            )
+            if doc is not None:
+                return doc.get(field) or []
+        return None
+
+    async def _update_unmigrated_arrays(self, scope_type: str, scope_ids: List[str], update: dict):
+        """Dizilere artık yazılmasa da taşınmamış kapsamların dizileri güncel tutulur
+        (geçiş onları kopyalar, geri dönüş okumaları onlara bakar)"""
+        if scope_type in await self.pending_scope_types():
+            await self._scope_collection(scope_type).update_many(
+                {"id": {"$in": list(scope_ids)}, **NOT_MIGRATED}, update
+            )
+
+    # ---------- okuma ----------
+
+    async def has_role(self, scope_id: str, uid: str, roles=ROLE_MEMBER) -> bool:
+        """Kullanıcının kapsamda verilen rol(ler)den biri var mı (index'li varlık sorgusu)"""
+        roles = list(roles) if isinstance(roles, (list, tuple, set)) else [roles]
+        doc = await self.collection.find_one(
+            {"scopeId": scope_id, "uid": uid, "role": {"$in": roles}}, {"_id": 1}
+        )
+        if doc is not None:
+            return True
+        embedded = await self._embedded_roles([scope_id], uid)
+        return bool(embedded.get(scope_id, set()) & set(roles))
+
+    async def roles_by_scope(self, scope_ids: Iterable[str], uid: str) -> Dict[str, Set[str]]:
+        """Birden fazla kapsamda kullanıcının rolleri (tek sorgu)"""
+        scope_ids = [scope_id for scope_id in scope_ids if scope_id]
+        roles: Dict[str, Set[str]] = {scope_id: set() for scope_id in scope_ids}
+        if not scope_ids:
+            return roles
+        cursor = self.collection.find(
+            {"uid": uid, "scopeId": {"$in": scope_ids}}, {"_id": 0, "scopeId": 1, "role": 1}
+        )
+        async for doc in cursor:
+            roles[doc['scopeId']].add(doc['role'])
+        for scope_id, embedded in (await self._embedded_roles(scope_ids, uid)).items():
+            roles[scope_id] |= embedded
+        return roles
+
+    async def scope_ids_for_user(self, uid: str, scope_type: str, role: str = ROLE_MEMBER) -> List[str]:
+        docs = await self.collection.find(
+            {"uid": uid, "scopeType": scope_type, "role": role}, {"_id": 0, "scopeId": 1}
+        ).to_list(None)
+        scope_ids = [doc['scopeId'] for doc in docs]
+        field = self._array_field(scope_type, role)
+        if field and scope_type in await self.pending_scope_types():
+            scope_ids += await self._scope_collection(scope_type).distinct(
+                "id", {field: uid, **NOT_MIGRATED, "id": {"$nin": scope_ids}}
+            )
+        return scope_ids
+
+    async def list_uids(self, scope_id: str, role: str = ROLE_MEMBER, after: Optional[str] = None,
+                        limit: int = MEMBER_PAGE_LIMIT) -> Tuple[List[str], Optional[str]]:
+        """Kapsamdaki üyelerin uid'leri, uid sırasıyla sayfalı: (uid'ler, sonraki imleç)"""
+        query = {"scopeId": scope_id, "role": role}
+        if after:
+            query["uid"] = {"$gt": after}
+        docs = await self.collection.find(query, {"_id": 0, "uid": 1}).sort("uid", 1).limit(limit + 1).to_list(limit + 1)
+        found = [doc['uid'] for doc in docs]
+        embedded = await self._embedded_uids(scope_id, role)
+        if embedded is not None:
+            # Taşınmamış kapsam: kısmen kopyalanmış koleksiyonla gömülü dizinin birleşimi
+            found = sorted(set(found) | {uid for uid in embedded if not after or uid > after})[:limit + 1]
+        uids = found[:limit]
+        return uids, (uids[-1] if len(found) > limit else None)
+
+    async def uids_with_role(self, scope_id: str, uids: Iterable[str], role: str) -> Set[str]:
+        """Verilen kullanıcılardan kapsamda rolü olanlar (sayfadaki üyeler için tek sorgu)"""
+        uids = list(uids)
+        docs = await self.collection.find(
+            {"scopeId": scope_id, "role": role, "uid": {"$in": uids}}, {"_id": 0, "uid": 1}
+        ).to_list(None)
+        found = {doc['uid'] for doc in docs}
+        embedded = await self._embedded_uids(scope_id, role)
+        if embedded is not None:
+            found |= set(embedded) & set(uids)
+        return found
+
+    async def uids_by_scope(self, scope_ids: Iterable[str], role: str) -> Dict[str, List[str]]:
+        """Birden fazla kapsamda roldeki kullanıcılar (tek sorgu; yönetici listeleri gibi küçük roller için)"""
+        uids: Dict[str, List[str]] = {}
+        cursor = self.collection.find(
+            {"scopeId": {"$in": list(scope_ids)}, "role": role}, {"_id": 0, "scopeId": 1, "uid": 1}
+        )
+        async for doc in cursor:
+            uids.setdefault(doc['scopeId'], []).append(doc['uid'])
+        return uids
+
+    async def count(self, scope_id: str, role: str = ROLE_MEMBER) -> int:
+        return await self.collection.count_documents({"scopeId": scope_id, "role": role})
+
+    async def counts(self, scope_ids: Iterable[str], role: str) -> Dict[str, int]:
+        """Birden fazla kapsamda roldeki kişi sayısı (tek aggregation)"""
+        pipeline = [
+            {"$match": {"scopeId": {"$in": list(scope_ids)}, "role": role}},
+            {"$group": {"_id": "$scopeId", "count": {"$sum": 1}}}
+        ]
+        return {doc['_id']: doc['count'] async for doc in self.collection.aggregate(pipeline)}
+
+    # ---------- yazma ----------
+
+    async def grant(self, scope_type: str, scope_id: str, uid: str, role: str = ROLE_MEMBER) -> bool:
+        """Rolü ver; yeni verildiyse True. Üye rolünde memberCount artırılır."""
+        try:
+            result = await self.collection.update_one(
+                {"scopeId": scope_id, "uid": uid, "role": role},
+                {"$setOnInsert": {"scopeType": scope_type, "createdAt": datetime.utcnow()}},
+                upsert=True
+            )
+            granted = result.upserted_id is not None
+        except DuplicateKeyError:
+            granted = False
+        self._notify(scope_id, uid)
+
+        collection = self._scope_collection(scope_type)
+        if granted and role == ROLE_MEMBER:
+            # Taşınmamış kapsamda kullanıcı gömülü dizide zaten olabilir; sayaç
+            # geçişte diziden yazılır, öncesinde artırılmaz
+            await collection.update_one(
+                {"id": scope_id, "membershipsMigratedAt": {"$exists": True}}, {"$inc": {"memberCount": 1}}
+            )
+        field = self._array_field(scope_type, role)
+        if self.embedded and field:
+            await collection.update_one({"id": scope_id}, {"$addToSet": {field: uid}})
+        elif field:
+            await self._update_unmigrated_arrays(scope_type, [scope_id], {"$addToSet": {field: uid}})
+        return granted
+
+    async def revoke(self, scope_type: str, scope_id: str, uid: str, roles: Iterable[str] = None) -> Set[str]:
+        """Rolleri (varsayılan: hepsi) geri al; gerçekten kaldırılan rolleri döndürür"""
+        roles = list(roles or SCOPES[scope_type][1].keys())
+        removed = set()
+        for role in roles:
+            result = await self.collection.delete_one({"scopeId": scope_id, "uid": uid, "role": role})
+            if result.deleted_count:
+                removed.add(role)
+        self._notify(scope_id, uid)
+
+        collection = self._scope_collection(scope_type)
+        if ROLE_MEMBER in removed:
+            await collection.update_one(
+                {"id": scope_id, "membershipsMigratedAt": {"$exists": True}}, {"$inc": {"memberCount": -1}}
+            )
+        fields = [self._array_field(scope_type, role) for role in roles]
+        if self.embedded and any(fields):
+            await collection.update_one({"id": scope_id}, {"$pull": {field: uid for field in fields if field}})
+        elif any(fields):
+            await self._update_unmigrated_arrays(scope_type, [scope_id], {"$pull": {field: uid for field in fields if field}})
+        return removed
+
+    async def grant_many(self, scope_type: str, scope_ids: Iterable[str], uid: str, role: str = ROLE_MEMBER) -> List[str]:
+        """Birden fazla kapsamda rolü tek bulk yazmayla ver; rolün yeni verildiği kapsamları döndürür"""
+        scope_ids = list(dict.fromkeys(scope_ids))
+        if not scope_ids:
+            return []
+        inserted = await self._bulk_upsert([
+            UpdateOne(
+                {"scopeId": scope_id, "uid": uid, "role": role},
+                {"$setOnInsert": {"scopeType": scope_type, "createdAt": datetime.utcnow()}},
+                upsert=True
+            )
+            for scope_id in scope_ids
+        ])
+        self._notify(None, uid)
+
+        collection = self._scope_collection(scope_type)
+        granted = [scope_ids[index] for index in inserted]
+        if granted and role == ROLE_MEMBER:
+            await collection.update_many(
+                {"id": {"$in": granted}, "membershipsMigratedAt": {"$exists": True}}, {"$inc": {"memberCount": 1}}
+            )
+        field = self._array_field(scope_type, role)
+        if self.embedded and field:
+            await collection.update_many({"id": {"$in": scope_ids}}, {"$addToSet": {field: uid}})
+        elif field:
+            await self._update_unmigrated_arrays(scope_type, scope_ids, {"$addToSet": {field: uid}})
+        return granted
+
+    async def grant_all(self, scope_type: str, query: dict, uid: str, role: str = ROLE_MEMBER) -> List[str]:
+        """Sorguya uyan tüm kapsamlarda rolü ver; rolün yeni verildiği kapsamları döndürür"""
+        scope_ids = await self._scope_collection(scope_type).distinct("id", query)
+        return await self.grant_many(scope_type, scope_ids, uid, role)
+
+    async def revoke_all(self, scope_type: str, query: dict, uid: str, roles: Iterable[str] = None):
+        """Sorguya uyan kapsamlardan (ör. tüm alt gruplar) kullanıcının rollerini kaldır"""
+        roles = list(roles or SCOPES[scope_type][1].keys())
+        membership_query = {"uid": uid, "scopeType": scope_type, "role": {"$in": roles}}
+        if isinstance(query.get("id"), str):
+            membership_query["scopeId"] = query["id"]
+        scope_ids = await self.collection.distinct("scopeId", membership_query)
+        if scope_ids and set(query) - {"id"}:
+            scope_ids = await self._scope_collection(scope_type).distinct("id", {**query, "id": {"$in": scope_ids}})
+        for scope_id in scope_ids:
+            await self.revoke(scope_type, scope_id, uid, roles)
+
+    def _prepare_scope(self, scope_type: str, doc: dict) -> Dict[str, List[str]]:
+        """Yeni kapsam dokümanının ilk rollerini ayır ve sayaç/geçiş alanlarını ekle"""
+        role_fields = SCOPES[scope_type][1]
+        roles = {role: [uid for uid in doc.get(field) or [] if uid] for role, field in role_fields.items()}
+        if not self.embedded:
+            for field in role_fields.values():
+                doc.pop(field, None)
+        doc['memberCount'] = len(set(roles[ROLE_MEMBER]))
+        doc['membershipsMigratedAt'] = datetime.utcnow()
+        return roles
+
+    async def _write_initial_roles(self, scope_type: str, scopes: List[Tuple[str, Dict[str, List[str]]]]):
+        operations = [
+            UpdateOne(
+                {"scopeId": scope_id, "uid": uid, "role": role},
+                {"$setOnInsert": {"scopeType": scope_type, "createdAt": datetime.utcnow()}},
+                upsert=True
+            )
+            for scope_id, roles in scopes for role, uids in roles.items() for uid in uids
+        ]
+        if operations:
+            await self._bulk_upsert(operations)
+
+    async def insert_scope(self, scope_type: str, doc: dict):
+        """Yeni topluluk/alt grubu ekle; dokümandaki ilk üye dizilerini memberships'e yaz"""
+        roles = self._prepare_scope(scope_type, doc)
+        await self._scope_collection(scope_type).insert_one(doc)
+        await self._write_initial_roles(scope_type, [(doc['id'], roles)])
+
+    async def insert_missing_scopes(self, scope_type: str, docs: List[dict]) -> List[str]:
+        """Deterministik id'li kapsamlardan eksik olanları tek bulk upsert ile ekle.
+
+        Var olan dokümanlara dokunulmaz (idempotent); yalnızca yeni eklenenlerin
+        ilk üyelikleri yazılır. Eklenen kapsamların id'lerini döndürür.
+        """
+        if not docs:
+            return []
+        prepared = [(doc, self._prepare_scope(scope_type, doc)) for doc in docs]
+        operations = [
+            UpdateOne(
+                {"id": doc['id']},
+                {"$setOnInsert": {k: v for k, v in doc.items() if k != 'id'}},
+                upsert=True
+            )
+            for doc, _ in prepared
+        ]
+        inserted = await self._bulk_upsert(operations, self._scope_collection(scope_type))
+        new_scopes = [(prepared[index][0]['id'], prepared[index][1]) for index in inserted]
+        await self._write_initial_roles(scope_type, new_scopes)
+        return [scope_id for scope_id, _ in new_scopes]
+
+    async def delete_scope(self, scope_id: str):
+        """Silinen topluluk/alt grubun tüm üyeliklerini kaldır"""
+        await self.collection.delete_many({"scopeId": scope_id})
+        self._notify(scope_id, None)
+
+    async def _bulk_upsert(self, operations, collection=None) -> List[int]:
+        """Sırasız bulk upsert; yeni eklenen işlemlerin sıra numaralarını döndürür"""
+        collection = collection if collection is not None else self.collection
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            return sorted(result.upserted_ids)
+        except BulkWriteError as e:
+            # Eşzamanlı upsert'lerden gelen çakışmalar zararsız
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+            return sorted(item['index'] for item in e.details.get('upserted', []))
+
+    # ---------- geçiş ----------
+
+    async def migrate(self, scope_type: str, batch_size: int = 100, drop_embedded: bool = False,
+                      task=None) -> int:
+        """Gömülü dizileri memberships'e kopyala (idempotent, yarıda kalırsa devam eder).
+
+        Geçiş sırasında diziden çıkarılan üyelerin tekrar eklenmemesi için
+        kopyalamadan sonra dizi yeniden okunur ve artık bulunmayanlar silinir.
+        task (StartupTask) verilirse kirası her partiden sonra uzatılır; kira
+        başka bir sürece geçtiyse geçiş orada bırakılır.
+        """
+        collection = self._scope_collection(scope_type)
+        role_fields = SCOPES[scope_type][1]
+        projection = {"_id": 0, "id": 1, **{field: 1 for field in role_fields.values()}}
+        migrated = 0
+
+        while True:
+            docs = await collection.find(
+                {"membershipsMigratedAt": {"$exists": False}}, projection
+            ).limit(batch_size).to_list(batch_size)
+            if not docs:
+                break
+
+            for doc in docs:
+                snapshot = {role: set(doc.get(field) or []) for role, field in role_fields.items()}
+                operations = [
+                    UpdateOne(
+                        {"scopeId": doc['id'], "uid": uid, "role": role},
+                        {"$setOnInsert": {"scopeType": scope_type, "createdAt": datetime.utcnow()}},
+                        upsert=True
+                    )
+                    for role, uids in snapshot.items() for uid in uids
+                ]
+                if operations:
+                    await self._bulk_upsert(operations)
+
+                fresh = await collection.find_one({"id": doc['id']}, projection) or {}
+                for role, field in role_fields.items():
+                    gone = snapshot[role] - set(fresh.get(field) or [])
+                    if gone:
+                        await self.collection.delete_many(
+                            {"scopeId": doc['id'], "role": role, "uid": {"$in": list(gone)}}
+                        )
+
+                update = {"$set": {
+                    "memberCount": await self.count(doc['id'], ROLE_MEMBER),
+                    "membershipsMigratedAt": datetime.utcnow()
+                }}
+                if drop_embedded:
+                    update["$unset"] = {field: "" for field in role_fields.values()}
+                await collection.update_one({"id": doc['id']}, update)
+                migrated += 1
+
+            if task is not None and not await task.claim():
+                return migrated
+
+        if drop_embedded:
+            # Daha önce geçişi yapılmış ama dizileri duran dokümanlar
+            await collection.update_many(
+                {"membershipsMigratedAt": {"$exists": True},
+                 "$or": [{field: {"$exists": True}} for field in role_fields.values()]},
+                {"$unset": {field: "" for field in role_fields.values()}}
+            )
+        return migrated
@@ -0,0 +1,141 @@
+"""Mesajlar için toplu (group-commit) yazma yolu.
+
+Kısa bir pencere (max_delay saniye) içinde veya max_batch dokümana
+ulaşıldığında gelen insert'ler tek bir insert_many ile yazılır. Her çağıran,
+kendi dokümanını içeren toplu yazma kalıcı olarak onaylandığında döner;
+böylece bir mesajın ek gecikmesi pencere süresiyle sınırlıdır.
+
+max_delay 0 ise toplama kapalıdır ve her mesaj doğrudan insert_one ile yazılır.
+"""
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    def __init__(self, collection, max_batch: int = 100, max_delay: float = 0.005,
+                 write_concern: Optional[WriteConcern] = None):
+        self.collection = collection
+        # Toplu yazmalar journal'a yazıldıktan sonra onaylanır
+        self.batch_collection = collection.with_options(write_concern=write_concern or WriteConcern(w=1, j=True))
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self._pending: List[Tuple[dict, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes = set()
+
+        self._batches = 0
+        self._documents = 0
+        self._failed = 0
+        self._max_batch_seen = 0
+        self._write_seconds = 0.0
+        self._max_write_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_delay > 0 and self.max_batch > 1
+
+    async def insert(self, document: dict):
+        """Dokümanı yaz; toplu yazma kalıcı olduğunda döner (hata varsa yükseltir)"""
+        if not self.enabled:
+            await self.collection.insert_one(document)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((document, future, time.monotonic()))
+        if len(self._pending) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_delay())
+        await future
+
+    async def _flush_after_delay(self):
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        self._start_flush()
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch):
+        started = time.monotonic()
+        errors = {}
+        try:
+            await self.batch_collection.insert_many([document for document, _, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            # ordered=False: yalnızca hatalı dokümanların çağıranları hata alır
+            for error in e.details.get('writeErrors', []):
+                errors[error['index']] = error
+            # Yazma onayı (j=True) alınamadıysa diğer dokümanlar da kalıcı sayılmaz
+            concern_errors = e.details.get('writeConcernErrors')
+            if concern_errors:
+                logger.error(f"Toplu mesaj yazma onaylanamadı ({len(batch)} mesaj): {concern_errors[0].get('errmsg')}")
+                failure = RuntimeError(f"Mesaj yazma onaylanamadı: {concern_errors[0].get('errmsg')}")
+                for index in range(len(batch)):
+                    errors.setdefault(index, failure)
+        except Exception as e:
+            logger.error(f"Toplu mesaj yazma başarısız ({len(batch)} mesaj): {type(e).__name__}")
+            errors = {index: e for index in range(len(batch))}
+
+        finished = time.monotonic()
+        self._record(batch, started, finished, len(errors))
+
+        for index, (_, future, _) in enumerate(batch):
+            if future.done():
+                continue
+            error = errors.get(index)
+            if error is None:
+                future.set_result(None)
+            elif isinstance(error, Exception):
+                future.set_exception(error)
+            else:
+                future.set_exception(RuntimeError(f"Mesaj yazılamadı: {error.get('errmsg')}"))
+
+    def _record(self, batch, started, finished, failed):
+        write_seconds = finished - started
+        self._batches += 1
+        self._documents += len(batch)
+        self._failed += failed
+        self._max_batch_seen = max(self._max_batch_seen, len(batch))
+        self._write_seconds += write_seconds
+        self._max_write_seconds = max(self._max_write_seconds, write_seconds)
+        oldest = min(enqueued for _, _, enqueued in batch)
+        self._max_wait_seconds = max(self._max_wait_seconds, finished - oldest)
+
+    async def close(self):
+        """Bekleyen mesajları yaz (shutdown'da çağrılır)"""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def metrics(self) -> dict:
+        batches = self._batches or 1
+        return {
+            "enabled": self.enabled,
+            "maxBatch": self.max_batch,
+            "maxDelayMs": self.max_delay * 1000,
+            "pending": len(self._pending),
+            "batches": self._batches,
+            "documents": self._documents,
+            "failed": self._failed,
+            "avgBatchSize": round(self._documents / batches, 2),
+            "maxBatchSize": self._max_batch_seen,
+            "avgWriteMs": round(self._write_seconds / batches * 1000, 2),
+            "maxWriteMs": round(self._max_write_seconds * 1000, 2),
+            "maxLatencyMs": round(self._max_wait_seconds * 1000, 2)
+        }
@@ -0,0 +1,163 @@
+"""Admin paneli için önceden hesaplanmış platform istatistikleri.
+
+Toplamlar stats koleksiyonundaki tek bir dokümanda tutulur:
+- Yazma yolları increment() ile bellekteki sayaçları artırır; birikenler
+  flush_interval aralığıyla tek bir $inc ile veritabanına yazılır
+  (her mesajda aynı dokümana yazıp sıcak nokta oluşturmamak için).
+- reconcile() toplamları estimated_document_count ile (koleksiyon taraması
+  yapmadan) yeniden hesaplar ve kaymaları düzeltir; reconcile_interval
+  aralığıyla arka planda çalışır. Son 7 günün kayıt sayısı da burada,
+  createdAt index'i üzerinden hesaplanır. Topluluk ve alt grupların
+  memberCount alanları da memberships koleksiyonundan tek bir gruplama
+  sorgusuyla doğrulanır.
+
+Uzlaştırmayı her aralıkta tek bir worker yapar (startup_tasks kirası,
+süresi reconcile_interval). Mutlak değerler yazılmadan önce kirayı alan
+worker kendi sayaçlarını yazar ve diğer worker'ların periyodik flush'ını
+(2 * flush_interval) bekler; bekleyen artışlar atılmaz. Bu bekleme sırasında
+oluşan birkaç artış çift sayılabilir, bir sonraki uzlaştırma bunu düzeltir.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import UpdateOne
+
+from memberships import ROLE_MEMBER, SCOPES
+from startup_tasks import StartupTask
+
+logger = logging.getLogger(__name__)
+
+STATS_DOC_ID = 'platform'
+
+# İstatistik alanı -> sayılan koleksiyon
+COUNTED_COLLECTIONS = {
+    "totalUsers": "users",
+    "totalCommunities": "communities",
+    "totalSubgroups": "subgroups",
+    "totalMessages": "messages",
+    "totalPosts": "posts",
+    "totalServices": "services",
+}
+
+
+class PlatformStats:
+    def __init__(self, db, flush_interval: float = 5.0, reconcile_interval: float = 600.0):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.reconcile_interval = reconcile_interval
+        self._pending = defaultdict(int)
+        self._lease = StartupTask(db, "platform-stats-reconcile", "periodic", ttl=reconcile_interval)
+        self._task: Optional[asyncio.Task] = None
+
+    def increment(self, field: str, amount: int = 1):
+        """Sayacı artır/azalt (bekletilir, flush ile yazılır)"""
+        if amount:
+            self._pending[field] += amount
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = dict(self._pending), defaultdict(int)
+        try:
+            await self.db.stats.update_one(
+                {"_id": STATS_DOC_ID},
+                {"$inc": pending, "$set": {"updatedAt": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception:
+            # Bir sonraki flush'ta tekrar denenir
+            for field, amount in pending.items():
+                self._pending[field] += amount
+            raise
+
+    async def run_reconcile(self, wait_for_workers: bool = True) -> Optional[dict]:
+        """Kirayı alabilirse uzlaştır; başka bir worker uzlaştırıyorsa None"""
+        if not await self._lease.claim():
+            return None
+        await self.flush()
+        if wait_for_workers:
+            # Diğer worker'lar bekleyen artışlarını flush_interval içinde yazar
+            await asyncio.sleep(self.flush_interval * 2)
+        return await self.reconcile()
+
+    async def reconcile(self) -> dict:
+        """Toplamları koleksiyon metadatasından ve index'lerden yeniden hesapla"""
+        # Bu worker'ın bekleyen artışları sayımdan önce yazılır
+        await self.flush()
+        values = {}
+        for field, collection in COUNTED_COLLECTIONS.items():
+            values[field] = await self.db[collection].estimated_document_count()
+
+        now = datetime.utcnow()
+        values["newUsersThisWeek"] = await self.db.users.count_documents(
+            {"createdAt": {"$gte": now - timedelta(days=7)}}
+        )
+
+        # Topluluk/alt grup üye sayılarındaki kaymaları memberships üzerinden düzelt
+        await self.reconcile_member_counts()
+
+        values["updatedAt"] = now
+        values["reconciledAt"] = now
+        await self.db.stats.update_one({"_id": STATS_DOC_ID}, {"$set": values}, upsert=True)
+        return values
+
+    async def reconcile_member_counts(self):
+        """memberCount alanlarını memberships'ten tek gruplamayla sayılan üye sayılarıyla eşitle"""
+        counts = {}
+        async for row in self.db.memberships.aggregate([
+            {"$match": {"role": ROLE_MEMBER}},
+            {"$group": {"_id": "$scopeId", "count": {"$sum": 1}}}
+        ]):
+            counts[row['_id']] = row['count']
+
+        for collection, _ in SCOPES.values():
+            cursor = self.db[collection].find(
+                {"membershipsMigratedAt": {"$exists": True}}, {"_id": 0, "id": 1, "memberCount": 1}
+            )
+            operations = [
+                UpdateOne({"id": doc['id']}, {"$set": {"memberCount": counts.get(doc['id'], 0)}})
+                async for doc in cursor
+                if doc.get('memberCount') != counts.get(doc['id'], 0)
+            ]
+            if operations:
+                await self.db[collection].bulk_write(operations, ordered=False)
+
+    async def snapshot(self) -> dict:
+        doc = await self.db.stats.find_one({"_id": STATS_DOC_ID})
+        if doc is None or "reconciledAt" not in doc:
+            doc = await self.run_reconcile(wait_for_workers=False) or doc or {}
+        doc.pop("_id", None)
+        return doc
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        next_reconcile = loop.time()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if loop.time() >= next_reconcile:
+                    next_reconcile = loop.time() + self.reconcile_interval
+                    await self.run_reconcile()
+            except Exception as e:
+                logger.error(f"Platform istatistikleri güncellenemedi: {type(e).__name__}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Platform istatistikleri yazılamadı: {type(e).__name__}")
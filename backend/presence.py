@@ -0,0 +1,136 @@
+"""Bellek içi çevrimiçi durumu (presence).
+
+Socket bağlantıları kullanıcıyı çevrimiçi yapar; veritabanına hiç yazılmaz:
+- Her bağlantı (sid) ttl süresi içinde heartbeat göndermezse düşer; kapanan
+  sekmeler ve kopan bağlantılar böylece temizlenir.
+- Kullanıcının son bağlantısı gidince grace süresi beklenir; sayfa geçişinde
+  yeniden bağlanan kullanıcı hiç çevrimdışı görünmez.
+- Değişen kullanıcılar her tick'te toplanır, yalnızca son yayından farklı
+  olanlar presence:<uid> odasına (abone olan istemcilere) gönderilir.
+
+Her düğüm yalnızca kendi soketlerini bilir; güncellemeler düğüm kimliğiyle
+gönderilir ve istemci, herhangi bir düğümde çevrimiçi olanı çevrimiçi sayar.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def presence_room(uid: str) -> str:
+    return f"presence:{uid}"
+
+
+class PresenceTracker:
+    def __init__(self, publish: Callable[[str, dict], Awaitable[None]], ttl: float = 75.0,
+                 grace: float = 5.0, tick: float = 1.0):
+        self.publish = publish
+        self.ttl = ttl
+        self.grace = grace
+        self.tick = tick
+        self.node_id = uuid.uuid4().hex[:12]
+
+        # sid -> {"uid", "expiresAt"}
+        self._sockets: Dict[str, dict] = {}
+        # uid -> bağlı sid'ler
+        self._users: Dict[str, Set[str]] = {}
+        # Son bağlantısı giden kullanıcılar: uid -> çevrimdışı sayılacağı an
+        self._leaving: Dict[str, float] = {}
+        self._published: Dict[str, bool] = {}
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def connect(self, sid: str, uid: str):
+        self._sockets[sid] = {"uid": uid, "expiresAt": time.monotonic() + self.ttl}
+        self._users.setdefault(uid, set()).add(sid)
+        self._leaving.pop(uid, None)
+        self._dirty.add(uid)
+
+    def heartbeat(self, sid: str) -> bool:
+        """Bağlantının süresini uzat; bağlantı bilinmiyorsa (süresi dolmuş) False"""
+        entry = self._sockets.get(sid)
+        if entry is None:
+            return False
+        entry['expiresAt'] = time.monotonic() + self.ttl
+        return True
+
+    def disconnect(self, sid: str):
+        entry = self._sockets.pop(sid, None)
+        if entry is None:
+            return
+        uid = entry['uid']
+        sids = self._users.get(uid)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self._users[uid]
+                self._leaving[uid] = time.monotonic() + self.grace
+
+    def uid_for(self, sid: str) -> Optional[str]:
+        entry = self._sockets.get(sid)
+        return entry['uid'] if entry else None
+
+    def is_online(self, uid: str) -> bool:
+        return uid in self._users or uid in self._leaving
+
+    def online_uids(self, uids: Iterable[str]) -> Set[str]:
+        """Verilenlerden bu düğümde çevrimiçi olanlar"""
+        return {uid for uid in uids if self.is_online(uid)}
+
+    def _expire(self, now: float):
+        for sid in [sid for sid, entry in self._sockets.items() if entry['expiresAt'] <= now]:
+            self.disconnect(sid)
+        for uid in [uid for uid, until in self._leaving.items() if until <= now]:
+            del self._leaving[uid]
+            self._dirty.add(uid)
+
+    async def flush(self):
+        """Süresi dolanları düşür, durumu değişen kullanıcıları yayınla"""
+        self._expire(time.monotonic())
+        dirty, self._dirty = self._dirty, set()
+
+        for uid in dirty:
+            online = self.is_online(uid)
+            # Tick içinde gidip gelen kullanıcı için yayın yapılmaz
+            if self._published.get(uid, False) == online:
+                continue
+            if online:
+                self._published[uid] = True
+            else:
+                self._published.pop(uid, None)
+            await self.publish(presence_room(uid), {
+                "userId": uid,
+                "online": online,
+                "node": self.node_id
+            })
+
+    def metrics(self) -> dict:
+        return {
+            "node": self.node_id,
+            "onlineUsers": len(self._users) + len(self._leaving),
+            "sockets": len(self._sockets)
+        }
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Çevrimiçi durumu gönderilemedi: {type(e).__name__}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,243 @@
+"""Çevrimdışı üyelere push bildirimi (FCM) dağıtımı.
+
+- DeviceTokenRegistry: kullanıcıların cihaz token'ları (device_tokens).
+- NotificationDispatcher: mesaj gönderen istek bildirimi yalnızca kuyruğa
+  koyar (notify() beklemez). Arka plandaki worker alıcıları sayfa sayfa
+  çözer, odayı o an açık tutanları atlar, token'ları toplu sorguyla getirir
+  ve en fazla batch_size token'lık multicast çağrılarıyla gönderir.
+  Geçici hatalar üstel beklemeyle yeniden denenir; geçersizleşmiş token'lar
+  kayıt defterinden silinir.
+- Taşıyıcı takılabilir (PUSH_TRANSPORT): fcm (firebase_admin.messaging),
+  memory (gönderilenleri bellekte tutar; yerel geliştirme ve testler) veya
+  none (kapalı).
+
+Yeniden deneme kuyruğu bellektedir; süreç kapanırsa bekleyen denemeler
+düşer (bildirimler en iyi çaba ile gönderilir).
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Union
+
+logger = logging.getLogger(__name__)
+
+# Gönderim sonucu (token başına)
+SENT = 'sent'
+DEAD = 'dead'  # Token artık geçersiz; silinir
+RETRY = 'retry'  # Geçici hata; tekrar denenir
+FAILED = 'failed'  # Kalıcı hata (ör. geçersiz istek); tekrar denenmez
+
+FCM_MULTICAST_LIMIT = 500
+
+Recipients = Union[Iterable[str], AsyncIterator[List[str]]]
+
+
+class DeviceTokenRegistry:
+    def __init__(self, db):
+        self.collection = db.device_tokens
+
+    async def register(self, uid: str, token: str, platform: str = 'web'):
+        """Token'ı kullanıcıya bağla (cihaz başka hesaba geçtiyse sahibi değişir)"""
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"token": token},
+            {"$set": {"uid": uid, "platform": platform, "lastSeenAt": now}, "$setOnInsert": {"createdAt": now}},
+            upsert=True
+        )
+
+    async def unregister(self, uid: str, token: str):
+        await self.collection.delete_one({"token": token, "uid": uid})
+
+    async def tokens_for(self, uids: List[str]) -> List[str]:
+        if not uids:
+            return []
+        cursor = self.collection.find({"uid": {"$in": uids}}, {"_id": 0, "token": 1})
+        return [doc['token'] async for doc in cursor]
+
+    async def prune(self, tokens: List[str]):
+        if tokens:
+            await self.collection.delete_many({"token": {"$in": tokens}})
+
+
+class FCMTransport:
+    """firebase_admin.messaging ile multicast (HTTP çağrısı thread'de)"""
+
+    async def send(self, tokens: List[str], notification: dict) -> List[str]:
+        from firebase_admin import exceptions, messaging
+
+        message = messaging.MulticastMessage(
+            tokens=tokens,
+            notification=messaging.Notification(title=notification.get('title'), body=notification.get('body')),
+            data={key: str(value) for key, value in (notification.get('data') or {}).items()},
+            android=messaging.AndroidConfig(priority='high'),
+        )
+        response = await asyncio.to_thread(messaging.send_each_for_multicast, message)
+
+        results = []
+        for item in response.responses:
+            if item.success:
+                results.append(SENT)
+            elif isinstance(item.exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+                results.append(DEAD)
+            elif isinstance(item.exception, (exceptions.UnavailableError, exceptions.InternalError,
+                                             messaging.QuotaExceededError)):
+                results.append(RETRY)
+            else:
+                results.append(FAILED)
+        return results
+
+
+class MemoryTransport:
+    """Gönderilenleri bellekte tutar; results ile token bazında sonuç verilebilir"""
+
+    def __init__(self):
+        self.sent: List[tuple] = []
+        self.results: Dict[str, str] = {}
+
+    async def send(self, tokens: List[str], notification: dict) -> List[str]:
+        self.sent.append((list(tokens), notification))
+        return [self.results.get(token, SENT) for token in tokens]
+
+
+def create_transport(name: Optional[str] = None):
+    """PUSH_TRANSPORT'a göre taşıyıcı (None: bildirimler kapalı)"""
+    name = (name if name is not None else os.environ.get('PUSH_TRANSPORT', 'fcm')).lower()
+    if name == 'fcm':
+        return FCMTransport()
+    if name == 'memory':
+        return MemoryTransport()
+    if name in ('', 'none'):
+        return None
+    raise ValueError(f"Desteklenmeyen push taşıyıcısı: {name}")
+
+
+class NotificationDispatcher:
+    def __init__(self, registry: DeviceTokenRegistry, transport,
+                 active_uids: Optional[Callable[[str], Awaitable[Set[str]]]] = None,
+                 batch_size: int = FCM_MULTICAST_LIMIT, max_retries: int = 3,
+                 retry_delay: float = 2.0, max_queue: int = 10000):
+        self.registry = registry
+        self.transport = transport
+        self.active_uids = active_uids
+        self.batch_size = min(batch_size, FCM_MULTICAST_LIMIT)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._retry_handles = set()
+        self._counts = {SENT: 0, DEAD: 0, RETRY: 0, FAILED: 0, "dropped": 0, "batches": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.transport is not None
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self, recipients: Recipients, notification: dict, room_id: Optional[str] = None,
+               exclude: Iterable[str] = ()):
+        """Bildirimi kuyruğa al ve hemen dön.
+
+        recipients bir uid listesi ya da uid listeleri üreten async iterator
+        olabilir (büyük topluluklar sayfa sayfa okunur). room_id verilirse
+        odayı o an açık tutan kullanıcılar atlanır.
+        """
+        if not self.enabled:
+            return
+        try:
+            self._queue.put_nowait(("fan_out", recipients, notification, room_id, frozenset(exclude)))
+        except asyncio.QueueFull:
+            self._counts["dropped"] += 1
+            logger.warning("Bildirim kuyruğu dolu, bildirim atlandı")
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job[0] == "fan_out":
+                    await self._fan_out(*job[1:])
+                else:
+                    await self._send(*job[1:])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Bildirim dağıtımı başarısız: {type(e).__name__}: {e}")
+
+    async def _fan_out(self, recipients: Recipients, notification: dict, room_id: Optional[str], exclude: frozenset):
+        skip = set(exclude)
+        if room_id and self.active_uids:
+            skip |= await self.active_uids(room_id)
+
+        async for uids in self._uid_batches(recipients):
+            tokens = await self.registry.tokens_for([uid for uid in uids if uid not in skip])
+            for start in range(0, len(tokens), self.batch_size):
+                await self._send(tokens[start:start + self.batch_size], notification, 0)
+
+    async def _uid_batches(self, recipients: Recipients) -> AsyncIterator[List[str]]:
+        if hasattr(recipients, '__aiter__'):
+            async for uids in recipients:
+                yield uids
+            return
+        uids = list(recipients)
+        for start in range(0, len(uids), self.batch_size):
+            yield uids[start:start + self.batch_size]
+
+    async def _send(self, tokens: List[str], notification: dict, attempt: int):
+        if not tokens:
+            return
+        self._counts["batches"] += 1
+        try:
+            results = await self.transport.send(tokens, notification)
+        except Exception as e:
+            logger.warning(f"Push gönderimi başarısız ({len(tokens)} token): {type(e).__name__}")
+            results = [RETRY] * len(tokens)
+
+        by_result: Dict[str, List[str]] = {}
+        for token, result in zip(tokens, results):
+            by_result.setdefault(result, []).append(token)
+        for result, result_tokens in by_result.items():
+            self._counts[result] += len(result_tokens)
+
+        await self.registry.prune(by_result.get(DEAD, []))
+
+        retry = by_result.get(RETRY)
+        if retry:
+            if attempt + 1 < self.max_retries:
+                self._schedule_retry(retry, notification, attempt + 1)
+            else:
+                self._counts[FAILED] += len(retry)
+
+    def _schedule_retry(self, tokens: List[str], notification: dict, attempt: int):
+        delay = self.retry_delay * 2 ** (attempt - 1)
+
+        def enqueue():
+            self._retry_handles.discard(handle)
+            try:
+                self._queue.put_nowait(("send", tokens, notification, attempt))
+            except asyncio.QueueFull:
+                self._counts["dropped"] += 1
+
+        handle = asyncio.get_running_loop().call_later(delay, enqueue)
+        self._retry_handles.add(handle)
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "pendingRetries": len(self._retry_handles),
+            **self._counts
+        }
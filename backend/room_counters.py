@@ -0,0 +1,85 @@
+"""Oda başına mesaj sıra numarası ve son mesaj özeti.
+
+Her odanın (alt grup, özel sohbet, duyuru kanalı) room_counters
+koleksiyonunda tek bir dokümanı vardır (_id: oda id). Gönderilen her mesaj
+aynı atomik güncellemede seq'i bir artırır ve lastMessage özetini yazar;
+mesaj bu seq ile kaydedilir. Okundu imleci (read_states.lastReadSeq)
+okunan son mesajın seq'ini tutar, böylece okunmamış sayısı
+seq - lastReadSeq olur ve oda başına count_documents gerekmez.
+
+Sayaç bu özellikle başlar: daha önce gönderilmiş mesajların seq'i yoktur ve
+sayılmaz. Özel sohbet dokümanları katılımcıları da tutar; kullanıcının
+sohbetleri bu koleksiyondan bulunur.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+PREVIEW_LENGTH = 120
+# Mesajdan lastMessage özetine kopyalanan alanlar
+PREVIEW_FIELDS = ("id", "senderId", "senderName", "type", "timestamp")
+
+
+def message_preview(message: dict) -> dict:
+    preview = {field: message.get(field) for field in PREVIEW_FIELDS}
+    preview["content"] = (message.get('content') or '')[:PREVIEW_LENGTH]
+    return preview
+
+
+class RoomCounters:
+    def __init__(self, db):
+        self.collection = db.room_counters
+
+    async def record(self, room_id: str, message: dict, participants: Optional[List[str]] = None) -> int:
+        """Mesaj için sıradaki seq'i al ve son mesaj özetini güncelle"""
+        update = {
+            "$inc": {"seq": 1},
+            "$set": {"lastMessage": message_preview(message), "updatedAt": datetime.utcnow()}
+        }
+        if participants:
+            update["$setOnInsert"] = {"participants": sorted(participants)}
+
+        for attempt in range(2):
+            try:
+                doc = await self.collection.find_one_and_update(
+                    {"_id": room_id}, update, projection={"seq": 1},
+                    upsert=True, return_document=ReturnDocument.AFTER
+                )
+                return doc['seq']
+            except DuplicateKeyError:
+                # Odanın ilk mesajı eşzamanlı gönderildi; tekrar dene (bu kez eşleşir)
+                if attempt:
+                    raise
+
+    async def update_preview(self, room_id: str, message_id: str, content: str, **fields):
+        """Mesaj odanın son mesajıysa özetini güncelle (düzenleme, herkesten silme)"""
+        update = {"lastMessage.content": (content or '')[:PREVIEW_LENGTH]}
+        update.update({f"lastMessage.{field}": value for field, value in fields.items()})
+        await self.collection.update_one({"_id": room_id, "lastMessage.id": message_id}, {"$set": update})
+
+    async def clear_preview(self, room_id: str, **match):
+        """Silinen mesaj(lar) odanın son mesajıysa özeti kaldır; match lastMessage
+        alanlarıyla eşleşir (ör. id=..., senderId=...)"""
+        query = {"_id": room_id, **{f"lastMessage.{field}": value for field, value in match.items()}}
+        await self.collection.update_one(query, {"$unset": {"lastMessage": ""}})
+
+    async def current_seq(self, room_id: str) -> int:
+        doc = await self.collection.find_one({"_id": room_id}, {"seq": 1})
+        return doc['seq'] if doc else 0
+
+    async def rooms(self, room_ids: Iterable[str]) -> Dict[str, dict]:
+        """Odaların seq ve lastMessage bilgisi (tek sorgu)"""
+        room_ids = [room_id for room_id in room_ids if room_id]
+        if not room_ids:
+            return {}
+        cursor = self.collection.find({"_id": {"$in": room_ids}}, {"seq": 1, "lastMessage": 1})
+        return {doc.pop('_id'): doc async for doc in cursor}
+
+    async def private_rooms(self, uid: str, limit: int) -> List[dict]:
+        """Kullanıcının özel sohbetleri, son mesaja göre yeniden eskiye"""
+        cursor = self.collection.find(
+            {"participants": uid}, {"seq": 1, "lastMessage": 1, "participants": 1}
+        ).sort("updatedAt", -1).limit(limit)
+        return await cursor.to_list(limit)
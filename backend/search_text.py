@@ -0,0 +1,85 @@
+"""Türkçe duyarlı arama metni normalizasyonu.
+
+Aramada "Işık", "isik" ve "IŞIK" aynı sonucu vermelidir: büyük/küçük harf,
+noktalı/noktasız i (I, İ, ı, i) ve aksanlar (ş, ğ, ü, ö, ç, â ...) katlanır.
+Normalize edilmiş kelimeler dokümanda bir dizi alanında tutulur ve önek
+aramaları bu alan üzerindeki index ile yapılır.
+"""
+import re
+import unicodedata
+from typing import Iterable, List
+
+# lower()'dan önce uygulanır: Python'da "İ".lower() iki karakter üretir
+_TURKISH_FOLD = str.maketrans({
+    'İ': 'i', 'I': 'i', 'ı': 'i',
+    'Ş': 's', 'ş': 's',
+    'Ğ': 'g', 'ğ': 'g',
+    'Ü': 'u', 'ü': 'u',
+    'Ö': 'o', 'ö': 'o',
+    'Ç': 'c', 'ç': 'c',
+})
+
+_WORD_RE = re.compile(r'\w+')
+
+# Önek aralığının üst sınırı (normalize edilmiş metinde bulunmaz)
+PREFIX_END = '\uffff'
+
+
+def normalize_text(text: str) -> str:
+    """Küçük harfe çevir, Türkçe harfleri ve aksanları ASCII karşılığına katla"""
+    if not text:
+        return ''
+    folded = unicodedata.normalize('NFKD', text.translate(_TURKISH_FOLD).lower())
+    return ''.join(ch for ch in folded if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalize edilmiş kelimeler (sırası korunur)"""
+    return _WORD_RE.findall(normalize_text(text))
+
+
+def search_tokens(*values: Iterable[str], keep_whole: Iterable[str] = ()) -> List[str]:
+    """Verilen alanların tekil kelime listesi; keep_whole içindekiler (ör. e-posta)
+    ayrıca bütün olarak da eklenir"""
+    tokens = []
+    for value in values:
+        tokens.extend(tokenize(value or ''))
+    for value in keep_whole:
+        if value:
+            tokens.append(normalize_text(value.strip()))
+    return list(dict.fromkeys(token for token in tokens if token))
+
+
+def prefix_tokens(tokens: Iterable[str], max_length: int) -> List[str]:
+    """Her kelimenin max_length uzunluğa kadarki önekleri ve kelimenin kendisi;
+    önek araması index'te eşitlikle yapılabilsin diye dokümanda saklanır"""
+    prefixes = []
+    for token in tokens:
+        prefixes.extend(token[:length] for length in range(1, min(len(token), max_length) + 1))
+        prefixes.append(token)
+    return list(dict.fromkeys(prefixes))
+
+
+def prefix_range(token: str) -> dict:
+    """Bir kelime önekini index üzerinden eşleyen sorgu aralığı"""
+    return {"$gte": token, "$lt": token + PREFIX_END}
+
+
+def snippet(text: str, words: Iterable[str], width: int = 80) -> dict:
+    """Eşleşen ilk kelimenin çevresinden kısa bir alıntı ve eşleşmelerin
+    alıntı içindeki [başlangıç, bitiş) konumları"""
+    text = text or ''
+    words = set(words)
+    matches = [m.span() for m in _WORD_RE.finditer(text) if normalize_text(m.group()) in words]
+    if not matches:
+        return {"text": text[:width], "highlights": []}
+
+    first = matches[0][0]
+    start = max(0, first - width // 3)
+    end = min(len(text), start + width)
+    start = max(0, end - width)
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    offset = len(prefix) - start
+    highlights = [[s + offset, e + offset] for s, e in matches if s >= start and e <= end]
+    return {"text": f"{prefix}{text[start:end]}{suffix}", "highlights": highlights}
@@ -1,22 +1,52 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 import re
 import html
+import base64
+import bisect
+import hashlib
+import binascii
 from pathlib import Path
+from urllib.parse import quote
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional
 import uuid
 from datetime import datetime, timedelta
-from firebase_config import verify_firebase_token
+from contextvars import ContextVar
+from firebase_config import token_verifier
+from db_indexes import ensure_indexes, verify_indexes
+from socket_manager import NodeQueryMixin, SocketJSON, create_client_manager
+from message_writer import MessageWriter
+from typing_indicators import TypingTracker
+from presence import PresenceTracker, presence_room
+from platform_stats import PlatformStats
+from fast_json import MongoJSONResponse
+from file_storage import create_storage, parse_byte_range
+from file_links import LOCAL_FILE_URL_PATTERN, FileLinkSigner
+from uploads import UploadConflict, UploadSessions
+from media_processing import MediaProcessor, variant_urls
+from room_counters import RoomCounters
+from push_notifications import DeviceTokenRegistry, NotificationDispatcher, create_transport
+from search_text import prefix_range, prefix_tokens, search_tokens, snippet, tokenize
+from authorization import AuthorizationService, EffectiveRoles
+from startup_tasks import StartupTask
+from memberships import (
+    MembershipStore, MEMBER_PAGE_LIMIT, SCOPE_COMMUNITY, SCOPE_SUBGROUP,
+    ROLE_MEMBER, ROLE_ADMIN, ROLE_SUPER_ADMIN
+)
 import socketio
-from bson import ObjectId
+from socketio.exceptions import ConnectionRefusedError as SocketConnectionRefusedError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
@@ -41,15 +71,105 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
-# Socket.IO setup
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+# Sohbet mesajları için toplu yazma (MESSAGE_WRITE_BATCH_MS=0 ise kapalı)
+message_writer = MessageWriter(
+    db.messages,
+    max_batch=int(os.environ.get('MESSAGE_WRITE_BATCH_SIZE', '100')),
+    max_delay=float(os.environ.get('MESSAGE_WRITE_BATCH_MS', '0')) / 1000
+)
+
+# Admin paneli istatistikleri (yazmalarda artırılır, periyodik olarak uzlaştırılır)
+platform_stats = PlatformStats(db)
+
+# Yüklenen dosyalar (FILE_STORAGE: varsayılan yerel disk, gridfs:// ile MongoDB)
+file_storage = create_storage(db, default_root=ROOT_DIR / 'uploads')
+# İçerik özetine göre tekilleştirme ve görsel varyantları (process havuzunda)
+media_processor = MediaProcessor(db, file_storage)
+# İndirme ve görsel varyantı bağlantıları imzalı ve kısa ömürlüdür; yanıtlar
+# ve socket olaylarındaki dosya yolları gönderilirken imzalanır (bkz. file_links.py)
+file_links = FileLinkSigner(os.environ.get('FILE_URL_SECRET'), ttl=int(os.environ.get('FILE_URL_TTL', '3600')))
+
+class MediaJSONResponse(MongoJSONResponse):
+    def render(self, content) -> bytes:
+        return super().render(file_links.sign_fields(content))
+
+class MediaSocketJSON(SocketJSON):
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return SocketJSON.dumps(file_links.sign_fields(obj), **kwargs)
+
+# Oda başına mesaj sıra numarası ve son mesaj (okunmamış sayıları için)
+room_counters = RoomCounters(db)
+
+# Çevrimdışı üyelere push bildirimi (PUSH_TRANSPORT: fcm, memory, none)
+device_tokens = DeviceTokenRegistry(db)
+push_dispatcher = NotificationDispatcher(
+    device_tokens, create_transport(), active_uids=lambda room_id: room_viewer_uids(room_id)
+)
+
+# Topluluk/alt grup üyelikleri memberships koleksiyonunda tutulur;
+# MEMBERSHIP_EMBEDDED_ARRAYS=false olana kadar gömülü dizilere de yazılır
+memberships = MembershipStore(
+    db, embedded=os.environ.get('MEMBERSHIP_EMBEDDED_ARRAYS', 'true').lower() != 'false'
+)
+
+# Etkin roller tek sorguda çözülür, kısa süre önbellekte tutulur; rol
+# değiştiren her üyelik yazması bu worker'daki kayıtları geçersiz kılar
+# (diğer düğümlere duyurusu aşağıda, Socket.IO kurulumundan sonra)
+authorization = AuthorizationService(memberships)
+
+# Socket.IO setup - SOCKETIO_MESSAGE_QUEUE ile emit'ler tüm worker/pod'lara dağıtılır
+sio = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins='*',
+    client_manager=create_client_manager(),
+    json=MediaSocketJSON
+)
+
+# "Yazıyor" göstergesi bellekte tutulur, odaya birleştirilmiş güncelleme olarak gider
+typing_tracker = TypingTracker(lambda room_id, payload: sio.emit('typing_update', payload, room=room_id))
+
+# Çevrimiçi durumu bellekte tutulur; değişiklikler presence:<uid> odalarına gider
+presence = PresenceTracker(lambda room, payload: sio.emit('presence_update', payload, room=room))
+
+def local_presence(uids: List[str]) -> dict:
+    return {"node": presence.node_id, "online": sorted(presence.online_uids(uids))}
+
+# Yetki önbelleği geçersizleştirmeleri diğer düğümlere duyurulur
+authorization_broadcasts = set()
+
+def broadcast_authorization_invalidation(scope_id: Optional[str], uid: Optional[str]):
+    if not sio.manager_initialized:
+        return
+    task = asyncio.get_running_loop().create_task(
+        sio.manager.notify_nodes('authorization_invalidate', {"scopeId": scope_id, "uid": uid})
+    )
+    authorization_broadcasts.add(task)
+    task.add_done_callback(authorization_broadcasts.discard)
+
+if isinstance(sio.manager, NodeQueryMixin):
+    sio.manager.on_node_query('presence', local_presence)
+    sio.manager.on_node_query('room_viewers', lambda room_id: local_room_viewers(room_id))
+    sio.manager.on_node_query(
+        'authorization_invalidate', lambda data: authorization.invalidate(data['scopeId'], data['uid'])
+    )
+    memberships.listeners.append(broadcast_authorization_invalidation)
+
+async def online_by_node(uids: List[str]) -> dict:
+    """Verilen kullanıcılardan her düğümde çevrimiçi olanlar: {düğüm: [uid]}"""
+    replies = await sio.manager.query_nodes('presence', uids) if isinstance(sio.manager, NodeQueryMixin) else []
+    nodes = {reply['node']: reply['online'] for reply in replies}
+    # Yanıtı zaman aşımına kalsa da bu düğümün durumu her zaman eklenir
+    nodes[presence.node_id] = local_presence(uids)['online']
+    return nodes
 
 # Create the main app without a prefix
 app = FastAPI(
     title="Network Solution API",
     docs_url=None,  # Disable docs in production
     redoc_url=None,  # Disable redoc in production
-    openapi_url=None  # Disable openapi schema in production
+    openapi_url=None,  # Disable openapi schema in production
+    default_response_class=MediaJSONResponse
 )
 
 # Rate limit error handler
@@ -106,6 +226,11 @@ def validate_url(url: str) -> bool:
         return True  # Empty is OK
     return validators.url(url) is True
 
+
+def validate_file_url(url: str) -> bool:
+    """Mutlak URL veya bu sunucunun dosya/medya yolu"""
+    return validate_url(url) or bool(LOCAL_FILE_URL_PATTERN.match(url))
+
 def validate_phone(phone: str) -> bool:
     """Validate phone number format"""
     if not phone:
@@ -135,26 +260,587 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
 # Add security middleware
 app.add_middleware(SecurityHeadersMiddleware)
 
-# Helper function to clean MongoDB documents for JSON serialization
-def clean_doc(doc):
-    """Remove _id and convert datetime objects for JSON serialization"""
+# ==================== MESAJ SAYFALAMA (KEYSET) ====================
+
+MESSAGE_PAGE_LIMIT = 100  # Bir sayfadaki en fazla mesaj
+MESSAGE_DELTA_LIMIT = 500  # since modunda tek seferde dönen en fazla mesaj
+MESSAGE_PROJECTION = {"_id": 0, "searchTokens": 0}
+
+def encode_message_cursor(msg: dict) -> str:
+    """(timestamp, id) ikilisinden opak sayfalama imleci üret"""
+    ts = msg['timestamp']
+    ts_str = ts.isoformat() if isinstance(ts, datetime) else str(ts)
+    raw = f"{ts_str}|{msg['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_message_cursor(cursor: str):
+    """İmleci (timestamp, id) ikilisine çöz"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        ts_str, msg_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|', 1)
+        return datetime.fromisoformat(ts_str), msg_id
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Geçersiz sayfalama imleci")
+
+async def fetch_message_page(query: dict, before: str = None, after: str = None, since: str = None, limit: int = MESSAGE_PAGE_LIMIT):
+    """Mesajları (timestamp, id) üzerinden index ile tarayarak sayfala.
+
+    - varsayılan: en yeni mesajlar
+    - before: imleçten daha eski mesajlar (geriye sayfalama)
+    - after: imleçten daha yeni bir sayfa
+    - since: imleçten sonraki tüm yeni mesajlar (yeniden bağlanan istemci için delta)
+
+    Mesajlar her zaman yeniden eskiye sıralı döner. hasMore, sayfalama
+    yönünde daha fazla mesaj olduğunu belirtir.
+    """
+    if sum(c is not None for c in (before, after, since)) > 1:
+        raise HTTPException(status_code=400, detail="before, after ve since birlikte kullanılamaz")
+
+    limit = max(1, min(limit, MESSAGE_PAGE_LIMIT))
+    direction = -1
+    if before:
+        ts, msg_id = decode_message_cursor(before)
+        query = {"$and": [query, {"$or": [
+            {"timestamp": {"$lt": ts}},
+            {"timestamp": ts, "id": {"$lt": msg_id}}
+        ]}]}
+    elif after or since:
+        ts, msg_id = decode_message_cursor(after or since)
+        query = {"$and": [query, {"$or": [
+            {"timestamp": {"$gt": ts}},
+            {"timestamp": ts, "id": {"$gt": msg_id}}
+        ]}]}
+        direction = 1
+        if since:
+            limit = MESSAGE_DELTA_LIMIT
+
+    messages = await db.messages.find(query, MESSAGE_PROJECTION).sort(
+        [("timestamp", direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if direction == 1:
+        messages.reverse()
+
+    return {
+        "messages": messages,
+        "hasMore": has_more,
+        "beforeCursor": encode_message_cursor(messages[-1]) if messages else before,
+        "afterCursor": encode_message_cursor(messages[0]) if messages else (after or since)
+    }
+
+# ==================== GÖNDERİ / YORUM SAYFALAMA ====================
+# Akış ve yorumlar da (timestamp, id) keyset imleciyle sayfalanır. Beğenen
+# uid listeleri (likes) ve yorum referansları istemciye gönderilmez; sayılar
+# dokümanda tutulan likeCount/commentCount alanlarından okunur.
+
+FEED_PAGE_LIMIT = 20
+COMMENT_PAGE_LIMIT = 50
+POST_LIST_PROJECTION = {"_id": 0, "likes": 0, "comments": 0}
+COMMENT_LIST_PROJECTION = {"_id": 0, "likes": 0}
+
+async def fetch_keyset_page(collection, query: dict, cursor: str = None, limit: int = FEED_PAGE_LIMIT,
+                            projection: dict = None, ascending: bool = False):
+    """(timestamp, id) sırasıyla bir sayfa döndür: (dokümanlar, hasMore, nextCursor)"""
+    direction = 1 if ascending else -1
+    if cursor:
+        ts, doc_id = decode_message_cursor(cursor)
+        op = "$gt" if ascending else "$lt"
+        query = {"$and": [query, {"$or": [
+            {"timestamp": {op: ts}},
+            {"timestamp": ts, "id": {op: doc_id}}
+        ]}]}
+
+    docs = await collection.find(query, projection).sort(
+        [("timestamp", direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    return docs, has_more, (encode_message_cursor(docs[-1]) if has_more and docs else None)
+
+async def liked_ids(collection, ids: List[str], uid: str) -> set:
+    """Verilen dokümanlardan kullanıcının beğendiklerinin id'leri (tek sorgu, dizi taşımadan)"""
+    if not ids:
+        return set()
+    return set(await collection.distinct("id", {"id": {"$in": ids}, "likes": uid}))
+
+async def with_like_state(collection, docs: List[dict], uid: str, counters=('likeCount',)) -> List[dict]:
+    liked = await liked_ids(collection, [doc['id'] for doc in docs], uid)
+    for doc in docs:
+        doc['isLiked'] = doc['id'] in liked
+        for field in counters:
+            doc.setdefault(field, 0)
+    return docs
+
+POST_COUNTERS = ('likeCount', 'commentCount')
+
+async def toggle_like(collection, doc_id: str, uid: str) -> Optional[dict]:
+    """Beğeniyi tek koşullu güncellemeyle değiştir, güncel sayıyı döndür.
+
+    Önce beğeni kaldırılmaya, olmazsa eklenmeye çalışılır; likes dizisi ve
+    likeCount aynı işlemde değiştiği için eşzamanlı isteklerde sayı kaymaz.
+    Doküman yoksa None döner.
+    """
+    projection = {"_id": 0, "likeCount": 1}
+    doc = await collection.find_one_and_update(
+        {"id": doc_id, "likes": uid},
+        {"$pull": {"likes": uid}, "$inc": {"likeCount": -1}},
+        projection=projection, return_document=ReturnDocument.AFTER
+    )
+    if doc is not None:
+        return {"liked": False, "likeCount": doc.get('likeCount', 0)}
+
+    doc = await collection.find_one_and_update(
+        {"id": doc_id, "likes": {"$ne": uid}},
+        {"$addToSet": {"likes": uid}, "$inc": {"likeCount": 1}},
+        projection=projection, return_document=ReturnDocument.AFTER
+    )
+    if doc is not None:
+        return {"liked": True, "likeCount": doc.get('likeCount', 0)}
+
+    # Eşzamanlı bir istek durumu değiştirdi: güncel durumu oku
+    doc = await collection.find_one({"id": doc_id}, projection)
     if doc is None:
         return None
-    if isinstance(doc, list):
-        return [clean_doc(d) for d in doc]
-    if isinstance(doc, dict):
-        doc.pop('_id', None)
-        for key, value in doc.items():
-            if isinstance(value, datetime):
-                doc[key] = value.isoformat()
-            elif isinstance(value, ObjectId):
-                doc[key] = str(value)
-            elif isinstance(value, dict):
-                doc[key] = clean_doc(value)
-            elif isinstance(value, list):
-                doc[key] = [clean_doc(item) if isinstance(item, dict) else item for item in value]
-        return doc
-    return doc
+    liked = await collection.find_one({"id": doc_id, "likes": uid}, {"_id": 1}) is not None
+    return {"liked": liked, "likeCount": doc.get('likeCount', 0)}
+
+async def backfill_post_counters():
+    """Sayaç alanı olmayan eski gönderi/yorumlara likeCount/commentCount yaz"""
+    await db.posts.update_many(
+        {"$or": [{"likeCount": {"$exists": False}}, {"commentCount": {"$exists": False}}]},
+        [{"$set": {
+            "likeCount": {"$size": {"$ifNull": ["$likes", []]}},
+            "commentCount": {"$size": {"$ifNull": ["$comments", []]}}
+        }}]
+    )
+    await db.comments.update_many(
+        {"likeCount": {"$exists": False}},
+        [{"$set": {"likeCount": {"$size": {"$ifNull": ["$likes", []]}}}}]
+    )
+
+# ==================== KULLANICI ARAMA ====================
+# Ad, soyad, e-posta ve şehir Türkçe katlanmış kelimelerinin USER_SEARCH_PREFIX_LENGTH
+# karaktere kadarki önekleri (ve kelimelerin kendileri) searchPrefixes dizisinde
+# tutulur. Admin aramasında her kelime (searchPrefixes, uid) index'inde eşitlikle
+# eşlenir ve sonuçlar uid sırasıyla okunur (regex, tam tarama, bellekte sıralama yok).
+
+USER_SEARCH_FIELDS = ('firstName', 'lastName', 'email', 'city')
+USER_SEARCH_COUNT_LIMIT = 1000  # Arama sonucunda sayılacak en fazla kullanıcı
+USER_SEARCH_PREFIX_LENGTH = 10
+USER_SEARCH_INDEX = [("searchPrefixes", 1), ("uid", 1)]
+
+def user_search_prefixes(user: dict) -> List[str]:
+    return prefix_tokens(search_tokens(
+        user.get('firstName'), user.get('lastName'), user.get('email'), user.get('city'),
+        keep_whole=[user.get('email')]
+    ), USER_SEARCH_PREFIX_LENGTH)
+
+def user_search_query(search: Optional[str]) -> dict:
+    """Her kelime bir önek: index'te kelimenin ilk USER_SEARCH_PREFIX_LENGTH
+    karakteri eşitlikle, daha uzun kelimelerin devamı aynı dizide aralıkla eşlenir"""
+    conditions = []
+    for word in tokenize(search or '')[:5]:
+        conditions.append({"searchPrefixes": word[:USER_SEARCH_PREFIX_LENGTH]})
+        if len(word) > USER_SEARCH_PREFIX_LENGTH:
+            conditions.append({"searchPrefixes": prefix_range(word)})
+    return {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else {})
+
+async def refresh_user_search_tokens(uid: str):
+    """Arama alanları değiştiğinde kullanıcının searchPrefixes'ini yeniden hesapla"""
+    user = await db.users.find_one({"uid": uid}, {"_id": 0, **{f: 1 for f in USER_SEARCH_FIELDS}})
+    if user:
+        await db.users.update_one({"uid": uid}, {"$set": {"searchPrefixes": user_search_prefixes(user)}})
+
+async def backfill_user_search_tokens(batch_size: int = 500):
+    """searchPrefixes alanı olmayan kullanıcıları toplu güncelle (eski searchTokens kaldırılır)"""
+    cursor = db.users.find(
+        {"searchPrefixes": {"$exists": False}},
+        {"_id": 0, "uid": 1, **{f: 1 for f in USER_SEARCH_FIELDS}}
+    )
+    batch = []
+    async for user in cursor:
+        batch.append(UpdateOne(
+            {"uid": user['uid']},
+            {"$set": {"searchPrefixes": user_search_prefixes(user)}, "$unset": {"searchTokens": ""}}
+        ))
+        if len(batch) >= batch_size:
+            await db.users.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.users.bulk_write(batch, ordered=False)
+
+# ==================== MESAJ ARAMA İNDEKSİ ====================
+# Mesaj içeriği yazılırken Türkçe katlanmış kelimelere ayrılıp searchTokens
+# dizisine konur; arama bu alan üzerindeki (oda, kelime, zaman) index'iyle
+# çalışır ($regex yok). Düzenlemede yeniden hesaplanır, herkesten silinen
+# mesajlarda boşaltılır.
+
+MESSAGE_SEARCH_TOKEN_LIMIT = 200  # Mesaj başına indekslenen en fazla kelime
+
+def message_search_tokens(content: Optional[str]) -> List[str]:
+    return search_tokens(content)[:MESSAGE_SEARCH_TOKEN_LIMIT]
+
+def with_search_tokens(message: dict) -> dict:
+    """Yazılacak mesaj dokümanı (istemciye dönen mesaj searchTokens içermez)"""
+    return {**message, "searchTokens": message_search_tokens(message.get('content'))}
+
+async def backfill_message_search_tokens(task: StartupTask, batch_size: int = 1000):
+    """searchTokens alanı olmayan mesajları toplu güncelle (yarıda kalırsa devam eder)"""
+    cursor = db.messages.find(
+        {"searchTokens": {"$exists": False}},
+        {"_id": 0, "id": 1, "content": 1, "deletedForEveryone": 1}
+    )
+    batch, updated = [], 0
+    async for message in cursor:
+        tokens = [] if message.get('deletedForEveryone') else message_search_tokens(message.get('content'))
+        batch.append(UpdateOne({"id": message['id']}, {"$set": {"searchTokens": tokens}}))
+        if len(batch) >= batch_size:
+            await db.messages.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+            # Kirayı uzat; uzun süren doldurma başka süreçte tekrar başlamasın
+            await task.claim()
+    if batch:
+        await db.messages.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+async def run_message_search_backfill():
+    task = StartupTask(db, "message-search-tokens", "v1")
+    if not await task.claim():
+        return
+    try:
+        updated = await backfill_message_search_tokens(task)
+        await task.complete()
+        if updated:
+            logger.info(f"✅ {updated} mesaj arama için indekslendi")
+    except Exception as e:
+        await task.release()
+        logger.error(f"❌ Mesaj arama indekslemesi başarısız: {e}")
+
+# ==================== TOPLULUK ÜYELİĞİ ====================
+# Üyelikler memberships koleksiyonundadır (bkz. memberships.py); yetki
+# kontrolleri index'li varlık sorgusudur, üye sayıları memberCount alanındadır.
+# Yetki kontrolü için okunan topluluk/alt grup dokümanlarında üye dizileri
+# (büyük şehirlerde on binlerce uid) yüklenmez.
+WITHOUT_MEMBER_ARRAYS = {"_id": 0, "members": 0, "superAdmins": 0, "groupAdmins": 0}
+
+async def add_community_member(query: dict, uid: str, super_admin: bool = False):
+    """Kullanıcıyı sorguya uyan topluluk(lar)a üye (ve istenirse süper yönetici) yap.
+
+    super_admin ise yeni süper yönetici yapılan, değilse yeni üye olunan
+    topluluk sayısını döndürür.
+    """
+    granted = None
+    if super_admin:
+        granted = await memberships.grant_all(SCOPE_COMMUNITY, query, uid, ROLE_SUPER_ADMIN)
+    added = await memberships.grant_all(SCOPE_COMMUNITY, query, uid)
+    if added:
+        # Duyuru kanalının eski mesajları yeni üyeye okunmamış sayılmaz
+        channels = await db.communities.distinct(
+            "announcementChannelId", {"id": {"$in": added}, "announcementChannelId": {"$ne": None}}
+        )
+        await start_read_cursors(uid, channels)
+    return len(added if granted is None else granted)
+
+async def remove_community_member(query: dict, uid: str):
+    """Kullanıcının topluluk(lar)daki üyeliğini ve süper yöneticiliğini kaldır"""
+    await memberships.revoke_all(SCOPE_COMMUNITY, query, uid)
+
+async def add_subgroup_member(subgroup_id: str, uid: str, admin: bool = False):
+    """Kullanıcıyı alt gruba üye (ve istenirse grup yöneticisi) yap"""
+    if admin:
+        await memberships.grant(SCOPE_SUBGROUP, subgroup_id, uid, ROLE_ADMIN)
+    added = await memberships.grant(SCOPE_SUBGROUP, subgroup_id, uid)
+    if added:
+        await start_read_cursor(uid, subgroup_id)
+    return added
+
+async def remove_subgroup_member(query: dict, uid: str, roles=(ROLE_MEMBER, ROLE_ADMIN)):
+    """Kullanıcıyı sorguya uyan alt grup(lar)dan (verilen rollerden) çıkar"""
+    await memberships.revoke_all(SCOPE_SUBGROUP, query, uid, roles)
+
+def is_global_admin(user: Optional[dict]) -> bool:
+    return bool(user) and (user.get('isAdmin', False) or (user.get('email') or '').lower() == ADMIN_EMAIL.lower())
+
+async def resolve_roles(uid: str, user: Optional[dict] = None, subgroup_id: Optional[str] = None,
+                        community_id: Optional[str] = None) -> EffectiveRoles:
+    """Kullanıcının alt grup/topluluktaki etkin rolleri (tek sorgu, kısa süreli önbellek).
+
+    community_id verilmezse alt grubun topluluğu önbellekten çözülür; user
+    verilirse global yöneticilik de hesaba katılır.
+    """
+    return await authorization.roles(uid, subgroup_id, community_id, global_admin=is_global_admin(user))
+
+async def subgroup_roles(uid: str, subgroup: dict, user: Optional[dict] = None) -> EffectiveRoles:
+    """Yüklenmiş alt grup dokümanı için etkin roller"""
+    return await resolve_roles(uid, user, subgroup_id=subgroup['id'], community_id=subgroup.get('communityId'))
+
+async def fill_member_counts(collection, docs: list) -> list:
+    """memberCount'u olmayan (taşınmamış) kapsamlarda üye dizisinin boyutunu
+    veritabanında hesaplat; dizinin kendisi okunmaz"""
+    missing = [doc['id'] for doc in docs if 'memberCount' not in doc]
+    if missing:
+        sizes = {
+            row['id']: row['memberCount']
+            async for row in collection.find(
+                {"id": {"$in": missing}},
+                {"_id": 0, "id": 1, "memberCount": {"$size": {"$ifNull": ["$members", []]}}}
+            )
+        }
+        for doc in docs:
+            doc.setdefault('memberCount', sizes.get(doc['id'], 0))
+    return docs
+
+async def with_membership_flags(docs: list, uid: str, admin_flag: str, admin_role: str, collection) -> list:
+    """isMember / yönetici bayraklarını tek sorguyla ekle, memberCount'u garantile"""
+    roles = await memberships.roles_by_scope([doc['id'] for doc in docs], uid)
+    for doc in docs:
+        doc_roles = roles.get(doc['id'], set())
+        doc['isMember'] = ROLE_MEMBER in doc_roles
+        doc[admin_flag] = admin_role in doc_roles
+    return await fill_member_counts(collection, docs)
+
+# Üye listelerinde dönen kompakt profil (tam kullanıcı dokümanı taşınmaz)
+MEMBER_SUMMARY_PROJECTION = {"_id": 0, "uid": 1, "firstName": 1, "lastName": 1, "profileImageUrl": 1, "city": 1}
+ADMIN_MEMBER_PROJECTION = {**MEMBER_SUMMARY_PROJECTION, "email": 1}
+
+async def member_summaries(uids: List[str], projection: dict = MEMBER_SUMMARY_PROJECTION) -> List[dict]:
+    """Verilen uid'lerin kompakt profilleri, uid sırası korunarak (tek sorgu)"""
+    if not uids:
+        return []
+    users = await db.users.find({"uid": {"$in": uids}}, projection).to_list(len(uids))
+    by_uid = {user['uid']: user for user in users}
+    return [by_uid[uid] for uid in uids if uid in by_uid]
+
+async def member_page(scope_id: str, cursor: Optional[str], limit: int, role: str = ROLE_MEMBER,
+                      projection: dict = MEMBER_SUMMARY_PROJECTION):
+    """Kapsamdaki roldeki kullanıcılar, uid sırasıyla sayfalı: (profiller, sonraki imleç)"""
+    uids, next_cursor = await memberships.list_uids(scope_id, role, after=cursor, limit=limit)
+    return await member_summaries(uids, projection), next_cursor
+
+async def with_member_roles(scope_id: str, members: List[dict], flag: str, elevated_role: str, listed_role: str = ROLE_MEMBER):
+    """Sayfadaki üyelere rol alanını ve yönetici bayrağını ekle (tek sorgu)"""
+    if listed_role == elevated_role:
+        elevated = {member['uid'] for member in members}
+    else:
+        elevated = await memberships.uids_with_role(scope_id, [m['uid'] for m in members], elevated_role)
+    for member in members:
+        member[flag] = member['uid'] in elevated
+        member['role'] = elevated_role if member[flag] else ROLE_MEMBER
+    return members
+
+async def member_uid_batches(scope_id: str, batch_size: int = 500):
+    """Kapsamın tüm üye uid'leri, sayfa sayfa (bildirim dağıtımı için)"""
+    cursor = None
+    while True:
+        uids, cursor = await memberships.list_uids(scope_id, ROLE_MEMBER, after=cursor, limit=batch_size)
+        if uids:
+            yield uids
+        if cursor is None:
+            return
+
+def member_list_params(limit: int, role: str, allowed_roles: tuple) -> int:
+    if role not in allowed_roles:
+        raise HTTPException(status_code=400, detail="Geçersiz rol filtresi")
+    return max(1, min(limit, MEMBER_PAGE_LIMIT))
+
+# ==================== PUSH BİLDİRİMLERİ ====================
+
+MESSAGE_TYPE_PREVIEWS = {
+    "image": "📷 Fotoğraf",
+    "video": "🎥 Video",
+    "audio": "🎤 Sesli mesaj",
+    "file": "📎 Dosya",
+    "location": "📍 Konum",
+    "contact": "👤 Kişi",
+}
+
+def message_notification(title: str, message: dict, sender: Optional[str] = None, room_id: Optional[str] = None) -> dict:
+    """Mesaj için bildirim başlığı, metni ve istemcinin odayı açması için veri"""
+    body = MESSAGE_TYPE_PREVIEWS.get(message.get('type')) or (message.get('content') or '')[:120]
+    return {
+        "title": title,
+        "body": f"{sender}: {body}" if sender else body,
+        "data": {
+            "messageId": message['id'],
+            "roomId": room_id or message.get('groupId') or message.get('chatId') or '',
+            "type": message.get('type', 'text')
+        }
+    }
+
+# ==================== OKUNDU İMLEÇLERİ ====================
+# Her (kullanıcı, oda) için tek bir "son okunan mesaj" kaydı tutulur.
+# Bir mesaj, timestamp'i kullanıcının lastReadAt değerinden büyük değilse okunmuştur.
+# lastReadSeq okunan son mesajın oda sıra numarasıdır; okunmamış sayısı
+# room_counters'daki seq ile farkıdır.
+
+UNREAD_PRIVATE_LIMIT = 200
+
+def is_latest_page(page: dict, before: Optional[str], after: Optional[str]) -> bool:
+    """Sayfa odanın en yeni mesajlarını içeriyor mu (okundu imleci ilerletilir)"""
+    return bool(page['messages']) and not before and not (after and page['hasMore'])
+
+async def get_read_cursor(uid: str, room_id: str) -> Optional[dict]:
+    return await db.read_states.find_one(
+        {"uid": uid, "roomId": room_id},
+        {"_id": 0, "lastReadMessageId": 1, "lastReadAt": 1}
+    )
+
+async def advance_read_cursor(uid: str, room_id: str, message: dict) -> Optional[dict]:
+    """Okundu imlecini mesaja kadar ilerlet (tek upsert, geri gitmez).
+
+    İmleç ilerlediyse yeni imleci, zaten daha ileride ise None döndürür.
+    """
+    cursor = {
+        "lastReadMessageId": message['id'],
+        "lastReadAt": message['timestamp']
+    }
+    update = {"$set": {**cursor, "updatedAt": datetime.utcnow()}}
+    if message.get('seq'):
+        update["$max"] = {"lastReadSeq": message['seq']}
+    try:
+        await db.read_states.update_one(
+            {
+                "uid": uid,
+                "roomId": room_id,
+                "$or": [
+                    {"lastReadAt": {"$lt": message['timestamp']}},
+                    {"lastReadAt": {"$exists": False}}
+                ]
+            },
+            update,
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Kayıt var ve imleç zaten bu mesajda veya ileride
+        return None
+    return cursor
+
+async def start_read_cursors(uid: str, room_ids: List[str]):
+    """Yeni üyenin imleçlerini odaların son mesajına al (eski mesajlar okunmamış sayılmaz)"""
+    rooms = await room_counters.rooms(room_ids)
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"uid": uid, "roomId": room_id},
+            {"$max": {"lastReadSeq": room['seq']}, "$set": {"updatedAt": now}},
+            upsert=True
+        )
+        for room_id, room in rooms.items() if room.get('seq')
+    ]
+    if operations:
+        await db.read_states.bulk_write(operations, ordered=False)
+
+async def start_read_cursor(uid: str, room_id: str):
+    await start_read_cursors(uid, [room_id])
+
+async def latest_read_by_others(room_id: str, uid: str) -> Optional[datetime]:
+    """Odadaki diğer kullanıcıların en ileri okundu zamanı"""
+    state = await db.read_states.find_one(
+        {"roomId": room_id, "uid": {"$ne": uid}},
+        {"_id": 0, "lastReadAt": 1},
+        sort=[("lastReadAt", -1)]
+    )
+    return state['lastReadAt'] if state else None
+
+# ==================== TEPKİLER ====================
+# Tepkiler tek bir koşullu $push/$pull ile eklenir/kaldırılır, emoji başına
+# sayaç reactionCounts içinde aynı güncellemede tutulur. İki biçim vardır:
+# - sözlük: reactions.<emoji> = [uid, ...]  (grup ve özel sohbet mesajları)
+# - liste:  reactions = [{emoji, userId, userName, timestamp}]  (alt grup mesajları)
+
+REACTION_EMOJI_MAX_LENGTH = 32
+
+def validate_reaction_emoji(emoji) -> str:
+    if not isinstance(emoji, str) or not emoji:
+        raise HTTPException(status_code=400, detail="Emoji gerekli")
+    if len(emoji) > REACTION_EMOJI_MAX_LENGTH or '.' in emoji or emoji.startswith('$'):
+        raise HTTPException(status_code=400, detail="Geçersiz emoji")
+    return emoji
+
+async def ensure_reaction_counts(query: dict, as_list: bool):
+    """Sayacı olmayan eski mesajlar için reactionCounts'u mevcut tepkilerden hesapla"""
+    if as_list:
+        counts = {"$arrayToObject": {"$map": {
+            "input": {"$setUnion": [{"$ifNull": ["$reactions.emoji", []]}, []]},
+            "as": "emoji",
+            "in": {"k": "$$emoji", "v": {"$size": {"$filter": {
+                "input": "$reactions", "cond": {"$eq": ["$$this.emoji", "$$emoji"]}
+            }}}}
+        }}}
+        pipeline = [{"$set": {"reactionCounts": counts}}]
+    else:
+        pipeline = [
+            # Model varsayılanı olan boş liste sözlüğe çevrilir
+            {"$set": {"reactions": {"$cond": [
+                {"$or": [{"$eq": ["$reactions", []]}, {"$eq": [{"$type": "$reactions"}, "missing"]}]},
+                {}, "$reactions"
+            ]}}},
+            {"$set": {"reactionCounts": {"$arrayToObject": {"$map": {
+                "input": {"$objectToArray": "$reactions"},
+                "in": {"k": "$$this.k", "v": {"$size": "$$this.v"}}
+            }}}}}
+        ]
+    await db.messages.update_one({**query, "reactionCounts": {"$exists": False}}, pipeline)
+
+async def uses_reaction_list(message: dict) -> bool:
+    """Mesajın tepkileri liste biçiminde mi (reactions $slice: 1 ve reactionCounts ile okunmuş)"""
+    reactions = message.get('reactions')
+    if not isinstance(reactions, list):
+        return False
+    # Sözlük biçimli mesajlarda boş liste yalnızca ilk tepkiye kadar (sayaçsız) durur
+    if reactions or 'reactionCounts' in message:
+        return True
+    return bool(message.get('groupId')) and await db.subgroups.count_documents({"id": message['groupId']}, limit=1) > 0
+
+async def toggle_reaction(query: dict, uid: str, emoji: str, entry: Optional[dict] = None) -> dict:
+    """Kullanıcının emojisini ekle/kaldır.
+
+    entry verilirse liste biçimi kullanılır. {emoji, userId, delta, count}
+    döndürür; eşzamanlı bir istek durumu zaten değiştirdiyse delta 0'dır.
+    """
+    count_field = f"reactionCounts.{emoji}"
+    if entry is None:
+        field = f"reactions.{emoji}"
+        reacted, not_reacted = {field: uid}, {field: {"$ne": uid}}
+        pull, push = {field: uid}, {field: uid}
+    else:
+        match = {"userId": uid, "emoji": emoji}
+        reacted = {"reactions": {"$elemMatch": match}}
+        not_reacted = {"reactions": {"$not": {"$elemMatch": match}}}
+        pull, push = {"reactions": match}, {"reactions": entry}
+
+    await ensure_reaction_counts(query, as_list=entry is not None)
+    projection = {"_id": 0, count_field: 1}
+
+    delta = -1
+    doc = await db.messages.find_one_and_update(
+        {**query, **reacted},
+        {"$pull": pull, "$inc": {count_field: -1}},
+        projection=projection, return_document=ReturnDocument.AFTER
+    )
+    if doc is None:
+        delta = 1
+        doc = await db.messages.find_one_and_update(
+            {**query, **not_reacted},
+            {"$push": push, "$inc": {count_field: 1}},
+            projection=projection, return_document=ReturnDocument.AFTER
+        )
+    if doc is None:
+        return {"emoji": emoji, "userId": uid, "delta": 0, "count": None}
+
+    count = doc.get('reactionCounts', {}).get(emoji, 0)
+    if count <= 0:
+        # Son tepki de kalktıysa boş emoji anahtarlarını temizle
+        unset = {count_field: ""}
+        if entry is None:
+            unset[f"reactions.{emoji}"] = ""
+        await db.messages.update_one({**query, count_field: {"$lte": 0}}, {"$unset": unset})
+        count = 0
+    return {"emoji": emoji, "userId": uid, "delta": delta, "count": count}
 
 # Models with validation
 class UserProfile(BaseModel):
@@ -195,7 +881,7 @@ class UserProfile(BaseModel):
     
     @validator('profileImageUrl', 'cvUrl')
     def validate_urls(cls, v):
-        if v and not validate_url(v):
+        if v and not validate_file_url(v):
             raise ValueError('Geçersiz URL formatı')
         return v
 
@@ -252,6 +938,8 @@ class Message(BaseModel):
     content: str
     type: str = "text"  # text, image, video, audio, file, location, contact
     fileUrl: Optional[str] = None
+    thumbnailUrl: Optional[str] = None  # Görsel varyantları (yalnızca yüklenen görseller)
+    previewUrl: Optional[str] = None
     fileName: Optional[str] = None
     fileSize: Optional[int] = None
     fileMimeType: Optional[str] = None
@@ -274,6 +962,7 @@ class Message(BaseModel):
     editedAt: Optional[datetime] = None
     # Okundu bilgisi
     status: str = "sent"  # sent, delivered, read
+    seq: Optional[int] = None  # Oda içi sıra numarası (bkz. room_counters.py)
 
     @validator('content')
     def validate_content(cls, v):
@@ -291,7 +980,7 @@ class Message(BaseModel):
     
     @validator('fileUrl')
     def validate_file_url(cls, v):
-        if v and not validate_url(v):
+        if v and not validate_file_url(v):
             raise ValueError('Geçersiz dosya URL\'i')
         return v
     deliveredTo: List[str] = []  # İletilen kullanıcılar
@@ -333,8 +1022,12 @@ class Post(BaseModel):
     userProfileImage: Optional[str] = None
     content: str
     imageUrl: Optional[str] = None
+    thumbnailUrl: Optional[str] = None
+    previewUrl: Optional[str] = None
     likes: List[str] = []
     comments: List[dict] = []
+    likeCount: int = 0
+    commentCount: int = 0
     shares: int = 0
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
@@ -346,6 +1039,7 @@ class Comment(BaseModel):
     userProfileImage: Optional[str] = None
     content: str
     likes: List[str] = []
+    likeCount: int = 0
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class Service(BaseModel):
@@ -422,39 +1116,100 @@ TURKISH_CITIES = [
     'Tekirdağ', 'Tokat', 'Trabzon', 'Tunceli', 'Uşak', 'Van', 'Yalova', 'Yozgat', 'Zonguldak'
 ]
 
+# ==================== İSTEK KAPSAMLI KULLANICI ====================
+
+# Handler'ların çoğunun ihtiyaç duyduğu alanlar (dizi alanları hariç)
+USER_CONTEXT_PROJECTION = {
+    "_id": 0, "uid": 1, "email": 1, "firstName": 1, "lastName": 1,
+    "profileImageUrl": 1, "profileImageThumbUrl": 1, "city": 1, "phone": 1, "isAdmin": 1, "isBanned": 1
+}
+
+# (uid, getirilen alanlar veya None=tam doküman, doküman) - her istek kendi context'inde
+_request_user: ContextVar[Optional[tuple]] = ContextVar('request_user', default=None)
+
+def _projection_fields(projection: Optional[dict]):
+    if projection is None:
+        return None
+    return frozenset(k for k, v in projection.items() if v and k != '_id')
+
+async def load_request_user(uid: str, projection: Optional[dict] = USER_CONTEXT_PROJECTION) -> Optional[dict]:
+    """Kullanıcı dokümanını istek başına bir kez getir.
+
+    Aynı istekte tekrar çağrıldığında, istenen alanlar daha önce getirilmişse
+    veritabanına gitmeden önbellekteki doküman döner. projection=None tam
+    dokümanı (_id hariç) getirir.
+    """
+    requested = _projection_fields(projection)
+    cached = _request_user.get()
+    if cached is not None and cached[0] == uid:
+        cached_fields, cached_user = cached[1], cached[2]
+        if cached_fields is None or (requested is not None and requested <= cached_fields):
+            return cached_user
+        if requested is not None:
+            # Eksik alanları da kapsayacak şekilde genişlet
+            requested = requested | cached_fields
+            projection = {"_id": 0, **{field: 1 for field in requested}}
+
+    user = await db.users.find_one({"uid": uid}, projection or {"_id": 0})
+    _request_user.set((uid, requested, user))
+    return user
+
+# Firebase token'ını doğrula ve yasaklı kullanıcıları engelle (HTTP ve Socket.IO ortak)
+async def authenticate_token(token: str) -> dict:
+    # Basic token validation
+    if not token or len(token) < 50:
+        logger.warning("Invalid token format received")
+        raise HTTPException(status_code=401, detail="Geçersiz token formatı")
+    
+    # Verify with Firebase (cached, off the event loop)
+    decoded_token = await token_verifier.verify(token)
+    
+    if not decoded_token or 'uid' not in decoded_token:
+        logger.warning("Token verification failed - no uid")
+        raise HTTPException(status_code=401, detail="Geçersiz token")
+    
+    # Check if user is banned (doküman istek boyunca yeniden kullanılır)
+    user = await load_request_user(decoded_token['uid'])
+    if user and user.get('isBanned', False):
+        logger.info(f"Banned user attempted access: {decoded_token['uid']}")
+        raise HTTPException(status_code=403, detail="Hesabınız engellenmiş")
+    
+    return decoded_token
+
 # Dependency to verify Firebase token with enhanced security
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        token = credentials.credentials
-        
-        # Basic token validation
-        if not token or len(token) < 50:
-            logger.warning("Invalid token format received")
-            raise HTTPException(status_code=401, detail="Geçersiz token formatı")
-        
-        # Verify with Firebase
-        decoded_token = verify_firebase_token(token)
-        
-        if not decoded_token or 'uid' not in decoded_token:
-            logger.warning("Token verification failed - no uid")
-            raise HTTPException(status_code=401, detail="Geçersiz token")
-        
-        # Check if user is banned
-        user = await db.users.find_one({"uid": decoded_token['uid']})
-        if user and user.get('isBanned', False):
-            logger.info(f"Banned user attempted access: {decoded_token['uid']}")
-            raise HTTPException(status_code=403, detail="Hesabınız engellenmiş")
-        
-        return decoded_token
+        return await authenticate_token(credentials.credentials)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Token verification error: {type(e).__name__}")
         raise HTTPException(status_code=401, detail="Kimlik doğrulama başarısız")
 
+class UserContext:
+    """Doğrulanmış kullanıcının dokümanını döndüren dependency.
+
+    get_current_user'ın ban kontrolünde getirdiği dokümanı yeniden kullanır;
+    daha geniş bir projection istenirse yalnızca bir kez ek sorgu yapılır.
+    """
+    def __init__(self, projection: Optional[dict] = USER_CONTEXT_PROJECTION, required: bool = True):
+        self.projection = projection
+        self.required = required
+
+    async def __call__(self, current_user: dict = Depends(get_current_user)) -> Optional[dict]:
+        user = await load_request_user(current_user['uid'], self.projection)
+        if user is None and self.required:
+            raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
+        return user
+
+get_user_context = UserContext()
+get_optional_user_context = UserContext(required=False)
+# Eski grup üyelikleri kullanıcı dokümanındaki groups dizisindedir
+get_user_groups_context = UserContext({**USER_CONTEXT_PROJECTION, "groups": 1})
+
 # Check if user has admin permissions
 async def check_admin_permission(current_user: dict):
-    user = await db.users.find_one({"uid": current_user['uid']})
+    user = await load_request_user(current_user['uid'])
     if not user:
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
     
@@ -474,9 +1229,9 @@ async def root(request: Request):
 @api_router.post("/user/register")
 @limiter.limit("5/minute")  # Rate limit: 5 kayıt/dakika
 async def register_user(request: Request, user_data: UserRegister, current_user: dict = Depends(get_current_user)):
-    existing_user = await db.users.find_one({"uid": current_user['uid']})
+    existing_user = await db.users.find_one({"uid": current_user['uid']}, {"_id": 0})
     if existing_user:
-        return clean_doc(existing_user)
+        return MediaJSONResponse(existing_user)
     
     # Sanitize input
     user_data.firstName = sanitize_html(user_data.firstName)
@@ -489,25 +1244,19 @@ async def register_user(request: Request, user_data: UserRegister, current_user:
     user_communities = []
     
     # Şehre göre topluluk ataması
-    city_community = await db.communities.find_one({"city": user_data.city})
+    city_community = await db.communities.find_one({"city": user_data.city}, {"_id": 0, "id": 1})
     if city_community:
         user_communities.append(city_community['id'])
         # Kullanıcıyı topluluk üyelerine ekle
-        await db.communities.update_one(
-            {"id": city_community['id']},
-            {"$addToSet": {"members": current_user['uid']}}
-        )
+        await add_community_member({"id": city_community['id']}, current_user['uid'])
     
     # Admin ise tüm toplulukların süper yöneticisi olarak ekle
     if is_admin:
-        all_communities = await db.communities.find().to_list(100)
+        all_communities = await db.communities.find({}, {"_id": 0, "id": 1}).to_list(100)
         for community in all_communities:
             if community['id'] not in user_communities:
                 user_communities.append(community['id'])
-            await db.communities.update_one(
-                {"id": community['id']},
-                {"$addToSet": {"superAdmins": current_user['uid'], "members": current_user['uid']}}
-            )
+            await add_community_member({"id": community['id']}, current_user['uid'], super_admin=True)
     
     user_profile = UserProfile(
         uid=current_user['uid'],
@@ -519,8 +1268,11 @@ async def register_user(request: Request, user_data: UserRegister, current_user:
     # communities alanını ekle
     user_dict = user_profile.dict()
     user_dict['communities'] = user_communities
+    user_dict['searchPrefixes'] = user_search_prefixes(user_dict)
     
     await db.users.insert_one(user_dict)
+    platform_stats.increment("totalUsers")
+    platform_stats.increment("newUsersThisWeek")
     
     logger.info(f"New user registered: {current_user['uid']}")
     
@@ -530,7 +1282,7 @@ async def register_user(request: Request, user_data: UserRegister, current_user:
     # Response için _id'yi kaldır (insert sonrası eklenir)
     user_dict.pop('_id', None)
     
-    return clean_doc(user_dict)
+    return MediaJSONResponse(user_dict)
 
 async def ensure_default_groups_exist(creator_uid: str, creator_name: str, is_admin: bool):
     turkey_group = await db.groups.find_one({"id": TURKEY_GROUP_ID})
@@ -579,7 +1331,7 @@ async def ensure_default_groups_exist(creator_uid: str, creator_name: str, is_ad
 
 @api_router.get("/user/profile")
 async def get_user_profile(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
+    user = await load_request_user(current_user['uid'], projection=None)
     if not user:
         # Return minimal profile if user exists in Firebase but not in DB yet
         return {
@@ -594,45 +1346,43 @@ async def get_user_profile(current_user: dict = Depends(get_current_user)):
             "groups": [],
             "needsRegistration": True
         }
-    return clean_doc(user)
+    return MediaJSONResponse(user)
 
 @api_router.put("/user/profile")
 async def update_user_profile(updates: dict, current_user: dict = Depends(get_current_user)):
+    if 'profileImageUrl' in updates:
+        # Mesaj ve gönderilerde profil fotoğrafının küçük varyantı kullanılır
+        updates['profileImageThumbUrl'] = (await file_media_fields(updates['profileImageUrl'], current_user['uid'])).get('thumbnailUrl')
     await db.users.update_one(
         {"uid": current_user['uid']},
         {"$set": updates}
     )
+    if any(field in updates for field in USER_SEARCH_FIELDS):
+        await refresh_user_search_tokens(current_user['uid'])
     return {"message": "Profile updated"}
 
 @api_router.get("/groups")
-async def get_groups(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+async def get_groups(current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     return {"city": user.get('city'), "groupId": user.get('city')}
 
 @api_router.get("/messages/{group_id}")
-async def get_messages(group_id: str, current_user: dict = Depends(get_current_user)):
-    messages = await db.messages.find({
+async def get_messages(group_id: str, current_user: dict = Depends(get_current_user), before: str = None, after: str = None, since: str = None, limit: int = MESSAGE_PAGE_LIMIT):
+    page = await fetch_message_page({
         "groupId": group_id,
         "$or": [
             {"isDeleted": {"$ne": True}},
             {"deletedForEveryone": {"$ne": True}}
         ]
-    }).sort("timestamp", -1).limit(100).to_list(100)
-    for msg in messages:
-        if '_id' in msg:
-            del msg['_id']
+    }, before=before, after=after, since=since, limit=limit)
+    for msg in page['messages']:
         # Check if deleted for this user
         if msg.get('deletedFor') and current_user['uid'] in msg.get('deletedFor', []):
             msg['isDeleted'] = True
             msg['content'] = 'Bu mesaj silindi'
-    return clean_doc(messages)
+    return MediaJSONResponse(page)
 
 @api_router.post("/messages")
-async def send_message(message: dict, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
-    
+async def send_message(message: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     new_message = Message(
         groupId=message['groupId'],
         senderId=current_user['uid'],
@@ -640,6 +1390,7 @@ async def send_message(message: dict, current_user: dict = Depends(get_current_u
         content=message.get('content', ''),
         type=message.get('type', 'text'),
         fileUrl=message.get('fileUrl'),
+        **(await file_media_fields(message.get('fileUrl'), current_user['uid'])),
         latitude=message.get('latitude'),
         longitude=message.get('longitude'),
         locationName=message.get('locationName'),
@@ -649,7 +1400,8 @@ async def send_message(message: dict, current_user: dict = Depends(get_current_u
         replyTo=message.get('replyTo')
     )
     
-    await db.messages.insert_one(new_message.dict())
+    await message_writer.insert(new_message.dict())
+    platform_stats.increment("totalMessages")
     await sio.emit('new_message', new_message.dict(), room=message['groupId'])
     
     return new_message
@@ -680,51 +1432,48 @@ async def delete_message_for_everyone(message_id: str, current_user: dict = Depe
     
     await db.messages.update_one(
         {"id": message_id},
-        {"$set": {"deletedForEveryone": True, "content": "Bu mesaj silindi", "isDeleted": True}}
+        {"$set": {"deletedForEveryone": True, "content": "Bu mesaj silindi", "isDeleted": True, "searchTokens": []}}
     )
     
     # Emit socket event
     room = message.get('groupId') or message.get('chatId')
     if room:
+        await room_counters.update_preview(room, message_id, "Bu mesaj silindi", isDeleted=True)
         await sio.emit('message_deleted', {"messageId": message_id}, room=room)
     
     return {"message": "Mesaj herkesten silindi"}
 
 # Add reaction to message
 @api_router.post("/messages/{message_id}/react")
-async def add_reaction(message_id: str, reaction_data: dict, current_user: dict = Depends(get_current_user)):
-    message = await db.messages.find_one({"id": message_id})
+async def add_reaction(message_id: str, reaction_data: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    message = await db.messages.find_one(
+        {"id": message_id},
+        {"_id": 0, "groupId": 1, "chatId": 1, "reactions": {"$slice": 1}, "reactionCounts": 1}
+    )
     if not message:
         raise HTTPException(status_code=404, detail="Mesaj bulunamadı")
     
-    emoji = reaction_data.get('emoji')
-    if not emoji:
-        raise HTTPException(status_code=400, detail="Emoji gerekli")
-    
-    reactions = message.get('reactions', {})
+    emoji = validate_reaction_emoji(reaction_data.get('emoji'))
     
-    # Toggle reaction
-    if emoji in reactions and current_user['uid'] in reactions[emoji]:
-        # Remove reaction
-        reactions[emoji].remove(current_user['uid'])
-        if not reactions[emoji]:
-            del reactions[emoji]
-    else:
-        # Add reaction
-        if emoji not in reactions:
-            reactions[emoji] = []
-        reactions[emoji].append(current_user['uid'])
+    # Alt grup mesajı (liste biçimli tepkiler) bu uçtan da tepki alabilir
+    entry = None
+    if await uses_reaction_list(message):
+        entry = {
+            "emoji": emoji,
+            "userId": current_user['uid'],
+            "userName": f"{user['firstName']} {user['lastName']}",
+            "timestamp": datetime.utcnow()
+        }
     
-    await db.messages.update_one(
-        {"id": message_id},
-        {"$set": {"reactions": reactions}}
-    )
+    update = await toggle_reaction({"id": message_id}, current_user['uid'], emoji, entry)
+    if entry:
+        update['userName'] = entry['userName']
     
     room = message.get('groupId') or message.get('chatId')
-    if room:
-        await sio.emit('message_reaction', {"messageId": message_id, "reactions": reactions}, room=room)
+    if room and update['delta']:
+        await sio.emit('message_reaction', {"messageId": message_id, **update}, room=room)
     
-    return {"reactions": reactions}
+    return {"messageId": message_id, **update}
 
 # Pin message in group
 @api_router.post("/messages/{message_id}/pin")
@@ -749,180 +1498,152 @@ async def pin_message(message_id: str, current_user: dict = Depends(get_current_
 # Get pinned messages
 @api_router.get("/messages/{group_id}/pinned")
 async def get_pinned_messages_list(group_id: str, current_user: dict = Depends(get_current_user)):
-    messages = await db.messages.find({"groupId": group_id, "isPinned": True}).sort("timestamp", -1).to_list(50)
-    for msg in messages:
-        if '_id' in msg:
-            del msg['_id']
-    return clean_doc(messages)
+    messages = await db.messages.find({"groupId": group_id, "isPinned": True}, MESSAGE_PROJECTION).sort("timestamp", -1).to_list(50)
+    return MediaJSONResponse(messages)
 
 @api_router.get("/posts")
-async def get_posts(current_user: dict = Depends(get_current_user)):
-    posts = await db.posts.find().sort("timestamp", -1).limit(50).to_list(50)
-    for post in posts:
-        if '_id' in post:
-            del post['_id']
-        # Add isLiked flag for current user
-        post['isLiked'] = current_user['uid'] in post.get('likes', [])
-        post['likeCount'] = len(post.get('likes', []))
-        post['commentCount'] = len(post.get('comments', []))
-    return clean_doc(posts)
+async def get_posts(cursor: str = None, limit: int = FEED_PAGE_LIMIT, current_user: dict = Depends(get_current_user)):
+    limit = max(1, min(limit, 50))
+    posts, has_more, next_cursor = await fetch_keyset_page(
+        db.posts, {}, cursor=cursor, limit=limit, projection=POST_LIST_PROJECTION
+    )
+    await with_like_state(db.posts, posts, current_user['uid'], POST_COUNTERS)
+    return MediaJSONResponse({"posts": posts, "hasMore": has_more, "nextCursor": next_cursor})
 
 @api_router.post("/posts")
-async def create_post(post: dict, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
-    
+async def create_post(post: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     new_post = Post(
         userId=current_user['uid'],
         userName=f"{user['firstName']} {user['lastName']}",
-        userProfileImage=user.get('profileImageUrl'),
+        userProfileImage=profile_image(user),
         content=post['content'],
-        imageUrl=post.get('imageUrl')
+        imageUrl=post.get('imageUrl'),
+        **(await file_media_fields(post.get('imageUrl'), current_user['uid']))
     )
     
     await db.posts.insert_one(new_post.dict())
+    platform_stats.increment("totalPosts")
     return new_post
 
 # Like/Unlike a post
 @api_router.post("/posts/{post_id}/like")
 async def toggle_like_post(post_id: str, current_user: dict = Depends(get_current_user)):
-    post = await db.posts.find_one({"id": post_id})
-    if not post:
+    result = await toggle_like(db.posts, post_id, current_user['uid'])
+    if result is None:
         raise HTTPException(status_code=404, detail="Gönderi bulunamadı")
-    
-    likes = post.get('likes', [])
-    if current_user['uid'] in likes:
-        # Unlike
-        await db.posts.update_one(
-            {"id": post_id},
-            {"$pull": {"likes": current_user['uid']}}
-        )
-        return {"liked": False, "likeCount": len(likes) - 1}
-    else:
-        # Like
-        await db.posts.update_one(
-            {"id": post_id},
-            {"$addToSet": {"likes": current_user['uid']}}
-        )
-        return {"liked": True, "likeCount": len(likes) + 1}
+    return result
 
 # Get comments for a post
 @api_router.get("/posts/{post_id}/comments")
-async def get_post_comments(post_id: str, current_user: dict = Depends(get_current_user)):
-    comments = await db.comments.find({"postId": post_id}).sort("timestamp", 1).to_list(100)
-    for comment in comments:
-        if '_id' in comment:
-            del comment['_id']
-        comment['isLiked'] = current_user['uid'] in comment.get('likes', [])
-        comment['likeCount'] = len(comment.get('likes', []))
-    return clean_doc(comments)
+async def get_post_comments(post_id: str, cursor: str = None, limit: int = COMMENT_PAGE_LIMIT, current_user: dict = Depends(get_current_user)):
+    limit = max(1, min(limit, 100))
+    comments, has_more, next_cursor = await fetch_keyset_page(
+        db.comments, {"postId": post_id}, cursor=cursor, limit=limit,
+        projection=COMMENT_LIST_PROJECTION, ascending=True
+    )
+    await with_like_state(db.comments, comments, current_user['uid'])
+    return MediaJSONResponse({"comments": comments, "hasMore": has_more, "nextCursor": next_cursor})
 
 # Add comment to a post
 @api_router.post("/posts/{post_id}/comments")
-async def add_comment(post_id: str, comment_data: dict, current_user: dict = Depends(get_current_user)):
-    post = await db.posts.find_one({"id": post_id})
-    if not post:
-        raise HTTPException(status_code=404, detail="Gönderi bulunamadı")
-    
-    user = await db.users.find_one({"uid": current_user['uid']})
-    
+async def add_comment(post_id: str, comment_data: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     new_comment = Comment(
         postId=post_id,
         userId=current_user['uid'],
         userName=f"{user['firstName']} {user['lastName']}",
-        userProfileImage=user.get('profileImageUrl'),
+        userProfileImage=profile_image(user),
         content=comment_data['content']
     )
     
-    await db.comments.insert_one(new_comment.dict())
-    
-    # Update comment count in post
-    await db.posts.update_one(
+    # Yorum referansı ve sayaç tek güncellemede; gönderi yoksa yorum yazılmaz
+    post = await db.posts.find_one_and_update(
         {"id": post_id},
-        {"$push": {"comments": {"id": new_comment.id, "userId": current_user['uid']}}}
+        {
+            "$push": {"comments": {"id": new_comment.id, "userId": current_user['uid']}},
+            "$inc": {"commentCount": 1}
+        },
+        projection={"_id": 0, "commentCount": 1},
+        return_document=ReturnDocument.AFTER
     )
+    if not post:
+        raise HTTPException(status_code=404, detail="Gönderi bulunamadı")
+    
+    try:
+        await db.comments.insert_one(new_comment.dict())
+    except Exception:
+        await db.posts.update_one(
+            {"id": post_id, "comments.id": new_comment.id},
+            {"$pull": {"comments": {"id": new_comment.id}}, "$inc": {"commentCount": -1}}
+        )
+        raise
     
     result = new_comment.dict()
     result['isLiked'] = False
     result['likeCount'] = 0
+    result['postCommentCount'] = post.get('commentCount', 0)
     return result
 
 # Like a comment
 @api_router.post("/comments/{comment_id}/like")
 async def toggle_like_comment(comment_id: str, current_user: dict = Depends(get_current_user)):
-    comment = await db.comments.find_one({"id": comment_id})
-    if not comment:
+    result = await toggle_like(db.comments, comment_id, current_user['uid'])
+    if result is None:
         raise HTTPException(status_code=404, detail="Yorum bulunamadı")
-    
-    likes = comment.get('likes', [])
-    if current_user['uid'] in likes:
-        await db.comments.update_one(
-            {"id": comment_id},
-            {"$pull": {"likes": current_user['uid']}}
-        )
-        return {"liked": False, "likeCount": len(likes) - 1}
-    else:
-        await db.comments.update_one(
-            {"id": comment_id},
-            {"$addToSet": {"likes": current_user['uid']}}
-        )
-        return {"liked": True, "likeCount": len(likes) + 1}
+    return result
 
 # Delete a comment
 @api_router.delete("/comments/{comment_id}")
 async def delete_comment(comment_id: str, current_user: dict = Depends(get_current_user)):
-    comment = await db.comments.find_one({"id": comment_id})
+    comment = await db.comments.find_one_and_delete(
+        {"id": comment_id, "userId": current_user['uid']},
+        projection={"_id": 0, "postId": 1}
+    )
     if not comment:
+        if await db.comments.find_one({"id": comment_id}, {"_id": 1}):
+            raise HTTPException(status_code=403, detail="Bu yorumu silme yetkiniz yok")
         raise HTTPException(status_code=404, detail="Yorum bulunamadı")
     
-    if comment['userId'] != current_user['uid']:
-        raise HTTPException(status_code=403, detail="Bu yorumu silme yetkiniz yok")
-    
-    await db.comments.delete_one({"id": comment_id})
-    await db.posts.update_one(
-        {"id": comment['postId']},
-        {"$pull": {"comments": {"id": comment_id}}}
+    # Sayaç yalnızca referans gerçekten kaldırıldıysa azalır
+    post = await db.posts.find_one_and_update(
+        {"id": comment['postId'], "comments.id": comment_id},
+        {"$pull": {"comments": {"id": comment_id}}, "$inc": {"commentCount": -1}},
+        projection={"_id": 0, "commentCount": 1},
+        return_document=ReturnDocument.AFTER
     )
-    return {"message": "Yorum silindi"}
+    if post is None:
+        post = await db.posts.find_one({"id": comment['postId']}, {"_id": 0, "commentCount": 1}) or {}
+    return {"message": "Yorum silindi", "commentCount": post.get('commentCount', 0)}
 
 # Share post (increment share count)
 @api_router.post("/posts/{post_id}/share")
 async def share_post(post_id: str, current_user: dict = Depends(get_current_user)):
-    post = await db.posts.find_one({"id": post_id})
-    if not post:
-        raise HTTPException(status_code=404, detail="Gönderi bulunamadı")
-    
-    await db.posts.update_one(
+    post = await db.posts.find_one_and_update(
         {"id": post_id},
-        {"$inc": {"shares": 1}}
+        {"$inc": {"shares": 1}},
+        projection={"_id": 0, "shares": 1},
+        return_document=ReturnDocument.AFTER
     )
-    return {"shares": post.get('shares', 0) + 1}
+    if not post:
+        raise HTTPException(status_code=404, detail="Gönderi bulunamadı")
+    return {"shares": post['shares']}
 
 # Get single post with details
 @api_router.get("/posts/{post_id}")
 async def get_post(post_id: str, current_user: dict = Depends(get_current_user)):
-    post = await db.posts.find_one({"id": post_id})
+    post = await db.posts.find_one({"id": post_id}, POST_LIST_PROJECTION)
     if not post:
         raise HTTPException(status_code=404, detail="Gönderi bulunamadı")
     
-    if '_id' in post:
-        del post['_id']
-    post['isLiked'] = current_user['uid'] in post.get('likes', [])
-    post['likeCount'] = len(post.get('likes', []))
-    post['commentCount'] = len(post.get('comments', []))
-    return post
+    await with_like_state(db.posts, [post], current_user['uid'], POST_COUNTERS)
+    return MediaJSONResponse(post)
 
 @api_router.get("/services")
 async def get_services(current_user: dict = Depends(get_current_user)):
-    services = await db.services.find().sort("timestamp", -1).to_list(100)
-    for service in services:
-        if '_id' in service:
-            del service['_id']
-    return clean_doc(services)
+    services = await db.services.find({}, {"_id": 0}).sort("timestamp", -1).to_list(100)
+    return MediaJSONResponse(services)
 
 @api_router.post("/services")
-async def create_service(service: dict, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
-    
+async def create_service(service: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     new_service = Service(
         userId=current_user['uid'],
         userName=f"{user['firstName']} {user['lastName']}",
@@ -934,39 +1655,36 @@ async def create_service(service: dict, current_user: dict = Depends(get_current
     )
     
     await db.services.insert_one(new_service.dict())
+    platform_stats.increment("totalServices")
     return new_service
 
 @api_router.get("/users")
 async def get_users(current_user: dict = Depends(get_current_user)):
-    users = await db.users.find({"uid": {"$ne": current_user['uid']}}).to_list(1000)
-    for u in users:
-        if '_id' in u:
-            del u['_id']
-    return clean_doc(users)
+    users = await db.users.find({"uid": {"$ne": current_user['uid']}}, {"_id": 0}).to_list(1000)
+    return MediaJSONResponse(users)
 
 @api_router.get("/private-messages/{other_user_id}")
-async def get_private_messages(other_user_id: str, current_user: dict = Depends(get_current_user)):
+async def get_private_messages(other_user_id: str, current_user: dict = Depends(get_current_user), before: str = None, after: str = None, since: str = None, limit: int = MESSAGE_PAGE_LIMIT):
     user_ids = sorted([current_user['uid'], other_user_id])
     chat_id = f"{user_ids[0]}_{user_ids[1]}"
     
-    messages = await db.messages.find({
+    page = await fetch_message_page({
         "chatId": chat_id,
         "$or": [
             {"deletedForEveryone": {"$ne": True}},
             {"isDeleted": {"$ne": True}}
         ]
-    }).sort("timestamp", -1).limit(100).to_list(100)
-    for msg in messages:
-        if '_id' in msg:
-            del msg['_id']
+    }, before=before, after=after, since=since, limit=limit)
+    for msg in page['messages']:
         if msg.get('deletedFor') and current_user['uid'] in msg.get('deletedFor', []):
             msg['isDeleted'] = True
             msg['content'] = 'Bu mesaj silindi'
-    return clean_doc(messages)
+    if is_latest_page(page, before, after):
+        await advance_read_cursor(current_user['uid'], chat_id, page['messages'][0])
+    return MediaJSONResponse(page)
 
 @api_router.post("/private-messages")
-async def send_private_message(message: dict, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
+async def send_private_message(message: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     receiver_id = message['receiverId']
     
     user_ids = sorted([current_user['uid'], receiver_id])
@@ -980,6 +1698,7 @@ async def send_private_message(message: dict, current_user: dict = Depends(get_c
         content=message.get('content', ''),
         type=message.get('type', 'text'),
         fileUrl=message.get('fileUrl'),
+        **(await file_media_fields(message.get('fileUrl'), current_user['uid'])),
         latitude=message.get('latitude'),
         longitude=message.get('longitude'),
         locationName=message.get('locationName'),
@@ -987,38 +1706,50 @@ async def send_private_message(message: dict, current_user: dict = Depends(get_c
         contactPhone=message.get('contactPhone'),
         contactEmail=message.get('contactEmail')
     )
+    new_message.seq = await room_counters.record(chat_id, new_message.dict(), participants=user_ids)
     
-    await db.messages.insert_one(new_message.dict())
+    await message_writer.insert(with_search_tokens(new_message.dict()))
+    platform_stats.increment("totalMessages")
+    await advance_read_cursor(current_user['uid'], chat_id, new_message.dict())
     await sio.emit('new_private_message', new_message.dict(), room=chat_id)
+    push_dispatcher.notify(
+        [receiver_id], message_notification(new_message.senderName, new_message.dict()), room_id=chat_id
+    )
     
     return new_message
 
 @api_router.get("/my-posts")
-async def get_my_posts(current_user: dict = Depends(get_current_user)):
-    posts = await db.posts.find({"userId": current_user['uid']}).sort("timestamp", -1).to_list(100)
-    for post in posts:
-        if '_id' in post:
-            del post['_id']
-    return clean_doc(posts)
+async def get_my_posts(cursor: str = None, limit: int = FEED_PAGE_LIMIT, current_user: dict = Depends(get_current_user)):
+    limit = max(1, min(limit, 50))
+    query = {"userId": current_user['uid']}
+    posts, has_more, next_cursor = await fetch_keyset_page(
+        db.posts, query, cursor=cursor, limit=limit, projection=POST_LIST_PROJECTION
+    )
+    await with_like_state(db.posts, posts, current_user['uid'], POST_COUNTERS)
+    page = {"posts": posts, "hasMore": has_more, "nextCursor": next_cursor}
+    if not cursor:
+        # Profil istatistiği için yalnızca ilk sayfada
+        page['total'] = await db.posts.count_documents(query)
+    return MediaJSONResponse(page)
 
 @api_router.delete("/posts/{post_id}")
 async def delete_post(post_id: str, current_user: dict = Depends(get_current_user)):
     post = await db.posts.find_one({"id": post_id, "userId": current_user['uid']})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    await db.posts.delete_one({"id": post_id})
+    result = await db.posts.delete_one({"id": post_id})
+    platform_stats.increment("totalPosts", -result.deleted_count)
     return {"message": "Post deleted"}
 
 async def check_admin(current_user: dict):
-    user = await db.users.find_one({"uid": current_user['uid']})
+    user = await load_request_user(current_user['uid'])
     if not user or not user.get('isAdmin', False):
         if user and user.get('email', '').lower() != ADMIN_EMAIL.lower():
             raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok.")
     return user
 
 @api_router.get("/user/is-admin")
-async def check_user_admin(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
+async def check_user_admin(current_user: dict = Depends(get_current_user), user: dict = Depends(get_optional_user_context)):
     is_admin = user.get('isAdmin', False) if user else False
     if user and user.get('email', '').lower() == ADMIN_EMAIL.lower():
         is_admin = True
@@ -1026,31 +1757,25 @@ async def check_user_admin(current_user: dict = Depends(get_current_user)):
 
 @api_router.get("/all-groups")
 async def get_all_groups(current_user: dict = Depends(get_current_user)):
-    groups = await db.groups.find().to_list(100)
+    groups = await db.groups.find({}, {"_id": 0}).to_list(100)
     
     for group in groups:
-        if '_id' in group:
-            del group['_id']
         group['memberCount'] = len(group.get('members', []))
         group['isAdmin'] = current_user['uid'] in group.get('admins', [])
     
-    return clean_doc(groups)
+    return MediaJSONResponse(groups)
 
 @api_router.get("/public-groups")
 async def get_public_groups():
-    groups = await db.groups.find().to_list(100)
+    groups = await db.groups.find({}, {"_id": 0}).to_list(100)
     
     for group in groups:
-        if '_id' in group:
-            del group['_id']
         group['memberCount'] = len(group.get('members', []))
     
-    return clean_doc(groups)
+    return MediaJSONResponse(groups)
 
 @api_router.post("/custom-groups")
-async def create_custom_group(group_data: dict, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
-    
+async def create_custom_group(group_data: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     is_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
     if not is_admin:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok.")
@@ -1089,16 +1814,11 @@ async def create_custom_group(group_data: dict, current_user: dict = Depends(get
 
 @api_router.get("/custom-groups")
 async def get_custom_groups(current_user: dict = Depends(get_current_user)):
-    groups = await db.custom_groups.find().sort("createdAt", -1).to_list(100)
-    for group in groups:
-        if '_id' in group:
-            del group['_id']
-    return clean_doc(groups)
+    groups = await db.custom_groups.find({}, {"_id": 0}).sort("createdAt", -1).to_list(100)
+    return MediaJSONResponse(groups)
 
 @api_router.delete("/custom-groups/{group_id}")
-async def delete_custom_group(group_id: str, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
-    
+async def delete_custom_group(group_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     is_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
     if not is_admin:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok.")
@@ -1111,7 +1831,7 @@ async def check_group_admin(group_id: str, user_uid: str):
     if not group:
         raise HTTPException(status_code=404, detail="Grup bulunamadı")
     
-    user = await db.users.find_one({"uid": user_uid})
+    user = await load_request_user(user_uid)
     is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
     is_group_admin = user_uid in group.get('admins', [])
     
@@ -1121,40 +1841,43 @@ async def check_group_admin(group_id: str, user_uid: str):
     return group, user
 
 @api_router.get("/admin/groups")
-async def get_admin_groups(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
+async def get_admin_groups(current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     is_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
     
     if is_admin:
-        groups = await db.groups.find().to_list(100)
+        groups = await db.groups.find({}, {"_id": 0}).to_list(100)
     else:
-        groups = await db.groups.find({"admins": current_user['uid']}).to_list(100)
+        groups = await db.groups.find({"admins": current_user['uid']}, {"_id": 0}).to_list(100)
     
     for group in groups:
-        if '_id' in group:
-            del group['_id']
         group['memberCount'] = len(group.get('members', []))
     
-    return clean_doc(groups)
+    return MediaJSONResponse(groups)
 
 @api_router.get("/admin/groups/{group_id}/members")
-async def get_group_members(group_id: str, current_user: dict = Depends(get_current_user)):
+async def get_group_members(group_id: str, cursor: str = None, limit: int = MEMBER_PAGE_LIMIT, role: str = ROLE_MEMBER, current_user: dict = Depends(get_current_user)):
+    limit = member_list_params(limit, role, (ROLE_MEMBER, ROLE_ADMIN))
     group, _ = await check_group_admin(group_id, current_user['uid'])
     
-    member_ids = group.get('members', [])
-    members = await db.users.find({"uid": {"$in": member_ids}}).to_list(1000)
+    # Eski gruplarda üyeler dokümanda; uid sırasıyla sayfala
+    admins = set(group.get('admins', []))
+    member_ids = sorted(admins if role == ROLE_ADMIN else set(group.get('members', [])))
+    if cursor:
+        member_ids = member_ids[bisect.bisect_right(member_ids, cursor):]
+    page_ids = member_ids[:limit]
+    next_cursor = page_ids[-1] if len(member_ids) > limit else None
+    members = await member_summaries(page_ids)
     
     for member in members:
-        if '_id' in member:
-            del member['_id']
-        member['isGroupAdmin'] = member['uid'] in group.get('admins', [])
+        member['isGroupAdmin'] = member['uid'] in admins
+        member['role'] = ROLE_ADMIN if member['isGroupAdmin'] else ROLE_MEMBER
         member['isBannedFromGroup'] = member['uid'] in group.get('bannedUsers', [])
         restricted_users = group.get('restrictedUsers', [])
         restriction = next((r for r in restricted_users if r.get('uid') == member['uid']), None)
         member['isRestricted'] = restriction is not None
         member['restrictedUntil'] = restriction.get('until') if restriction else None
     
-    return members
+    return MediaJSONResponse({"members": members, "hasMore": next_cursor is not None, "nextCursor": next_cursor})
 
 @api_router.post("/admin/groups/{group_id}/ban/{user_id}")
 async def ban_user_from_group(group_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
@@ -1246,6 +1969,8 @@ async def delete_user_messages(group_id: str, user_id: str, current_user: dict =
     await check_group_admin(group_id, current_user['uid'])
     
     result = await db.messages.delete_many({"groupId": group_id, "senderId": user_id})
+    platform_stats.increment("totalMessages", -result.deleted_count)
+    await room_counters.clear_preview(group_id, senderId=user_id)
     
     return {"message": f"{result.deleted_count} mesaj silindi"}
 
@@ -1259,7 +1984,11 @@ async def delete_message(message_id: str, current_user: dict = Depends(get_curre
     if group_id:
         await check_group_admin(group_id, current_user['uid'])
     
-    await db.messages.delete_one({"id": message_id})
+    result = await db.messages.delete_one({"id": message_id})
+    platform_stats.increment("totalMessages", -result.deleted_count)
+    room = group_id or message.get('chatId')
+    if room:
+        await room_counters.clear_preview(room, id=message_id)
     
     return {"message": "Mesaj silindi"}
 
@@ -1321,13 +2050,9 @@ async def get_pinned_messages(group_id: str, current_user: dict = Depends(get_cu
         raise HTTPException(status_code=404, detail="Grup bulunamadı")
     
     pinned_ids = group.get('pinnedMessages', [])
-    messages = await db.messages.find({"id": {"$in": pinned_ids}}).to_list(100)
-    
-    for msg in messages:
-        if '_id' in msg:
-            del msg['_id']
+    messages = await db.messages.find({"id": {"$in": pinned_ids}}, MESSAGE_PROJECTION).to_list(100)
     
-    return clean_doc(messages)
+    return MediaJSONResponse(messages)
 
 @api_router.post("/admin/groups/{group_id}/polls")
 async def create_poll(group_id: str, poll_data: dict, current_user: dict = Depends(get_current_user)):
@@ -1351,13 +2076,8 @@ async def create_poll(group_id: str, poll_data: dict, current_user: dict = Depen
 
 @api_router.get("/groups/{group_id}/polls")
 async def get_group_polls(group_id: str, current_user: dict = Depends(get_current_user)):
-    polls = await db.polls.find({"groupId": group_id}).sort("createdAt", -1).to_list(50)
-    
-    for poll in polls:
-        if '_id' in poll:
-            del poll['_id']
-    
-    return polls
+    polls = await db.polls.find({"groupId": group_id}, {"_id": 0}).sort("createdAt", -1).to_list(50)
+    return MediaJSONResponse(polls)
 
 @api_router.post("/polls/{poll_id}/vote")
 async def vote_on_poll(poll_id: str, option_id: str, current_user: dict = Depends(get_current_user)):
@@ -1379,8 +2099,7 @@ async def vote_on_poll(poll_id: str, option_id: str, current_user: dict = Depend
     return {"message": "Oyunuz kaydedildi"}
 
 @api_router.post("/admin/groups/{group_id}/admins/{user_id}")
-async def add_group_admin(group_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
+async def add_group_admin(group_id: str, user_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
     
     group = await db.groups.find_one({"id": group_id})
@@ -1405,8 +2124,7 @@ async def add_group_admin(group_id: str, user_id: str, current_user: dict = Depe
     return {"message": "Kullanıcı yönetici olarak eklendi"}
 
 @api_router.delete("/admin/groups/{group_id}/admins/{user_id}")
-async def remove_group_admin(group_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
+async def remove_group_admin(group_id: str, user_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
     
     group = await db.groups.find_one({"id": group_id})
@@ -1430,21 +2148,15 @@ async def remove_group_admin(group_id: str, user_id: str, current_user: dict = D
     return {"message": "Yönetici yetkisi kaldırıldı"}
 
 @api_router.get("/user/my-groups")
-async def get_my_groups(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
-    if not user:
-        raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
-    
+async def get_my_groups(current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_groups_context)):
     group_ids = user.get('groups', [])
-    groups = await db.groups.find({"id": {"$in": group_ids}}).to_list(100)
+    groups = await db.groups.find({"id": {"$in": group_ids}}, {"_id": 0}).to_list(100)
     
     for group in groups:
-        if '_id' in group:
-            del group['_id']
         group['isAdmin'] = current_user['uid'] in group.get('admins', [])
         group['memberCount'] = len(group.get('members', []))
     
-    return clean_doc(groups)
+    return MediaJSONResponse(groups)
 
 @api_router.post("/groups/{group_id}/join")
 async def join_group(group_id: str, current_user: dict = Depends(get_current_user)):
@@ -1477,169 +2189,176 @@ DEFAULT_SUBGROUPS = [
     {"name": "Ana Grup", "description": "Ana üyeler grubu", "level": 4, "icon": "👑"}
 ]
 
-# 81 şehir için toplulukları oluştur (uygulama başlatıldığında çalışır)
+def city_community_id(city: str) -> str:
+    return f"community-{city.lower().replace('ı', 'i').replace('ö', 'o').replace('ü', 'u').replace('ş', 's').replace('ç', 'c').replace('ğ', 'g').replace(' ', '-')}"
+
+def default_subgroup_id(community_id: str, sg_template: dict) -> str:
+    return f"subgroup-{community_id}-{sg_template['name'].lower().replace(' ', '-').replace('ı', 'i').replace('ş', 's').replace('ğ', 'g')}"
+
+def community_seed_version(admin_uid: Optional[str]) -> str:
+    """Şehir/alt grup şablonları veya ana admin değişince kurulum yeniden çalışır"""
+    source = repr((TURKISH_CITIES, DEFAULT_SUBGROUPS, admin_uid))
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+
+# 81 şehir için toplulukları oluştur (uygulama başlatıldığında tek süreçte çalışır)
 async def initialize_city_communities():
-    """81 şehir için toplulukları oluşturur"""
-    admin_user = await db.users.find_one({"email": ADMIN_EMAIL})
+    """81 şehir topluluğunu, duyuru kanallarını ve varsayılan alt grupları oluşturur.
+
+    Id'ler deterministiktir; eksik dokümanlar koleksiyon başına tek bulk upsert
+    ile eklenir, var olanlara dokunulmaz (tekrar çalıştırmak güvenlidir).
+    """
+    admin_user = await db.users.find_one({"email": ADMIN_EMAIL}, {"_id": 0, "uid": 1, "firstName": 1, "lastName": 1})
     admin_uid = admin_user['uid'] if admin_user else "system"
     admin_name = f"{admin_user['firstName']} {admin_user['lastName']}" if admin_user else "System"
+    admin_uids = [admin_uid] if admin_user else []
     
+    existing_ids = {
+        doc['city']: doc['id']
+        async for doc in db.communities.find({"city": {"$in": TURKISH_CITIES}}, {"_id": 0, "id": 1, "city": 1})
+    }
+    # Var olan toplulukların eksik alt gruplarına süper yöneticileri yönetici olur
+    super_admins = await memberships.uids_by_scope(existing_ids.values(), ROLE_SUPER_ADMIN)
+    
+    now = datetime.utcnow()
+    channels, subgroups, communities = [], [], []
     for city in TURKISH_CITIES:
-        existing = await db.communities.find_one({"city": city})
-        if not existing:
-            community_id = f"community-{city.lower().replace('ı', 'i').replace('ö', 'o').replace('ü', 'u').replace('ş', 's').replace('ç', 'c').replace('ğ', 'g').replace(' ', '-')}"
-            
-            # Duyuru kanalı oluştur
-            announcement_id = f"announcement-{community_id}"
-            announcement_channel = {
-                "id": announcement_id,
+        is_new = city not in existing_ids
+        community_id = existing_ids.get(city) or city_community_id(city)
+        subgroup_ids = []
+        
+        # 4 varsayılan alt grup
+        for sg_template in DEFAULT_SUBGROUPS:
+            sg_id = default_subgroup_id(community_id, sg_template)
+            subgroup_ids.append(sg_id)
+            subgroups.append({
+                "id": sg_id,
                 "communityId": community_id,
-                "name": f"{city} Duyuruları",
-                "description": "Sadece yöneticilerin mesaj atabileceği duyuru kanalı",
-                "createdAt": datetime.utcnow()
-            }
-            await db.announcement_channels.insert_one(announcement_channel)
-            
-            subgroup_ids = []
-            
-            # 4 varsayılan alt grup oluştur
-            for sg_template in DEFAULT_SUBGROUPS:
-                sg_id = f"subgroup-{community_id}-{sg_template['name'].lower().replace(' ', '-').replace('ı', 'i').replace('ş', 's').replace('ğ', 'g')}"
-                subgroup = {
-                    "id": sg_id,
-                    "communityId": community_id,
-                    "name": f"{sg_template['icon']} {sg_template['name']}",
-                    "description": f"{city} - {sg_template['description']}",
-                    "imageUrl": None,
-                    "level": sg_template['level'],
-                    "groupAdmins": [admin_uid] if admin_uid != "system" else [],
-                    "members": [admin_uid] if admin_uid != "system" and sg_template['level'] == 1 else [],
-                    "pendingRequests": [],
-                    "isPublic": sg_template['level'] == 1,  # Sadece Start grubu herkese açık
-                    "createdBy": admin_uid,
-                    "createdByName": admin_name,
-                    "createdAt": datetime.utcnow()
-                }
-                await db.subgroups.insert_one(subgroup)
-                subgroup_ids.append(sg_id)
-            
-            # Topluluk oluştur
-            new_community = {
-                "id": community_id,
-                "name": f"{city} Network Topluluğu",
-                "description": f"{city} ili girişimciler ve profesyoneller topluluğu",
-                "city": city,
-                "imageUrl": f"https://ui-avatars.com/api/?name={city}&background=4A90E2&color=fff&size=200",
-                "coverImageUrl": None,
-                "superAdmins": [admin_uid] if admin_uid != "system" else [],
-                "members": [admin_uid] if admin_uid != "system" else [],
-                "subGroups": subgroup_ids,
-                "announcementChannelId": announcement_id,
+                "name": f"{sg_template['icon']} {sg_template['name']}",
+                "description": f"{city} - {sg_template['description']}",
+                "imageUrl": None,
+                "level": sg_template['level'],
+                "groupAdmins": list(admin_uids if is_new else super_admins.get(community_id, [])),
+                "members": list(admin_uids) if is_new and sg_template['level'] == 1 else [],
+                "pendingRequests": [],
+                "isPublic": sg_template['level'] == 1,  # Sadece Start grubu herkese açık
                 "createdBy": admin_uid,
                 "createdByName": admin_name,
-                "createdAt": datetime.utcnow()
-            }
-            await db.communities.insert_one(new_community)
-        else:
-            # Mevcut toplulukları güncelle - eksik alt grupları ekle
-            community_id = existing['id']
-            existing_subgroups = await db.subgroups.find({"communityId": community_id}).to_list(10)
-            existing_names = [sg.get('name', '').replace('🚀 ', '').replace('📈 ', '').replace('⭐ ', '').replace('👑 ', '') for sg in existing_subgroups]
-            
-            for sg_template in DEFAULT_SUBGROUPS:
-                if sg_template['name'] not in existing_names:
-                    sg_id = f"subgroup-{community_id}-{sg_template['name'].lower().replace(' ', '-').replace('ı', 'i').replace('ş', 's').replace('ğ', 'g')}"
-                    subgroup = {
-                        "id": sg_id,
-                        "communityId": community_id,
-                        "name": f"{sg_template['icon']} {sg_template['name']}",
-                        "description": f"{existing['city']} - {sg_template['description']}",
-                        "imageUrl": None,
-                        "level": sg_template['level'],
-                        "groupAdmins": existing.get('superAdmins', []),
-                        "members": [],
-                        "pendingRequests": [],
-                        "isPublic": sg_template['level'] == 1,
-                        "createdBy": admin_uid,
-                        "createdByName": admin_name,
-                        "createdAt": datetime.utcnow()
-                    }
-                    await db.subgroups.insert_one(subgroup)
-                    await db.communities.update_one(
-                        {"id": community_id},
-                        {"$addToSet": {"subGroups": sg_id}}
-                    )
-    
-    logging.info("✅ Şehir toplulukları başarıyla kontrol edildi/oluşturuldu")
+                "createdAt": now
+            })
+        
+        if not is_new:
+            continue
+        
+        # Duyuru kanalı ve topluluk
+        announcement_id = f"announcement-{community_id}"
+        channels.append({
+            "id": announcement_id,
+            "communityId": community_id,
+            "name": f"{city} Duyuruları",
+            "description": "Sadece yöneticilerin mesaj atabileceği duyuru kanalı",
+            "createdAt": now
+        })
+        communities.append({
+            "id": community_id,
+            "name": f"{city} Network Topluluğu",
+            "description": f"{city} ili girişimciler ve profesyoneller topluluğu",
+            "city": city,
+            "imageUrl": f"https://ui-avatars.com/api/?name={city}&background=4A90E2&color=fff&size=200",
+            "coverImageUrl": None,
+            "superAdmins": list(admin_uids),
+            "members": list(admin_uids),
+            "subGroups": subgroup_ids,
+            "announcementChannelId": announcement_id,
+            "createdBy": admin_uid,
+            "createdByName": admin_name,
+            "createdAt": now
+        })
+    
+    if channels:
+        await db.announcement_channels.bulk_write([
+            UpdateOne(
+                {"id": channel['id']},
+                {"$setOnInsert": {key: value for key, value in channel.items() if key != 'id'}},
+                upsert=True
+            )
+            for channel in channels
+        ], ordered=False)
+    
+    new_subgroup_ids = await memberships.insert_missing_scopes(SCOPE_SUBGROUP, subgroups)
+    new_community_ids = await memberships.insert_missing_scopes(SCOPE_COMMUNITY, communities)
+    platform_stats.increment("totalSubgroups", len(new_subgroup_ids))
+    platform_stats.increment("totalCommunities", len(new_community_ids))
+    
+    # Var olan topluluklara eklenen alt grupları bağla
+    added_by_community = {}
+    for subgroup in subgroups:
+        if subgroup['id'] in new_subgroup_ids and subgroup['communityId'] not in new_community_ids:
+            added_by_community.setdefault(subgroup['communityId'], []).append(subgroup['id'])
+    if added_by_community:
+        await db.communities.bulk_write([
+            UpdateOne({"id": community_id}, {"$addToSet": {"subGroups": {"$each": subgroup_ids}}})
+            for community_id, subgroup_ids in added_by_community.items()
+        ], ordered=False)
+    
+    logging.info(
+        f"✅ Şehir toplulukları kontrol edildi: {len(new_community_ids)} topluluk, "
+        f"{len(new_subgroup_ids)} alt grup eklendi"
+    )
 
 # Tüm toplulukları getir
 @api_router.get("/communities")
 async def get_all_communities(current_user: dict = Depends(get_current_user)):
-    communities = await db.communities.find().sort("name", 1).to_list(100)
+    communities = await db.communities.find({}, WITHOUT_MEMBER_ARRAYS).sort("name", 1).to_list(100)
+    await with_membership_flags(communities, current_user['uid'], 'isSuperAdmin', ROLE_SUPER_ADMIN, db.communities)
     
     for community in communities:
-        if '_id' in community:
-            del community['_id']
-        community['memberCount'] = len(community.get('members', []))
-        community['isMember'] = current_user['uid'] in community.get('members', [])
-        community['isSuperAdmin'] = current_user['uid'] in community.get('superAdmins', [])
         community['subGroupCount'] = len(community.get('subGroups', []))
     
-    return clean_doc(communities)
+    return MediaJSONResponse(communities)
 
 # Kullanıcının topluluklarını getir
 @api_router.get("/communities/my")
 async def get_my_communities(current_user: dict = Depends(get_current_user)):
-    communities = await db.communities.find({"members": current_user['uid']}).sort("name", 1).to_list(100)
+    community_ids = await memberships.scope_ids_for_user(current_user['uid'], SCOPE_COMMUNITY)
+    communities = await db.communities.find(
+        {"id": {"$in": community_ids}}, WITHOUT_MEMBER_ARRAYS
+    ).sort("name", 1).to_list(100)
+    await with_membership_flags(communities, current_user['uid'], 'isSuperAdmin', ROLE_SUPER_ADMIN, db.communities)
     
     for community in communities:
-        if '_id' in community:
-            del community['_id']
-        community['memberCount'] = len(community.get('members', []))
-        community['isSuperAdmin'] = current_user['uid'] in community.get('superAdmins', [])
         community['subGroupCount'] = len(community.get('subGroups', []))
     
-    return clean_doc(communities)
+    return MediaJSONResponse(communities)
 
 # Tek topluluk detayı
 @api_router.get("/communities/{community_id}")
 async def get_community(community_id: str, current_user: dict = Depends(get_current_user)):
-    community = await db.communities.find_one({"id": community_id})
+    community = await db.communities.find_one({"id": community_id}, WITHOUT_MEMBER_ARRAYS)
     if not community:
         raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
     
-    if '_id' in community:
-        del community['_id']
-    
-    community['memberCount'] = len(community.get('members', []))
-    community['isMember'] = current_user['uid'] in community.get('members', [])
-    community['isSuperAdmin'] = current_user['uid'] in community.get('superAdmins', [])
+    await with_membership_flags([community], current_user['uid'], 'isSuperAdmin', ROLE_SUPER_ADMIN, db.communities)
     
     # Alt grupları seviyeye göre sıralı getir
-    subgroups = await db.subgroups.find({"communityId": community_id}).sort("level", 1).to_list(50)
+    subgroups = await db.subgroups.find(
+        {"communityId": community_id}, WITHOUT_MEMBER_ARRAYS
+    ).sort("level", 1).to_list(50)
+    await with_membership_flags(subgroups, current_user['uid'], 'isGroupAdmin', ROLE_ADMIN, db.subgroups)
     for sg in subgroups:
-        if '_id' in sg:
-            del sg['_id']
-        sg['memberCount'] = len(sg.get('members', []))
-        sg['isMember'] = current_user['uid'] in sg.get('members', [])
-        sg['isGroupAdmin'] = current_user['uid'] in sg.get('groupAdmins', [])
         sg['hasPendingRequest'] = any(r.get('userId') == current_user['uid'] and r.get('status') == 'pending' for r in sg.get('pendingRequests', []))
     
     community['subGroupsList'] = subgroups
     
-    return clean_doc(community)
+    return MediaJSONResponse(community)
 
 # Topluluğa katıl
 @api_router.post("/communities/{community_id}/join")
 async def join_community(community_id: str, current_user: dict = Depends(get_current_user)):
-    community = await db.communities.find_one({"id": community_id})
+    community = await db.communities.find_one({"id": community_id}, {"_id": 1})
     if not community:
         raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
     
-    await db.communities.update_one(
-        {"id": community_id},
-        {"$addToSet": {"members": current_user['uid']}}
-    )
+    await add_community_member({"id": community_id}, current_user['uid'])
     
     await db.users.update_one(
         {"uid": current_user['uid']},
@@ -1650,30 +2369,24 @@ async def join_community(community_id: str, current_user: dict = Depends(get_cur
     start_subgroup = await db.subgroups.find_one({
         "communityId": community_id,
         "level": 1
-    })
+    }, {"_id": 0, "id": 1})
     if start_subgroup:
-        await db.subgroups.update_one(
-            {"id": start_subgroup['id']},
-            {"$addToSet": {"members": current_user['uid']}}
-        )
+        await add_subgroup_member(start_subgroup['id'], current_user['uid'])
     
     return {"message": "Topluluğa katıldınız"}
 
 # Topluluktan ayrıl
 @api_router.post("/communities/{community_id}/leave")
 async def leave_community(community_id: str, current_user: dict = Depends(get_current_user)):
-    community = await db.communities.find_one({"id": community_id})
+    community = await db.communities.find_one({"id": community_id}, {"_id": 1})
     if not community:
         raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
     
     # Süper admin topluluktan ayrılamaz
-    if current_user['uid'] in community.get('superAdmins', []):
+    if (await resolve_roles(current_user['uid'], community_id=community_id)).is_super_admin:
         raise HTTPException(status_code=400, detail="Süper yönetici topluluktan ayrılamaz")
     
-    await db.communities.update_one(
-        {"id": community_id},
-        {"$pull": {"members": current_user['uid']}}
-    )
+    await remove_community_member({"id": community_id}, current_user['uid'])
     
     await db.users.update_one(
         {"uid": current_user['uid']},
@@ -1681,10 +2394,7 @@ async def leave_community(community_id: str, current_user: dict = Depends(get_cu
     )
     
     # Alt gruplardan da çıkar
-    await db.subgroups.update_many(
-        {"communityId": community_id},
-        {"$pull": {"members": current_user['uid'], "groupAdmins": current_user['uid']}}
-    )
+    await remove_subgroup_member({"communityId": community_id}, current_user['uid'])
     
     return {"message": "Topluluktan ayrıldınız"}
 
@@ -1692,22 +2402,15 @@ async def leave_community(community_id: str, current_user: dict = Depends(get_cu
 
 # Üyeyi bir üst seviye gruba yükselt
 @api_router.post("/subgroups/{subgroup_id}/promote/{user_id}")
-async def promote_member(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def promote_member(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    if not community:
-        raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
-    
     # Yetki kontrolü
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_group_admin = current_user['uid'] in subgroup.get('groupAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_group_admin and not is_global_admin:
+    if not roles.can_manage_subgroup:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
     
     # Mevcut seviye
@@ -1717,42 +2420,28 @@ async def promote_member(subgroup_id: str, user_id: str, current_user: dict = De
     next_subgroup = await db.subgroups.find_one({
         "communityId": subgroup['communityId'],
         "level": current_level + 1
-    })
+    }, {"_id": 0, "id": 1, "name": 1})
     
     if not next_subgroup:
         raise HTTPException(status_code=400, detail="Üst seviye grup bulunamadı")
     
     # Üyeyi mevcut gruptan çıkar ve üst gruba ekle
-    await db.subgroups.update_one(
-        {"id": subgroup_id},
-        {"$pull": {"members": user_id}}
-    )
-    
-    await db.subgroups.update_one(
-        {"id": next_subgroup['id']},
-        {"$addToSet": {"members": user_id}}
-    )
+    await remove_subgroup_member({"id": subgroup_id}, user_id, roles=(ROLE_MEMBER,))
+    await add_subgroup_member(next_subgroup['id'], user_id)
     
     return {"message": f"Üye {next_subgroup['name']} grubuna yükseltildi", "newGroupId": next_subgroup['id']}
 
 # Üyeyi bir alt seviye gruba düşür
 @api_router.post("/subgroups/{subgroup_id}/demote/{user_id}")
-async def demote_member(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def demote_member(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    if not community:
-        raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
-    
     # Yetki kontrolü
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_group_admin = current_user['uid'] in subgroup.get('groupAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_group_admin and not is_global_admin:
+    if not roles.can_manage_subgroup:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
     
     # Mevcut seviye
@@ -1765,42 +2454,28 @@ async def demote_member(subgroup_id: str, user_id: str, current_user: dict = Dep
     prev_subgroup = await db.subgroups.find_one({
         "communityId": subgroup['communityId'],
         "level": current_level - 1
-    })
+    }, {"_id": 0, "id": 1, "name": 1})
     
     if not prev_subgroup:
         raise HTTPException(status_code=400, detail="Alt seviye grup bulunamadı")
     
     # Üyeyi mevcut gruptan çıkar ve alt gruba ekle
-    await db.subgroups.update_one(
-        {"id": subgroup_id},
-        {"$pull": {"members": user_id}}
-    )
-    
-    await db.subgroups.update_one(
-        {"id": prev_subgroup['id']},
-        {"$addToSet": {"members": user_id}}
-    )
+    await remove_subgroup_member({"id": subgroup_id}, user_id, roles=(ROLE_MEMBER,))
+    await add_subgroup_member(prev_subgroup['id'], user_id)
     
     return {"message": f"Üye {prev_subgroup['name']} grubuna düşürüldü", "newGroupId": prev_subgroup['id']}
 
 # Alt grup bilgilerini güncelle (foto, açıklama)
 @api_router.put("/subgroups/{subgroup_id}")
-async def update_subgroup(subgroup_id: str, updates: dict, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def update_subgroup(subgroup_id: str, updates: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    if not community:
-        raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
-    
     # Yetki kontrolü
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_group_admin = current_user['uid'] in subgroup.get('groupAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_group_admin and not is_global_admin:
+    if not roles.can_manage_subgroup:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
     
     # Güncellenebilir alanlar
@@ -1817,21 +2492,15 @@ async def update_subgroup(subgroup_id: str, updates: dict, current_user: dict =
 
 # Gruba yönetici ekle
 @api_router.post("/subgroups/{subgroup_id}/add-admin/{user_id}")
-async def add_subgroup_admin(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def add_subgroup_admin(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    if not community:
-        raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
-    
     # Yetki kontrolü - sadece süper admin ve global admin
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_global_admin:
+    if not roles.can_manage_community:
         raise HTTPException(status_code=403, detail="Sadece süper yöneticiler admin ekleyebilir")
     
     # Kullanıcının var olduğunu kontrol et
@@ -1840,52 +2509,40 @@ async def add_subgroup_admin(subgroup_id: str, user_id: str, current_user: dict
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
     
     # Admin olarak ekle ve üye olarak da ekle
-    await db.subgroups.update_one(
-        {"id": subgroup_id},
-        {"$addToSet": {"groupAdmins": user_id, "members": user_id}}
-    )
+    await add_subgroup_member(subgroup_id, user_id, admin=True)
     
     return {"message": f"{target_user['firstName']} {target_user['lastName']} yönetici olarak eklendi"}
 
 # Gruptan yönetici çıkar
 @api_router.post("/subgroups/{subgroup_id}/remove-admin/{user_id}")
-async def remove_subgroup_admin(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def remove_subgroup_admin(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    if not community:
-        raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
-    
     # Yetki kontrolü
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_global_admin:
+    if not roles.can_manage_community:
         raise HTTPException(status_code=403, detail="Sadece süper yöneticiler admin çıkarabilir")
     
     # Kendini çıkaramaz
     if user_id == current_user['uid']:
         raise HTTPException(status_code=400, detail="Kendinizi yöneticilikten çıkaramazsınız")
     
-    await db.subgroups.update_one(
-        {"id": subgroup_id},
-        {"$pull": {"groupAdmins": user_id}}
-    )
+    await remove_subgroup_member({"id": subgroup_id}, user_id, roles=(ROLE_ADMIN,))
     
     return {"message": "Yönetici yetkisi alındı"}
 
 # Gruba katılma isteği gönder
 @api_router.post("/subgroups/{subgroup_id}/request-join")
-async def request_join_subgroup(subgroup_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def request_join_subgroup(subgroup_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
     # Zaten üye mi kontrol et
-    if current_user['uid'] in subgroup.get('members', []):
+    if (await subgroup_roles(current_user['uid'], subgroup)).is_member:
         raise HTTPException(status_code=400, detail="Zaten bu grubun üyesisiniz")
     
     # Zaten bekleyen istek var mı
@@ -1894,7 +2551,6 @@ async def request_join_subgroup(subgroup_id: str, current_user: dict = Depends(g
         raise HTTPException(status_code=400, detail="Zaten bekleyen bir isteğiniz var")
     
     # Kullanıcı bilgilerini al
-    user = await db.users.find_one({"uid": current_user['uid']})
     user_name = f"{user['firstName']} {user['lastName']}" if user else "Bilinmeyen"
     
     # Yeni istek oluştur
@@ -1917,22 +2573,15 @@ async def request_join_subgroup(subgroup_id: str, current_user: dict = Depends(g
 
 # Bekleyen istekleri getir
 @api_router.get("/subgroups/{subgroup_id}/pending-requests")
-async def get_pending_requests(subgroup_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def get_pending_requests(subgroup_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    if not community:
-        raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
-    
     # Yetki kontrolü
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_group_admin = current_user['uid'] in subgroup.get('groupAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_group_admin and not is_global_admin:
+    if not roles.can_manage_subgroup:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
     
     pending = [r for r in subgroup.get('pendingRequests', []) if r.get('status') == 'pending']
@@ -1940,22 +2589,15 @@ async def get_pending_requests(subgroup_id: str, current_user: dict = Depends(ge
 
 # Katılma isteğini onayla
 @api_router.post("/subgroups/{subgroup_id}/approve-request/{request_id}")
-async def approve_join_request(subgroup_id: str, request_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def approve_join_request(subgroup_id: str, request_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    if not community:
-        raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
-    
     # Yetki kontrolü
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_group_admin = current_user['uid'] in subgroup.get('groupAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_group_admin and not is_global_admin:
+    if not roles.can_manage_subgroup:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
     
     # İsteği bul
@@ -1971,10 +2613,7 @@ async def approve_join_request(subgroup_id: str, request_id: str, current_user:
     user_id = request['userId']
     
     # Üye olarak ekle
-    await db.subgroups.update_one(
-        {"id": subgroup_id},
-        {"$addToSet": {"members": user_id}}
-    )
+    await add_subgroup_member(subgroup_id, user_id)
     
     # İstek durumunu güncelle
     await db.subgroups.update_one(
@@ -1986,22 +2625,15 @@ async def approve_join_request(subgroup_id: str, request_id: str, current_user:
 
 # Katılma isteğini reddet
 @api_router.post("/subgroups/{subgroup_id}/reject-request/{request_id}")
-async def reject_join_request(subgroup_id: str, request_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def reject_join_request(subgroup_id: str, request_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    if not community:
-        raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
-    
     # Yetki kontrolü
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_group_admin = current_user['uid'] in subgroup.get('groupAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_group_admin and not is_global_admin:
+    if not roles.can_manage_subgroup:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
     
     # İsteği bul ve durumunu güncelle
@@ -2014,94 +2646,70 @@ async def reject_join_request(subgroup_id: str, request_id: str, current_user: d
 
 # Kullanıcıyı direkt gruba ekle (yönetici tarafından)
 @api_router.post("/subgroups/{subgroup_id}/add-member/{user_id}")
-async def add_member_to_subgroup(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def add_member_to_subgroup(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    if not community:
-        raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
-    
     # Yetki kontrolü
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_group_admin = current_user['uid'] in subgroup.get('groupAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_group_admin and not is_global_admin:
+    if not roles.can_manage_subgroup:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
     
     # Kullanıcıyı ekle
-    await db.subgroups.update_one(
-        {"id": subgroup_id},
-        {"$addToSet": {"members": user_id}}
-    )
+    await add_subgroup_member(subgroup_id, user_id)
     
     return {"message": "Üye eklendi"}
 
 # Kullanıcıyı gruptan çıkar
 @api_router.post("/subgroups/{subgroup_id}/remove-member/{user_id}")
-async def remove_member_from_subgroup(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def remove_member_from_subgroup(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    if not community:
-        raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
-    
     # Yetki kontrolü
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_group_admin = current_user['uid'] in subgroup.get('groupAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_group_admin and not is_global_admin:
+    if not roles.can_manage_subgroup:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
     
     # Süper admin çıkarılamaz
-    if user_id in community.get('superAdmins', []):
+    target_roles = await subgroup_roles(user_id, subgroup)
+    if target_roles.is_super_admin:
         raise HTTPException(status_code=400, detail="Süper yönetici gruptan çıkarılamaz")
     
-    await db.subgroups.update_one(
-        {"id": subgroup_id},
-        {"$pull": {"members": user_id, "groupAdmins": user_id}}
-    )
+    await remove_subgroup_member({"id": subgroup_id}, user_id)
     
     return {"message": "Üye gruptan çıkarıldı"}
 
 # Alt grup üyelerini getir
 @api_router.get("/subgroups/{subgroup_id}/members")
-async def get_subgroup_members(subgroup_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def get_subgroup_members(subgroup_id: str, cursor: str = None, limit: int = MEMBER_PAGE_LIMIT, role: str = ROLE_MEMBER, current_user: dict = Depends(get_current_user)):
+    limit = member_list_params(limit, role, (ROLE_MEMBER, ROLE_ADMIN))
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, {"_id": 1})
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    member_ids = subgroup.get('members', [])
-    members = await db.users.find({"uid": {"$in": member_ids}}).to_list(1000)
-    
-    for member in members:
-        member.pop('_id', None)
-        member['isGroupAdmin'] = member['uid'] in subgroup.get('groupAdmins', [])
+    members, next_cursor = await member_page(subgroup_id, cursor, limit, role)
+    await with_member_roles(subgroup_id, members, 'isGroupAdmin', ROLE_ADMIN, listed_role=role)
     
-    return clean_doc(members)
+    return MediaJSONResponse({"members": members, "hasMore": next_cursor is not None, "nextCursor": next_cursor})
 
 # ==================== ALT GRUP API'LERİ ====================
 
 # Topluluğa alt grup ekle (sadece süper admin)
 @api_router.post("/communities/{community_id}/subgroups")
-async def create_subgroup(community_id: str, subgroup_data: dict, current_user: dict = Depends(get_current_user)):
-    community = await db.communities.find_one({"id": community_id})
+async def create_subgroup(community_id: str, subgroup_data: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    community = await db.communities.find_one({"id": community_id}, {"_id": 0, "id": 1})
     if not community:
         raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
     
     # Süper admin kontrolü
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await resolve_roles(current_user['uid'], user, community_id=community_id)
     
-    if not is_super_admin and not is_global_admin:
+    if not roles.can_manage_community:
         raise HTTPException(status_code=403, detail="Bu işlem için süper yönetici yetkisi gerekiyor")
     
     subgroup_id = str(uuid.uuid4())
@@ -2120,7 +2728,8 @@ async def create_subgroup(community_id: str, subgroup_data: dict, current_user:
         "createdAt": datetime.utcnow()
     }
     
-    await db.subgroups.insert_one(new_subgroup)
+    await memberships.insert_scope(SCOPE_SUBGROUP, new_subgroup)
+    platform_stats.increment("totalSubgroups")
     
     # Topluluğa alt grup ID'sini ekle
     await db.communities.update_one(
@@ -2136,34 +2745,32 @@ async def create_subgroup(community_id: str, subgroup_data: dict, current_user:
 # Alt grup detayı
 @api_router.get("/subgroups/{subgroup_id}")
 async def get_subgroup(subgroup_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    if '_id' in subgroup:
-        del subgroup['_id']
-    
-    subgroup['memberCount'] = len(subgroup.get('members', []))
-    subgroup['isMember'] = current_user['uid'] in subgroup.get('members', [])
-    subgroup['isGroupAdmin'] = current_user['uid'] in subgroup.get('groupAdmins', [])
+    roles = await subgroup_roles(current_user['uid'], subgroup)
+    await fill_member_counts(db.subgroups, [subgroup])
+    subgroup['isMember'] = roles.is_member
+    subgroup['isGroupAdmin'] = roles.is_group_admin
     
     # Topluluk bilgisi
-    community = await db.communities.find_one({"id": subgroup['communityId']})
+    community = await db.communities.find_one({"id": subgroup['communityId']}, {"_id": 0, "name": 1})
     if community:
         subgroup['communityName'] = community['name']
-        subgroup['isSuperAdmin'] = current_user['uid'] in community.get('superAdmins', [])
+        subgroup['isSuperAdmin'] = roles.is_super_admin
     
     return subgroup
 
 # Alt gruba katılma isteği gönder
 @api_router.post("/subgroups/{subgroup_id}/request-join")
-async def request_join_subgroup(subgroup_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def request_join_subgroup(subgroup_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
     # Zaten üye mi kontrol et
-    if current_user['uid'] in subgroup.get('members', []):
+    if (await subgroup_roles(current_user['uid'], subgroup)).is_member:
         raise HTTPException(status_code=400, detail="Zaten bu grubun üyesisiniz")
     
     # Bekleyen istek var mı kontrol et
@@ -2171,14 +2778,10 @@ async def request_join_subgroup(subgroup_id: str, current_user: dict = Depends(g
     if pending:
         raise HTTPException(status_code=400, detail="Zaten bekleyen bir isteğiniz var")
     
-    user = await db.users.find_one({"uid": current_user['uid']})
     
     # Eğer grup herkese açıksa direkt katıl
     if subgroup.get('isPublic', True):
-        await db.subgroups.update_one(
-            {"id": subgroup_id},
-            {"$addToSet": {"members": current_user['uid']}}
-        )
+        await add_subgroup_member(subgroup_id, current_user['uid'])
         return {"message": "Gruba katıldınız", "status": "joined"}
     
     # Değilse istek oluştur
@@ -2186,7 +2789,7 @@ async def request_join_subgroup(subgroup_id: str, current_user: dict = Depends(g
         "id": str(uuid.uuid4()),
         "userId": current_user['uid'],
         "userName": f"{user['firstName']} {user['lastName']}",
-        "userProfileImage": user.get('profileImageUrl'),
+        "userProfileImage": profile_image(user),
         "status": "pending",
         "createdAt": datetime.utcnow()
     }
@@ -2200,23 +2803,18 @@ async def request_join_subgroup(subgroup_id: str, current_user: dict = Depends(g
 
 # Katılma isteğini onayla/reddet (grup yöneticisi veya süper admin)
 @api_router.post("/subgroups/{subgroup_id}/requests/{request_id}/{action}")
-async def handle_join_request(subgroup_id: str, request_id: str, action: str, current_user: dict = Depends(get_current_user)):
+async def handle_join_request(subgroup_id: str, request_id: str, action: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     if action not in ['approve', 'reject']:
         raise HTTPException(status_code=400, detail="Geçersiz işlem")
     
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
     # Yetki kontrolü
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    user = await db.users.find_one({"uid": current_user['uid']})
-    
-    is_group_admin = current_user['uid'] in subgroup.get('groupAdmins', [])
-    is_super_admin = current_user['uid'] in community.get('superAdmins', []) if community else False
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_group_admin and not is_super_admin and not is_global_admin:
+    if not roles.can_manage_subgroup:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
     
     # İsteği bul
@@ -2226,10 +2824,7 @@ async def handle_join_request(subgroup_id: str, request_id: str, action: str, cu
     
     if action == 'approve':
         # Üye olarak ekle
-        await db.subgroups.update_one(
-            {"id": subgroup_id},
-            {"$addToSet": {"members": request['userId']}}
-        )
+        await add_subgroup_member(subgroup_id, request['userId'])
         # İsteği güncelle
         await db.subgroups.update_one(
             {"id": subgroup_id, "pendingRequests.id": request_id},
@@ -2247,35 +2842,29 @@ async def handle_join_request(subgroup_id: str, request_id: str, action: str, cu
 # Alt gruptan ayrıl
 @api_router.post("/subgroups/{subgroup_id}/leave")
 async def leave_subgroup(subgroup_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, {"_id": 1})
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    await db.subgroups.update_one(
-        {"id": subgroup_id},
-        {"$pull": {"members": current_user['uid'], "groupAdmins": current_user['uid']}}
-    )
+    await remove_subgroup_member({"id": subgroup_id}, current_user['uid'])
     
     return {"message": "Gruptan ayrıldınız"}
 
 # Alt grup sil (sadece süper admin)
 @api_router.delete("/subgroups/{subgroup_id}")
-async def delete_subgroup(subgroup_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def delete_subgroup(subgroup_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    user = await db.users.find_one({"uid": current_user['uid']})
-    
-    is_super_admin = current_user['uid'] in community.get('superAdmins', []) if community else False
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_global_admin:
+    if not roles.can_manage_community:
         raise HTTPException(status_code=403, detail="Bu işlem için süper yönetici yetkisi gerekiyor")
     
     # Alt grubu sil
-    await db.subgroups.delete_one({"id": subgroup_id})
+    result = await db.subgroups.delete_one({"id": subgroup_id})
+    platform_stats.increment("totalSubgroups", -result.deleted_count)
     
     # Topluluktan ID'yi kaldır
     await db.communities.update_one(
@@ -2283,8 +2872,12 @@ async def delete_subgroup(subgroup_id: str, current_user: dict = Depends(get_cur
         {"$pull": {"subGroups": subgroup_id}}
     )
     
+    # Üyelikleri sil
+    await memberships.delete_scope(subgroup_id)
+    
     # Alt grup mesajlarını sil
-    await db.messages.delete_many({"groupId": subgroup_id})
+    result = await db.messages.delete_many({"groupId": subgroup_id})
+    platform_stats.increment("totalMessages", -result.deleted_count)
     
     return {"message": "Alt grup silindi"}
 
@@ -2292,36 +2885,35 @@ async def delete_subgroup(subgroup_id: str, current_user: dict = Depends(get_cur
 
 # Duyuru kanalı mesajlarını getir
 @api_router.get("/communities/{community_id}/announcements")
-async def get_announcements(community_id: str, current_user: dict = Depends(get_current_user)):
-    community = await db.communities.find_one({"id": community_id})
+async def get_announcements(community_id: str, current_user: dict = Depends(get_current_user), before: str = None, after: str = None, since: str = None, limit: int = 50):
+    community = await db.communities.find_one({"id": community_id}, WITHOUT_MEMBER_ARRAYS)
     if not community:
         raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
     
     announcement_channel_id = community.get('announcementChannelId')
     if not announcement_channel_id:
-        return []
-    
-    messages = await db.messages.find({"groupId": announcement_channel_id}).sort("timestamp", -1).limit(50).to_list(50)
+        return {"messages": [], "hasMore": False, "beforeCursor": None, "afterCursor": None}
     
-    for msg in messages:
-        if '_id' in msg:
-            del msg['_id']
+    page = await fetch_message_page(
+        {"groupId": announcement_channel_id},
+        before=before, after=after, since=since, limit=limit
+    )
+    if is_latest_page(page, before, after):
+        await advance_read_cursor(current_user['uid'], announcement_channel_id, page['messages'][0])
     
-    return clean_doc(messages)
+    return MediaJSONResponse(page)
 
 # Duyuru gönder (sadece süper admin)
 @api_router.post("/communities/{community_id}/announcements")
-async def send_announcement(community_id: str, message_data: dict, current_user: dict = Depends(get_current_user)):
-    community = await db.communities.find_one({"id": community_id})
+async def send_announcement(community_id: str, message_data: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    community = await db.communities.find_one({"id": community_id}, WITHOUT_MEMBER_ARRAYS)
     if not community:
         raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
     
     # Süper admin kontrolü
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_super_admin = current_user['uid'] in community.get('superAdmins', [])
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await resolve_roles(current_user['uid'], user, community_id=community_id)
     
-    if not is_super_admin and not is_global_admin:
+    if not roles.can_manage_community:
         raise HTTPException(status_code=403, detail="Sadece süper yöneticiler duyuru gönderebilir")
     
     announcement_channel_id = community.get('announcementChannelId')
@@ -2335,14 +2927,22 @@ async def send_announcement(community_id: str, message_data: dict, current_user:
         "type": "announcement",
         "timestamp": datetime.utcnow()
     }
+    new_message['seq'] = await room_counters.record(announcement_channel_id, new_message)
     
-    await db.messages.insert_one(new_message)
+    await message_writer.insert(with_search_tokens(new_message))
+    platform_stats.increment("totalMessages")
+    await advance_read_cursor(current_user['uid'], announcement_channel_id, new_message)
     
     # Socket.IO ile bildirim gönder
     await sio.emit('new_announcement', {
         "communityId": community_id,
         "message": new_message
     }, room=community_id)
+    push_dispatcher.notify(
+        member_uid_batches(community_id),
+        message_notification(f"📢 {community['name']}", new_message, room_id=community_id),
+        room_id=community_id, exclude=[current_user['uid']]
+    )
     
     if '_id' in new_message:
         del new_message['_id']
@@ -2353,53 +2953,60 @@ async def send_announcement(community_id: str, message_data: dict, current_user:
 
 # Alt grup mesajlarını getir
 @api_router.get("/subgroups/{subgroup_id}/messages")
-async def get_subgroup_messages(subgroup_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def get_subgroup_messages(subgroup_id: str, current_user: dict = Depends(get_current_user), before: str = None, after: str = None, since: str = None, limit: int = MESSAGE_PAGE_LIMIT):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
     # Üyelik kontrolü
-    if current_user['uid'] not in subgroup.get('members', []):
+    if not (await subgroup_roles(current_user['uid'], subgroup)).is_member:
         raise HTTPException(status_code=403, detail="Bu grubun üyesi değilsiniz")
     
-    messages = await db.messages.find({
+    page = await fetch_message_page({
         "groupId": subgroup_id,
         "deletedForEveryone": {"$ne": True},
         "deletedFor": {"$nin": [current_user['uid']]}
-    }).sort("timestamp", -1).limit(100).to_list(100)
+    }, before=before, after=after, since=since, limit=limit)
     
-    for msg in messages:
-        if '_id' in msg:
-            del msg['_id']
+    for msg in page['messages']:
         # Kullanıcı için silinmiş mesajları işaretle
         if current_user['uid'] in msg.get('deletedFor', []):
             msg['isDeleted'] = True
             msg['content'] = 'Bu mesaj silindi'
     
-    # Mesajları okundu olarak işaretle
-    await db.messages.update_many(
-        {
-            "groupId": subgroup_id,
-            "senderId": {"$ne": current_user['uid']},
-            "readBy": {"$nin": [current_user['uid']]}
-        },
-        {"$addToSet": {"readBy": current_user['uid']}, "$set": {"status": "read"}}
-    )
-    
-    return clean_doc(messages)
+    # En yeni mesajlar getirildiyse okundu imlecini ilerlet
+    read_cursor = None
+    if is_latest_page(page, before, after):
+        read_cursor = await advance_read_cursor(current_user['uid'], subgroup_id, page['messages'][0])
+        if read_cursor:
+            await sio.emit('messages_read', {
+                "userId": current_user['uid'],
+                "groupId": subgroup_id,
+                **read_cursor
+            }, room=subgroup_id)
+    if read_cursor is None:
+        read_cursor = await get_read_cursor(current_user['uid'], subgroup_id)
+    page['readCursor'] = read_cursor
+    
+    # Kendi mesajlarının okundu durumu diğer üyelerin imleçlerinden türetilir
+    others_read_at = await latest_read_by_others(subgroup_id, current_user['uid'])
+    for msg in page['messages']:
+        if msg['senderId'] == current_user['uid'] and others_read_at and msg['timestamp'] <= others_read_at:
+            msg['status'] = 'read'
+    
+    return MediaJSONResponse(page)
 
 # Alt gruba mesaj gönder
 @api_router.post("/subgroups/{subgroup_id}/messages")
-async def send_subgroup_message(subgroup_id: str, message_data: dict, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def send_subgroup_message(subgroup_id: str, message_data: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
     # Üyelik kontrolü
-    if current_user['uid'] not in subgroup.get('members', []):
+    if not (await subgroup_roles(current_user['uid'], subgroup)).is_member:
         raise HTTPException(status_code=403, detail="Bu grubun üyesi değilsiniz")
     
-    user = await db.users.find_one({"uid": current_user['uid']})
     
     # Yanıtlanan mesaj bilgisi
     reply_content = None
@@ -2415,17 +3022,19 @@ async def send_subgroup_message(subgroup_id: str, message_data: dict, current_us
         "groupId": subgroup_id,
         "senderId": current_user['uid'],
         "senderName": f"{user['firstName']} {user['lastName']}",
-        "senderProfileImage": user.get('profileImageUrl'),
+        "senderProfileImage": profile_image(user),
         "content": message_data.get('content', ''),
         "type": message_data.get('type', 'text'),
         "fileUrl": message_data.get('fileUrl'),
         "fileName": message_data.get('fileName'),
         "fileSize": message_data.get('fileSize'),
         "fileMimeType": message_data.get('fileMimeType'),
+        **(await file_media_fields(message_data.get('fileUrl'), current_user['uid'])),
         "replyTo": message_data.get('replyTo'),
         "replyToContent": reply_content,
         "replyToSenderName": reply_sender_name,
         "reactions": [],
+        "reactionCounts": {},
         "isPinned": False,
         "isDeleted": False,
         "deletedForEveryone": False,
@@ -2433,65 +3042,55 @@ async def send_subgroup_message(subgroup_id: str, message_data: dict, current_us
         "isEdited": False,
         "editHistory": [],
         "status": "sent",
-        "deliveredTo": [],
-        "readBy": [current_user['uid']],  # Gönderen okumuş sayılır
         "timestamp": datetime.utcnow()
     }
+    new_message['seq'] = await room_counters.record(subgroup_id, new_message)
     
-    await db.messages.insert_one(new_message)
+    await message_writer.insert(with_search_tokens(new_message))
+    platform_stats.increment("totalMessages")
+    await advance_read_cursor(current_user['uid'], subgroup_id, new_message)
     
     # Socket.IO ile mesaj gönder
     if '_id' in new_message:
         del new_message['_id']
+    typing_tracker.stop_typing(subgroup_id, current_user['uid'])
     await sio.emit('new_subgroup_message', new_message, room=subgroup_id)
+    push_dispatcher.notify(
+        member_uid_batches(subgroup_id),
+        message_notification(subgroup['name'], new_message, sender=new_message['senderName']),
+        room_id=subgroup_id, exclude=[current_user['uid']]
+    )
     
     return new_message
 
 # Mesaja emoji reaksiyon ekle/kaldır
 @api_router.post("/subgroups/{subgroup_id}/messages/{message_id}/react")
-async def toggle_message_reaction(subgroup_id: str, message_id: str, reaction_data: dict, current_user: dict = Depends(get_current_user)):
-    message = await db.messages.find_one({"id": message_id, "groupId": subgroup_id})
+async def toggle_message_reaction(subgroup_id: str, message_id: str, reaction_data: dict, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    message = await db.messages.find_one({"id": message_id, "groupId": subgroup_id}, {"_id": 1})
     if not message:
         raise HTTPException(status_code=404, detail="Mesaj bulunamadı")
     
-    user = await db.users.find_one({"uid": current_user['uid']})
-    emoji = reaction_data.get('emoji')
-    
-    if not emoji:
-        raise HTTPException(status_code=400, detail="Emoji gerekli")
-    
-    reactions = message.get('reactions', [])
-    
-    # Aynı kullanıcının aynı emojisi var mı kontrol et
-    existing_reaction = next(
-        (r for r in reactions if r.get('userId') == current_user['uid'] and r.get('emoji') == emoji), 
-        None
-    )
+    emoji = validate_reaction_emoji(reaction_data.get('emoji'))
+    user_name = f"{user['firstName']} {user['lastName']}"
     
-    if existing_reaction:
-        # Reaksiyonu kaldır
-        reactions = [r for r in reactions if not (r.get('userId') == current_user['uid'] and r.get('emoji') == emoji)]
-    else:
-        # Reaksiyon ekle
-        reactions.append({
+    update = await toggle_reaction(
+        {"id": message_id, "groupId": subgroup_id},
+        current_user['uid'],
+        emoji,
+        entry={
             "emoji": emoji,
             "userId": current_user['uid'],
-            "userName": f"{user['firstName']} {user['lastName']}",
+            "userName": user_name,
             "timestamp": datetime.utcnow()
-        })
-    
-    await db.messages.update_one(
-        {"id": message_id},
-        {"$set": {"reactions": reactions}}
+        }
     )
+    update['userName'] = user_name
     
-    # Socket.IO ile bildir
-    await sio.emit('message_reaction_update', {
-        "messageId": message_id,
-        "reactions": reactions
-    }, room=subgroup_id)
+    # Socket.IO ile yalnızca değişikliği bildir
+    if update['delta']:
+        await sio.emit('message_reaction_update', {"messageId": message_id, **update}, room=subgroup_id)
     
-    return {"reactions": reactions}
+    return {"messageId": message_id, **update}
 
 # Mesajı düzenle
 @api_router.put("/subgroups/{subgroup_id}/messages/{message_id}")
@@ -2522,10 +3121,12 @@ async def edit_message(subgroup_id: str, message_id: str, edit_data: dict, curre
                 "content": new_content,
                 "isEdited": True,
                 "editedAt": datetime.utcnow(),
-                "editHistory": edit_history
+                "editHistory": edit_history,
+                "searchTokens": message_search_tokens(new_content)
             }
         }
     )
+    await room_counters.update_preview(subgroup_id, message_id, new_content)
     
     # Socket.IO ile bildir
     await sio.emit('message_edited', {
@@ -2553,23 +3154,16 @@ async def delete_message_for_me_subgroup(subgroup_id: str, message_id: str, curr
 
 # Mesajı sil (herkesten sil)
 @api_router.delete("/subgroups/{subgroup_id}/messages/{message_id}/delete-for-everyone")
-async def delete_message_for_everyone_subgroup(subgroup_id: str, message_id: str, current_user: dict = Depends(get_current_user)):
+async def delete_message_for_everyone_subgroup(subgroup_id: str, message_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
     message = await db.messages.find_one({"id": message_id, "groupId": subgroup_id})
     if not message:
         raise HTTPException(status_code=404, detail="Mesaj bulunamadı")
     
-    # Sadece mesaj sahibi veya admin herkesten silebilir
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
-    community = await db.communities.find_one({"id": subgroup.get('communityId')}) if subgroup else None
-    user = await db.users.find_one({"uid": current_user['uid']})
-    
-    is_sender = message['senderId'] == current_user['uid']
-    is_group_admin = current_user['uid'] in subgroup.get('groupAdmins', []) if subgroup else False
-    is_super_admin = current_user['uid'] in community.get('superAdmins', []) if community else False
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
-    
-    if not is_sender and not is_group_admin and not is_super_admin and not is_global_admin:
-        raise HTTPException(status_code=403, detail="Bu mesajı silme yetkiniz yok")
+    # Sadece mesaj sahibi veya yöneticiler herkesten silebilir (rollere sadece gerekirse bak)
+    if message['senderId'] != current_user['uid']:
+        roles = await resolve_roles(current_user['uid'], user, subgroup_id=subgroup_id)
+        if not roles.can_manage_subgroup:
+            raise HTTPException(status_code=403, detail="Bu mesajı silme yetkiniz yok")
     
     await db.messages.update_one(
         {"id": message_id},
@@ -2577,10 +3171,12 @@ async def delete_message_for_everyone_subgroup(subgroup_id: str, message_id: str
             "$set": {
                 "deletedForEveryone": True,
                 "isDeleted": True,
-                "content": "Bu mesaj silindi"
+                "content": "Bu mesaj silindi",
+                "searchTokens": []
             }
         }
     )
+    await room_counters.update_preview(subgroup_id, message_id, "Bu mesaj silindi", isDeleted=True)
     
     # Socket.IO ile bildir
     await sio.emit('message_deleted', {
@@ -2590,161 +3186,512 @@ async def delete_message_for_everyone_subgroup(subgroup_id: str, message_id: str
     
     return {"message": "Mesaj herkesten silindi"}
 
-# Yazıyor durumunu bildir
-@api_router.post("/subgroups/{subgroup_id}/typing")
-async def notify_typing(subgroup_id: str, typing_data: dict, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_typing = typing_data.get('isTyping', False)
-    
-    await sio.emit('user_typing', {
-        "userId": current_user['uid'],
-        "userName": f"{user['firstName']} {user['lastName']}",
-        "isTyping": is_typing
-    }, room=subgroup_id)
-    
-    return {"status": "ok"}
-
 # Mesajları okundu olarak işaretle
 @api_router.post("/subgroups/{subgroup_id}/messages/mark-read")
 async def mark_messages_read(subgroup_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.messages.update_many(
-        {
-            "groupId": subgroup_id,
-            "senderId": {"$ne": current_user['uid']},
-            "readBy": {"$nin": [current_user['uid']]}
-        },
-        {
-            "$addToSet": {"readBy": current_user['uid']},
-            "$set": {"status": "read"}
-        }
+    if not (await resolve_roles(current_user['uid'], subgroup_id=subgroup_id)).is_member:
+        raise HTTPException(status_code=403, detail="Bu grubun üyesi değilsiniz")
+    
+    # Odadaki en yeni mesaja kadar oku - tek upsert
+    latest = await db.messages.find_one(
+        {"groupId": subgroup_id},
+        {"_id": 0, "id": 1, "timestamp": 1, "seq": 1},
+        sort=[("timestamp", -1), ("id", -1)]
     )
+    if not latest:
+        return {"readCursor": None}
     
-    # Socket.IO ile bildir
-    await sio.emit('messages_read', {
-        "userId": current_user['uid'],
-        "groupId": subgroup_id
-    }, room=subgroup_id)
+    read_cursor = await advance_read_cursor(current_user['uid'], subgroup_id, latest)
+    if read_cursor:
+        # Socket.IO ile bildir
+        await sio.emit('messages_read', {
+            "userId": current_user['uid'],
+            "groupId": subgroup_id,
+            **read_cursor
+        }, room=subgroup_id)
+    else:
+        read_cursor = await get_read_cursor(current_user['uid'], subgroup_id)
     
-    return {"markedCount": result.modified_count}
+    return MediaJSONResponse({"readCursor": read_cursor})
 
-# Dosya yükleme için presigned URL al (S3 simülasyonu - gerçek implementasyonda S3 kullanılır)
+# Alt grupta paylaşılacak dosya için yükleme oturumu aç
 @api_router.post("/subgroups/{subgroup_id}/upload-url")
 async def get_upload_url(subgroup_id: str, file_data: dict, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    if current_user['uid'] not in subgroup.get('members', []):
+    if not (await subgroup_roles(current_user['uid'], subgroup)).is_member:
         raise HTTPException(status_code=403, detail="Bu grubun üyesi değilsiniz")
     
-    # Gerçek implementasyonda S3 presigned URL döndürülür
-    # Şimdilik dosya bilgilerini döndür
-    file_id = str(uuid.uuid4())
+    return await create_upload(current_user['uid'], file_data, room_id=subgroup_id, room_type='subgroup')
+
+# ==================== MESAJ ARAMA ====================
+
+MESSAGE_SEARCH_LIMIT = 50
+MESSAGE_SEARCH_MAX_WORDS = 5
+MESSAGE_SEARCH_SCOPES = ('subgroup', 'private', 'community')
+MESSAGE_SEARCH_PROJECTION = {
+    "_id": 0, "id": 1, "groupId": 1, "chatId": 1, "senderId": 1, "senderName": 1,
+    "senderProfileImage": 1, "content": 1, "type": 1, "timestamp": 1
+}
+
+async def message_search_rooms(uid: str, scope: str, scope_id: str, user: dict) -> dict:
+    """Kullanıcının arayabileceği odalar için sorgu koşulu (üyelik kontrolüyle)"""
+    if scope == 'private':
+        user_ids = sorted([uid, scope_id])
+        return {"chatId": f"{user_ids[0]}_{user_ids[1]}"}
+    
+    if scope == 'subgroup':
+        subgroup = await db.subgroups.find_one({"id": scope_id}, WITHOUT_MEMBER_ARRAYS)
+        if not subgroup:
+            raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
+        if not (await subgroup_roles(uid, subgroup)).is_member:
+            raise HTTPException(status_code=403, detail="Bu grubun üyesi değilsiniz")
+        return {"groupId": scope_id}
+    
+    # Topluluk: üyesi olunan alt gruplar ve (topluluk üyesiyse) duyuru kanalı;
+    # genel yönetici topluluğun tüm odalarında arar
+    community = await db.communities.find_one(
+        {"id": scope_id}, {"_id": 0, "id": 1, "announcementChannelId": 1}
+    )
+    if not community:
+        raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
+    if is_global_admin(user):
+        room_ids = await db.subgroups.distinct("id", {"communityId": scope_id})
+        if community.get('announcementChannelId'):
+            room_ids.append(community['announcementChannelId'])
+        return {"groupId": {"$in": room_ids}}
+    
+    member_subgroups = await memberships.scope_ids_for_user(uid, SCOPE_SUBGROUP)
+    room_ids = await db.subgroups.distinct("id", {"id": {"$in": member_subgroups}, "communityId": scope_id})
+    if community.get('announcementChannelId') and await memberships.has_role(scope_id, uid):
+        room_ids.append(community['announcementChannelId'])
+    if not room_ids:
+        raise HTTPException(status_code=403, detail="Bu topluluğun üyesi değilsiniz")
+    return {"groupId": {"$in": room_ids}}
+
+# Mesaj geçmişinde ara: alt grup, özel sohbet (id = diğer kullanıcı) veya topluluk
+@api_router.get("/search/messages")
+async def search_messages(q: str, scope: str, id: str, cursor: str = None, limit: int = 20,
+                          current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    if scope not in MESSAGE_SEARCH_SCOPES:
+        raise HTTPException(status_code=400, detail="Geçersiz arama kapsamı")
+    words = list(dict.fromkeys(tokenize(q)))[:MESSAGE_SEARCH_MAX_WORDS]
+    if not words:
+        raise HTTPException(status_code=400, detail="Arama terimi gerekli")
+    limit = max(1, min(limit, MESSAGE_SEARCH_LIMIT))
+    
+    room_query = await message_search_rooms(current_user['uid'], scope, id, user)
+    query = {
+        **room_query,
+        "searchTokens": {"$all": words},
+        "deletedFor": {"$ne": current_user['uid']}
+    }
+    results, has_more, next_cursor = await fetch_keyset_page(
+        db.messages, query, cursor=cursor, limit=limit, projection=MESSAGE_SEARCH_PROJECTION
+    )
+    for message in results:
+        message['snippet'] = snippet(message.get('content'), words)
+    
+    return MediaJSONResponse({"results": results, "hasMore": has_more, "nextCursor": next_cursor})
+
+# ==================== OKUNMAMIŞ SAYILARI ====================
+
+# Kullanıcının tüm alt grup, özel sohbet ve duyuru kanallarının okunmamış
+# sayısı ve son mesajı (sabit sayıda sorgu; oda başına sayım yapılmaz)
+@api_router.get("/unread")
+async def get_unread_counts(current_user: dict = Depends(get_current_user)):
+    uid = current_user['uid']
+    subgroup_ids = await memberships.scope_ids_for_user(uid, SCOPE_SUBGROUP)
+    community_ids = await memberships.scope_ids_for_user(uid, SCOPE_COMMUNITY)
+    communities = await db.communities.find(
+        {"id": {"$in": community_ids}, "announcementChannelId": {"$ne": None}},
+        {"_id": 0, "id": 1, "announcementChannelId": 1}
+    ).to_list(None)
+    channel_communities = {c['announcementChannelId']: c['id'] for c in communities}
+    
+    counters = await room_counters.rooms([*subgroup_ids, *channel_communities])
+    private_rooms = await room_counters.private_rooms(uid, UNREAD_PRIVATE_LIMIT)
+    room_ids = [*subgroup_ids, *channel_communities, *(room['_id'] for room in private_rooms)]
+    read_seqs = {
+        state['roomId']: state.get('lastReadSeq', 0)
+        async for state in db.read_states.find(
+            {"uid": uid, "roomId": {"$in": room_ids}}, {"_id": 0, "roomId": 1, "lastReadSeq": 1}
+        )
+    }
+    
+    def room_entry(room_id: str, room_type: str, counter: dict, **extra) -> dict:
+        return {
+            "roomId": room_id,
+            "type": room_type,
+            "unreadCount": max(counter.get('seq', 0) - read_seqs.get(room_id, 0), 0),
+            "lastMessage": counter.get('lastMessage'),
+            **extra
+        }
+    
+    rooms = [room_entry(room_id, 'subgroup', counters.get(room_id, {})) for room_id in subgroup_ids]
+    rooms += [
+        room_entry(room_id, 'announcement', counters.get(room_id, {}), communityId=community_id)
+        for room_id, community_id in channel_communities.items()
+    ]
+    rooms += [
+        room_entry(room['_id'], 'private', room,
+                   otherUserId=next((p for p in room['participants'] if p != uid), uid))
+        for room in private_rooms
+    ]
+    return MediaJSONResponse({"rooms": rooms, "totalUnread": sum(room['unreadCount'] for room in rooms)})
+
+# ==================== ÇEVRİMİÇİ DURUMU ====================
+
+PRESENCE_SUBSCRIBE_LIMIT = 200
+
+# Verilen kullanıcılardan çevrimiçi olanlar (tek istekte, tüm düğümlerin belleğinden)
+@api_router.post("/presence")
+async def get_presence(query: dict, current_user: dict = Depends(get_current_user)):
+    uids = query.get('uids')
+    if not isinstance(uids, list) or len(uids) > PRESENCE_SUBSCRIBE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"En fazla {PRESENCE_SUBSCRIBE_LIMIT} kullanıcı sorgulanabilir")
+    
+    nodes = await online_by_node([uid for uid in uids if isinstance(uid, str)])
+    return {"online": sorted({uid for online in nodes.values() for uid in online}), "nodes": nodes}
+
+# ==================== CİHAZ KAYDI (PUSH) ====================
+
+PUSH_PLATFORMS = ('web', 'android', 'ios')
+
+# Cihazın FCM token'ını kaydet (giriş sonrası ve token yenilendiğinde)
+@api_router.post("/devices")
+async def register_device(device: dict, current_user: dict = Depends(get_current_user)):
+    token = str(device.get('token') or '').strip()
+    if not token or len(token) > 4096:
+        raise HTTPException(status_code=400, detail="Geçersiz cihaz token'ı")
+    platform = device.get('platform') if device.get('platform') in PUSH_PLATFORMS else 'web'
+    
+    await device_tokens.register(current_user['uid'], token, platform)
+    return {"message": "Cihaz kaydedildi"}
+
+# Çıkışta cihazın bildirimlerini kapat
+@api_router.delete("/devices/{token}")
+async def unregister_device(token: str, current_user: dict = Depends(get_current_user)):
+    await device_tokens.unregister(current_user['uid'], token)
+    return {"message": "Cihaz kaydı silindi"}
+
+# ==================== DOSYA YÜKLEME / İNDİRME ====================
+# Yükleme oturumu files koleksiyonunda tutulur (status: uploading -> complete).
+# İstemci dosyayı parçalar halinde PATCH /uploads/{id} ile, Upload-Offset
+# başlığında parçanın başladığı ofseti vererek gönderir. Bağlantı koparsa
+# GET /uploads/{id} ile kayıtlı ofseti öğrenip oradan devam eder. Boyut
+# sınırı admin ayarlarındaki maxFileSize (MB) değeridir.
+
+DEFAULT_MAX_FILE_SIZE_MB = 50
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024  # İstemciye önerilen parça boyutu
+UPLOAD_WRITE_LEASE = 120  # Saniye; aynı yüklemeye aynı anda tek istek yazar
+upload_sessions = UploadSessions(db.files, lease=UPLOAD_WRITE_LEASE)
+INLINE_MIME_PREFIXES = ('image/', 'video/', 'audio/')
+UPLOAD_PURPOSE_PROFILE = 'profile'
+
+def file_message_type(mime_type: str) -> str:
+    """MIME tipine karşılık gelen mesaj tipi (image, video, audio, file)"""
+    major = (mime_type or '').split('/', 1)[0]
+    return major if major in ('image', 'video', 'audio') else 'file'
+
+async def max_upload_bytes() -> int:
+    settings = await db.settings.find_one({"type": "system"}, {"_id": 0, "maxFileSize": 1})
+    size_mb = (settings or {}).get('maxFileSize') or DEFAULT_MAX_FILE_SIZE_MB
+    return int(float(size_mb) * 1024 * 1024)
+
+FILE_URL_PATTERN = re.compile(r'/api/files/([0-9a-f-]{36})$')
+
+async def file_media_fields(file_url: Optional[str], uid: str) -> dict:
+    """Bu sunucuya yüklenmiş görselin varyant URL'leri (thumbnailUrl, previewUrl).
+
+    Yanıtlarda dosya yolları imzalandığından kullanıcı yalnızca okuyabildiği
+    dosyaları mesaj/gönderi/profile ekleyebilir.
+    """
+    match = FILE_URL_PATTERN.search(file_url or '')
+    if not match:
+        return {}
+    upload = await db.files.find_one(
+        {"id": match.group(1), "status": "complete"},
+        {"_id": 0, "uploaderId": 1, "roomId": 1, "roomType": 1, "purpose": 1, "blobHash": 1, "variants": 1}
+    )
+    if not upload:
+        return {}
+    if not await can_read_file(uid, upload):
+        raise HTTPException(status_code=403, detail="Bu dosyaya erişim yetkiniz yok")
+    return variant_urls(upload.get('blobHash'), upload.get('variants'))
+
+def profile_image(user: dict) -> Optional[str]:
+    """Listelerde gösterilecek profil fotoğrafı (varsa küçük varyant)"""
+    return user.get('profileImageThumbUrl') or user.get('profileImageUrl')
+
+def upload_status(upload: dict) -> dict:
     return {
-        "fileId": file_id,
-        "uploadUrl": f"/api/files/{file_id}",  # Placeholder
-        "fileUrl": f"https://placeholder-cdn.com/files/{file_id}/{file_data.get('fileName', 'file')}",
-        "message": "Dosya yükleme özelliği için S3/CDN entegrasyonu gerekiyor"
+        **variant_urls(upload.get('blobHash'), upload.get('variants')),
+        "fileId": upload['id'],
+        "uploadId": upload['id'],
+        "uploadUrl": f"/api/uploads/{upload['id']}",
+        "fileUrl": f"/api/files/{upload['id']}",
+        "fileName": upload['fileName'],
+        "fileSize": upload['size'],
+        "fileMimeType": upload['mimeType'],
+        "type": file_message_type(upload['mimeType']),
+        "offset": upload['received'],
+        "chunkSize": UPLOAD_CHUNK_SIZE,
+        "complete": upload['status'] == 'complete'
+    }
+
+async def create_upload(uid: str, file_data: dict, room_id: Optional[str] = None, room_type: Optional[str] = None,
+                        purpose: Optional[str] = None) -> dict:
+    try:
+        size = int(file_data.get('fileSize', file_data.get('size')))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Dosya boyutu (fileSize) gerekli")
+    if size <= 0:
+        raise HTTPException(status_code=400, detail="Geçersiz dosya boyutu")
+    
+    max_bytes = await max_upload_bytes()
+    if size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Dosya çok büyük (en fazla {max_bytes // (1024 * 1024)} MB)")
+    
+    upload = {
+        "id": str(uuid.uuid4()),
+        "uploaderId": uid,
+        "roomId": room_id,
+        "roomType": room_type,
+        "purpose": purpose,
+        "fileName": str(file_data.get('fileName') or 'dosya')[:255],
+        "mimeType": str(file_data.get('fileMimeType') or file_data.get('mimeType') or 'application/octet-stream')[:100],
+        "size": size,
+        "received": 0,
+        "status": "uploading",
+        "createdAt": datetime.utcnow()
+    }
+    await db.files.insert_one(upload)
+    return upload_status(upload)
+
+# Yeni yükleme oturumu (oda bağımsız). Yalnızca yükleyen okuyabilir;
+# purpose=profile ile yüklenen görsel (profil fotoğrafı) herkese açıktır
+@api_router.post("/uploads")
+async def start_upload(file_data: dict, current_user: dict = Depends(get_current_user)):
+    purpose = file_data.get('purpose')
+    if purpose is not None and purpose != UPLOAD_PURPOSE_PROFILE:
+        raise HTTPException(status_code=400, detail="Geçersiz yükleme amacı")
+    if purpose == UPLOAD_PURPOSE_PROFILE and not str(file_data.get('fileMimeType') or file_data.get('mimeType') or '').startswith('image/'):
+        raise HTTPException(status_code=400, detail="Profil fotoğrafı bir görsel olmalı")
+    return await create_upload(current_user['uid'], file_data, purpose=purpose)
+
+# Özel sohbet eki: sohbetin iki katılımcısı okuyabilir
+@api_router.post("/private-messages/{other_user_id}/uploads")
+async def start_private_upload(other_user_id: str, file_data: dict, current_user: dict = Depends(get_current_user)):
+    if other_user_id == current_user['uid'] or not await db.users.find_one({"uid": other_user_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
+    user_ids = sorted([current_user['uid'], other_user_id])
+    return await create_upload(current_user['uid'], file_data, room_id=f"{user_ids[0]}_{user_ids[1]}", room_type='private')
+
+# Yüklemenin durumu (devam etmek için kayıtlı ofset)
+@api_router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    upload = await db.files.find_one({"id": upload_id, "uploaderId": current_user['uid']}, {"_id": 0})
+    if not upload:
+        raise HTTPException(status_code=404, detail="Yükleme bulunamadı")
+    return upload_status(upload)
+
+# Bir parça yükle: gövde doğrudan depoya akıtılır
+@api_router.patch("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, upload_offset: int = Header(..., alias="Upload-Offset"), current_user: dict = Depends(get_current_user)):
+    try:
+        upload = await upload_sessions.begin_write(upload_id, current_user['uid'], upload_offset)
+        if not upload:
+            raise HTTPException(status_code=404, detail="Yükleme bulunamadı")
+        token = upload['writeToken']
+        
+        async def body():
+            remaining = upload['size'] - upload_offset
+            async for chunk in request.stream():
+                remaining -= len(chunk)
+                if remaining < 0:
+                    raise HTTPException(status_code=413, detail="Gönderilen veri bildirilen dosya boyutunu aşıyor")
+                yield chunk
+        
+        try:
+            received = await file_storage.append(upload_id, upload_offset, upload_sessions.keep_alive(upload_id, token, body()))
+            changes = {"received": received}
+            if received == upload['size']:
+                # Tamamlama işlemleri de kira altında yapılır
+                if not await upload_sessions.renew(upload_id, token):
+                    raise UploadConflict("Yazma kirası başka bir isteğe geçti")
+                await file_storage.commit(upload_id, received, upload['fileName'], upload['mimeType'])
+                # Aynı içerik varsa ona bağlanır; görsellerin varyantları üretilir
+                media = await media_processor.process(upload_id, received, upload['mimeType'])
+                changes.update(status="complete", completedAt=datetime.utcnow(), **media)
+        except BaseException:
+            # Kayıtlı ofset değişmez; istemci aynı ofsetten tekrar dener
+            await upload_sessions.release(upload_id, token)
+            raise
+        
+        if not await upload_sessions.finish(upload_id, token, upload_offset, changes):
+            raise UploadConflict("Yazma kirası başka bir isteğe geçti")
+    except UploadConflict as e:
+        headers = {"Upload-Offset": str(e.received)} if e.received is not None else None
+        raise HTTPException(status_code=409, detail=e.detail, headers=headers)
+    
+    upload.update(changes)
+    return upload_status(upload)
+
+async def can_read_file(uid: str, upload: dict) -> bool:
+    """Dosyayı yükleyen her zaman, odaya yüklenmişse oda üyeleri okuyabilir; oda
+    bağımsız dosyalardan yalnızca profil fotoğrafları herkese açıktır"""
+    if upload['uploaderId'] == uid:
+        return True
+    if upload.get('roomId'):
+        return await can_join_room(uid, upload.get('roomType') or 'subgroup', upload['roomId'])
+    return upload.get('purpose') == UPLOAD_PURPOSE_PROFILE
+
+# Dosyanın ve görsel varyantlarının imzalı, kısa ömürlü URL'leri (<img>/<video> için)
+@api_router.get("/files/{file_id}/link")
+async def get_file_link(file_id: str, current_user: dict = Depends(get_current_user)):
+    upload = await db.files.find_one(
+        {"id": file_id, "status": "complete"},
+        {"_id": 0, "uploaderId": 1, "roomId": 1, "roomType": 1, "purpose": 1, "blobHash": 1, "variants": 1}
+    )
+    if not upload:
+        raise HTTPException(status_code=404, detail="Dosya bulunamadı")
+    if not await can_read_file(current_user['uid'], upload):
+        raise HTTPException(status_code=403, detail="Bu dosyaya erişim yetkiniz yok")
+    
+    urls = {"fileUrl": f"/api/files/{file_id}", **variant_urls(upload.get('blobHash'), upload.get('variants'))}
+    return {**{field: file_links.sign(url) for field, url in urls.items()}, "expiresIn": file_links.ttl}
+
+def signed_link_remaining(path: str, expires: Optional[int], signature: Optional[str]) -> int:
+    """İmzalı bağlantının kalan süresi; imza geçersizse veya süresi dolduysa 403"""
+    remaining = file_links.remaining(path, expires, signature)
+    if remaining is None:
+        raise HTTPException(status_code=403, detail="Bağlantı geçersiz veya süresi dolmuş")
+    return remaining
+
+# Dosyayı indir (Range destekli; video/ses ileri sarma için). Yalnızca
+# GET /files/{id}/link ile alınan imzalı bağlantıyla erişilir.
+@api_router.get("/files/{file_id}")
+async def download_file(file_id: str, expires: Optional[int] = None, signature: Optional[str] = None, range_header: Optional[str] = Header(None, alias="Range")):
+    remaining = signed_link_remaining(f"/api/files/{file_id}", expires, signature)
+    upload = await db.files.find_one(
+        {"id": file_id, "status": "complete"}, {"_id": 0, "size": 1, "mimeType": 1, "fileName": 1, "storageKey": 1}
+    )
+    if not upload:
+        raise HTTPException(status_code=404, detail="Dosya bulunamadı")
+    
+    size = upload['size']
+    start, end, status_code = 0, size - 1, 200
+    # Çoklu aralık desteklenmez; bu durumda dosyanın tamamı döner
+    if range_header and ',' not in range_header:
+        byte_range = parse_byte_range(range_header, size)
+        if byte_range is None:
+            raise HTTPException(status_code=416, detail="Geçersiz aralık", headers={"Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        status_code = 206
+    
+    mime_type = upload['mimeType']
+    inline = mime_type.startswith(INLINE_MIME_PREFIXES) and mime_type != 'image/svg+xml'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start + 1),
+        "Content-Disposition": f"{'inline' if inline else 'attachment'}; filename*=UTF-8''{quote(upload['fileName'])}",
+        # Önbellek bağlantının süresini aşmaz
+        "Cache-Control": f"private, max-age={remaining}"
     }
+    if status_code == 206:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    
+    return StreamingResponse(
+        file_storage.read(upload.get('storageKey', file_id), start, end),
+        status_code=status_code,
+        media_type=mime_type if inline else 'application/octet-stream',
+        headers=headers
+    )
+
+# Görsel varyantı (içerik adresli; imzalı bağlantıyla)
+@api_router.get("/media/{blob_hash}/{variant}")
+async def get_media_variant(blob_hash: str, variant: str, expires: Optional[int] = None, signature: Optional[str] = None):
+    remaining = signed_link_remaining(f"/api/media/{blob_hash}/{variant}", expires, signature)
+    info = await media_processor.variant(blob_hash, variant)
+    if not info:
+        raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+    
+    return StreamingResponse(
+        file_storage.read(info['storageKey'], 0, info['size'] - 1),
+        media_type=info['mimeType'],
+        headers={"Content-Length": str(info['size']), "Cache-Control": f"private, max-age={remaining}"}
+    )
 
 # ==================== TOPLULUK YÖNETİM API'LERİ ====================
 
 # Topluluk üyelerini getir
 @api_router.get("/communities/{community_id}/members")
-async def get_community_members(community_id: str, current_user: dict = Depends(get_current_user)):
-    community = await db.communities.find_one({"id": community_id})
+async def get_community_members(community_id: str, cursor: str = None, limit: int = MEMBER_PAGE_LIMIT, role: str = ROLE_MEMBER, current_user: dict = Depends(get_current_user)):
+    limit = member_list_params(limit, role, (ROLE_MEMBER, ROLE_SUPER_ADMIN))
+    community = await db.communities.find_one({"id": community_id}, {"_id": 1})
     if not community:
         raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
     
-    member_ids = community.get('members', [])
-    members = await db.users.find({"uid": {"$in": member_ids}}).to_list(1000)
-    
-    for member in members:
-        if '_id' in member:
-            del member['_id']
-        member['isSuperAdmin'] = member['uid'] in community.get('superAdmins', [])
-        # Şifre gibi hassas bilgileri çıkar
-        if 'password' in member:
-            del member['password']
+    members, next_cursor = await member_page(community_id, cursor, limit, role)
+    await with_member_roles(community_id, members, 'isSuperAdmin', ROLE_SUPER_ADMIN, listed_role=role)
     
-    return members
+    return MediaJSONResponse({"members": members, "hasMore": next_cursor is not None, "nextCursor": next_cursor})
 
 # Süper admin ekle (sadece global admin)
 @api_router.post("/communities/{community_id}/super-admins/{user_id}")
-async def add_super_admin(community_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
-    
-    if not is_global_admin:
+async def add_super_admin(community_id: str, user_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    if not is_global_admin(user):
         raise HTTPException(status_code=403, detail="Bu işlem için global yönetici yetkisi gerekiyor")
     
-    await db.communities.update_one(
-        {"id": community_id},
-        {"$addToSet": {"superAdmins": user_id, "members": user_id}}
-    )
+    await add_community_member({"id": community_id}, user_id, super_admin=True)
     
     return {"message": "Süper yönetici eklendi"}
 
 # Süper admin kaldır (sadece global admin)
 @api_router.delete("/communities/{community_id}/super-admins/{user_id}")
-async def remove_super_admin(community_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
-    
-    if not is_global_admin:
+async def remove_super_admin(community_id: str, user_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    if not is_global_admin(user):
         raise HTTPException(status_code=403, detail="Bu işlem için global yönetici yetkisi gerekiyor")
     
     # Global admin'i kaldıramaz
     target_user = await db.users.find_one({"uid": user_id})
-    if target_user and (target_user.get('isAdmin', False) or target_user.get('email', '').lower() == ADMIN_EMAIL.lower()):
+    if is_global_admin(target_user):
         raise HTTPException(status_code=400, detail="Global yöneticiyi kaldıramazsınız")
     
-    await db.communities.update_one(
-        {"id": community_id},
-        {"$pull": {"superAdmins": user_id}}
-    )
+    await memberships.revoke(SCOPE_COMMUNITY, community_id, user_id, (ROLE_SUPER_ADMIN,))
     
     return {"message": "Süper yönetici kaldırıldı"}
 
 # Alt grup yöneticisi ekle
 @api_router.post("/subgroups/{subgroup_id}/admins/{user_id}")
-async def add_subgroup_admin(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def add_subgroup_admin(subgroup_id: str, user_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    user = await db.users.find_one({"uid": current_user['uid']})
-    
-    is_super_admin = current_user['uid'] in community.get('superAdmins', []) if community else False
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    if not is_super_admin and not is_global_admin:
+    if not roles.can_manage_community:
         raise HTTPException(status_code=403, detail="Bu işlem için süper yönetici yetkisi gerekiyor")
     
-    await db.subgroups.update_one(
-        {"id": subgroup_id},
-        {"$addToSet": {"groupAdmins": user_id, "members": user_id}}
-    )
+    await add_subgroup_member(subgroup_id, user_id, admin=True)
     
     return {"message": "Grup yöneticisi eklendi"}
 
 # Bekleyen katılma isteklerini getir
 @api_router.get("/subgroups/{subgroup_id}/pending-requests")
-async def get_pending_requests(subgroup_id: str, current_user: dict = Depends(get_current_user)):
-    subgroup = await db.subgroups.find_one({"id": subgroup_id})
+async def get_pending_requests(subgroup_id: str, current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    subgroup = await db.subgroups.find_one({"id": subgroup_id}, WITHOUT_MEMBER_ARRAYS)
     if not subgroup:
         raise HTTPException(status_code=404, detail="Alt grup bulunamadı")
     
     # Yetki kontrolü
-    community = await db.communities.find_one({"id": subgroup['communityId']})
-    user = await db.users.find_one({"uid": current_user['uid']})
+    roles = await subgroup_roles(current_user['uid'], subgroup, user)
     
-    is_group_admin = current_user['uid'] in subgroup.get('groupAdmins', [])
-    is_super_admin = current_user['uid'] in community.get('superAdmins', []) if community else False
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
-    
-    if not is_group_admin and not is_super_admin and not is_global_admin:
+    if not roles.can_manage_subgroup:
         raise HTTPException(status_code=403, detail="Bu işlem için yetkiniz yok")
     
     pending = [r for r in subgroup.get('pendingRequests', []) if r.get('status') == 'pending']
@@ -2752,11 +3699,8 @@ async def get_pending_requests(subgroup_id: str, current_user: dict = Depends(ge
 
 # 81 şehir topluluğunu manuel olarak oluştur (bir kerelik)
 @api_router.post("/admin/initialize-communities")
-async def init_communities(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"uid": current_user['uid']})
-    is_global_admin = user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
-    
-    if not is_global_admin:
+async def init_communities(current_user: dict = Depends(get_current_user), user: dict = Depends(get_user_context)):
+    if not is_global_admin(user):
         raise HTTPException(status_code=403, detail="Bu işlem için global yönetici yetkisi gerekiyor")
     
     await initialize_city_communities()
@@ -2766,7 +3710,7 @@ async def init_communities(current_user: dict = Depends(get_current_user)):
 
 # Admin kontrolü decorator
 async def check_admin(current_user: dict):
-    user = await db.users.find_one({"uid": current_user['uid']})
+    user = await load_request_user(current_user['uid'])
     if not user:
         return False
     return user.get('isAdmin', False) or user.get('email', '').lower() == ADMIN_EMAIL.lower()
@@ -2777,70 +3721,67 @@ async def admin_dashboard(current_user: dict = Depends(get_current_user)):
     if not await check_admin(current_user):
         raise HTTPException(status_code=403, detail="Admin yetkisi gerekiyor")
     
-    # İstatistikler
-    total_users = await db.users.count_documents({})
-    total_communities = await db.communities.count_documents({})
-    total_subgroups = await db.subgroups.count_documents({})
-    total_messages = await db.messages.count_documents({})
-    total_posts = await db.posts.count_documents({})
-    total_services = await db.services.count_documents({})
+    # Önceden hesaplanmış toplamlar (mesaj geçmişi taranmaz)
+    stats = await platform_stats.snapshot()
     
-    # Son 7 günlük kayıt
-    from datetime import timedelta
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    new_users_week = await db.users.count_documents({"createdAt": {"$gte": week_ago}})
-    
-    # En aktif topluluklar
-    communities = await db.communities.find().sort("members", -1).limit(5).to_list(5)
-    top_communities = []
-    for c in communities:
-        top_communities.append({
-            "id": c['id'],
-            "name": c['name'],
-            "city": c['city'],
-            "memberCount": len(c.get('members', []))
-        })
+    # En kalabalık topluluklar (memberCount index'i)
+    top_communities = await db.communities.find(
+        {}, {"_id": 0, "id": 1, "name": 1, "city": 1, "memberCount": 1}
+    ).sort("memberCount", -1).limit(5).to_list(5)
     
-    return {
+    return MediaJSONResponse({
         "stats": {
-            "totalUsers": total_users,
-            "totalCommunities": total_communities,
-            "totalSubgroups": total_subgroups,
-            "totalMessages": total_messages,
-            "totalPosts": total_posts,
-            "totalServices": total_services,
-            "newUsersThisWeek": new_users_week
+            "totalUsers": stats.get('totalUsers', 0),
+            "totalCommunities": stats.get('totalCommunities', 0),
+            "totalSubgroups": stats.get('totalSubgroups', 0),
+            "totalMessages": stats.get('totalMessages', 0),
+            "totalPosts": stats.get('totalPosts', 0),
+            "totalServices": stats.get('totalServices', 0),
+            "newUsersThisWeek": stats.get('newUsersThisWeek', 0),
+            "updatedAt": stats.get('updatedAt'),
+            "reconciledAt": stats.get('reconciledAt')
         },
         "topCommunities": top_communities
-    }
+    })
 
 # Tüm kullanıcıları getir (admin)
 @api_router.get("/admin/users")
-async def admin_get_users(current_user: dict = Depends(get_current_user), skip: int = 0, limit: int = 50, search: str = None):
+async def admin_get_users(current_user: dict = Depends(get_current_user), cursor: str = None, limit: int = 50, search: str = None):
     if not await check_admin(current_user):
         raise HTTPException(status_code=403, detail="Admin yetkisi gerekiyor")
     
-    query = {}
-    if search:
-        query = {
-            "$or": [
-                {"firstName": {"$regex": search, "$options": "i"}},
-                {"lastName": {"$regex": search, "$options": "i"}},
-                {"email": {"$regex": search, "$options": "i"}},
-                {"city": {"$regex": search, "$options": "i"}}
-            ]
-        }
+    limit = max(1, min(limit, 100))
+    
+    # Her kelime önek olarak eşlenir ("ahm yıl" -> "Ahmet Yılmaz"); eşitlik
+    # (searchPrefixes, uid) index'inde uid sırasıyla okunur
+    query = user_search_query(search)
     
-    users = await db.users.find(query).skip(skip).limit(limit).to_list(limit)
-    total = await db.users.count_documents(query)
+    page_query = query
+    if cursor:
+        page_query = {"$and": [query, {"uid": {"$gt": cursor}}]} if query else {"uid": {"$gt": cursor}}
     
-    for user in users:
-        if '_id' in user:
-            del user['_id']
-        # Hassas bilgileri çıkar
-        user.pop('password', None)
+    users = await db.users.find(
+        page_query, {"_id": 0, "password": 0, "searchPrefixes": 0}, hint=USER_SEARCH_INDEX if query else None
+    ).sort("uid", 1).limit(limit + 1).to_list(limit + 1)
+    has_more = len(users) > limit
+    users = users[:limit]
     
-    return {"users": users, "total": total}
+    # Toplam yaklaşık: aramasız listede koleksiyon metadatası, aramada üst sınırlı sayım
+    if cursor:
+        total, approximate = None, True
+    elif not query:
+        total, approximate = await db.users.estimated_document_count(), True
+    else:
+        total = await db.users.count_documents(query, limit=USER_SEARCH_COUNT_LIMIT, hint=USER_SEARCH_INDEX)
+        approximate = total >= USER_SEARCH_COUNT_LIMIT
+    
+    return MediaJSONResponse({
+        "users": users,
+        "total": total,
+        "totalIsApproximate": approximate,
+        "hasMore": has_more,
+        "nextCursor": users[-1]['uid'] if has_more else None
+    })
 
 # Kullanıcıyı admin yap/kaldır
 @api_router.put("/admin/users/{user_id}/toggle-admin")
@@ -2879,11 +3820,12 @@ async def admin_delete_user(user_id: str, current_user: dict = Depends(get_curre
         raise HTTPException(status_code=400, detail="Ana admin silinemez")
     
     # Kullanıcıyı tüm topluluklardan çıkar
-    await db.communities.update_many({}, {"$pull": {"members": user_id, "superAdmins": user_id}})
-    await db.subgroups.update_many({}, {"$pull": {"members": user_id, "groupAdmins": user_id}})
+    await remove_community_member({}, user_id)
+    await remove_subgroup_member({}, user_id)
     
     # Kullanıcıyı sil
-    await db.users.delete_one({"uid": user_id})
+    result = await db.users.delete_one({"uid": user_id})
+    platform_stats.increment("totalUsers", -result.deleted_count)
     
     return {"message": "Kullanıcı silindi"}
 
@@ -2898,10 +3840,7 @@ async def make_super_admin_all(user_id: str, current_user: dict = Depends(get_cu
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
     
     # Tüm topluluklara süper admin olarak ekle
-    result = await db.communities.update_many(
-        {},
-        {"$addToSet": {"superAdmins": user_id, "members": user_id}}
-    )
+    granted = await add_community_member({}, user_id, super_admin=True)
     
     # Kullanıcıyı admin yap
     await db.users.update_one(
@@ -2909,7 +3848,7 @@ async def make_super_admin_all(user_id: str, current_user: dict = Depends(get_cu
         {"$set": {"isAdmin": True}}
     )
     
-    return {"message": f"Kullanıcı {result.modified_count} topluluğa süper admin olarak eklendi"}
+    return {"message": f"Kullanıcı {granted} topluluğa süper admin olarak eklendi"}
 
 # Tüm toplulukları getir (admin)
 @api_router.get("/admin/communities")
@@ -2917,16 +3856,15 @@ async def admin_get_communities(current_user: dict = Depends(get_current_user)):
     if not await check_admin(current_user):
         raise HTTPException(status_code=403, detail="Admin yetkisi gerekiyor")
     
-    communities = await db.communities.find().sort("name", 1).to_list(100)
+    communities = await db.communities.find({}, WITHOUT_MEMBER_ARRAYS).sort("name", 1).to_list(100)
+    super_admin_counts = await memberships.counts([c['id'] for c in communities], ROLE_SUPER_ADMIN)
     
     for c in communities:
-        if '_id' in c:
-            del c['_id']
-        c['memberCount'] = len(c.get('members', []))
-        c['superAdminCount'] = len(c.get('superAdmins', []))
+        c.setdefault('memberCount', 0)
+        c['superAdminCount'] = super_admin_counts.get(c['id'], 0)
         c['subGroupCount'] = len(c.get('subGroups', []))
     
-    return clean_doc(communities)
+    return MediaJSONResponse(communities)
 
 # Topluluk detayı (admin)
 @api_router.get("/admin/communities/{community_id}")
@@ -2934,28 +3872,23 @@ async def admin_get_community(community_id: str, current_user: dict = Depends(ge
     if not await check_admin(current_user):
         raise HTTPException(status_code=403, detail="Admin yetkisi gerekiyor")
     
-    community = await db.communities.find_one({"id": community_id})
+    community = await db.communities.find_one({"id": community_id}, WITHOUT_MEMBER_ARRAYS)
     if not community:
         raise HTTPException(status_code=404, detail="Topluluk bulunamadı")
     
-    if '_id' in community:
-        del community['_id']
-    
-    # Üyeleri getir
-    members = await db.users.find({"uid": {"$in": community.get('members', [])}}).to_list(1000)
-    for m in members:
-        if '_id' in m:
-            del m['_id']
-        m['isSuperAdmin'] = m['uid'] in community.get('superAdmins', [])
+    # Üyelerin ilk sayfası; devamı /communities/{id}/members?cursor= ile
+    members, next_cursor = await member_page(community_id, None, MEMBER_PAGE_LIMIT, projection=ADMIN_MEMBER_PROJECTION)
+    await with_member_roles(community_id, members, 'isSuperAdmin', ROLE_SUPER_ADMIN)
     
     # Alt grupları getir
-    subgroups = await db.subgroups.find({"communityId": community_id}).to_list(100)
+    subgroups = await db.subgroups.find({"communityId": community_id}, WITHOUT_MEMBER_ARRAYS).to_list(100)
     for sg in subgroups:
-        if '_id' in sg:
-            del sg['_id']
-        sg['memberCount'] = len(sg.get('members', []))
+        sg.setdefault('memberCount', 0)
     
+    community.setdefault('memberCount', 0)
+    community['superAdminCount'] = await memberships.count(community_id, ROLE_SUPER_ADMIN)
     community['membersList'] = members
+    community['membersNextCursor'] = next_cursor
     community['subGroupsList'] = subgroups
     
     return community
@@ -2970,16 +3903,10 @@ async def admin_toggle_super_admin(community_id: str, data: dict, current_user:
     action = data.get('action', 'add')  # 'add' or 'remove'
     
     if action == 'add':
-        await db.communities.update_one(
-            {"id": community_id},
-            {"$addToSet": {"superAdmins": user_id, "members": user_id}}
-        )
+        await add_community_member({"id": community_id}, user_id, super_admin=True)
         return {"message": "Süper admin eklendi"}
     else:
-        await db.communities.update_one(
-            {"id": community_id},
-            {"$pull": {"superAdmins": user_id}}
-        )
+        await memberships.revoke(SCOPE_COMMUNITY, community_id, user_id, (ROLE_SUPER_ADMIN,))
         return {"message": "Süper admin kaldırıldı"}
 
 # Sistem ayarları
@@ -3004,20 +3931,203 @@ async def admin_get_settings(current_user: dict = Depends(get_current_user)):
     
     return settings
 
+# Index durumu (eksik / fazla / farklı index'ler)
+@api_router.get("/admin/indexes")
+async def admin_get_indexes(current_user: dict = Depends(get_current_user)):
+    if not await check_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin yetkisi gerekiyor")
+    
+    report = await verify_indexes(db)
+    return {
+        "ok": all(c['ok'] for c in report.values()),
+        "collections": report
+    }
+
+# Çevrimiçi durumu metrikleri (bu düğüm)
+@api_router.get("/admin/metrics/presence")
+async def admin_get_presence_metrics(current_user: dict = Depends(get_current_user)):
+    if not await check_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin yetkisi gerekiyor")
+    
+    return presence.metrics()
+
+# Push bildirim dağıtım metrikleri
+@api_router.get("/admin/metrics/push")
+async def admin_get_push_metrics(current_user: dict = Depends(get_current_user)):
+    if not await check_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin yetkisi gerekiyor")
+    
+    return push_dispatcher.metrics()
+
+# Toplu mesaj yazma metrikleri
+@api_router.get("/admin/metrics/message-writer")
+async def admin_get_message_writer_metrics(current_user: dict = Depends(get_current_user)):
+    if not await check_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin yetkisi gerekiyor")
+    
+    return message_writer.metrics()
+
 # Mevcut admin'i tüm topluluklara ekle (startup için)
 async def ensure_admin_in_all_communities():
     """Ana admin'i tüm topluluklara süper admin olarak ekle"""
     admin_user = await db.users.find_one({"email": ADMIN_EMAIL})
     if admin_user:
-        await db.communities.update_many(
-            {},
-            {"$addToSet": {"superAdmins": admin_user['uid'], "members": admin_user['uid']}}
-        )
+        await add_community_member({}, admin_user['uid'], super_admin=True)
         await db.users.update_one(
             {"uid": admin_user['uid']},
             {"$set": {"isAdmin": True}}
         )
 
+# ==================== SOCKET.IO ODA YÖNETİMİ ====================
+
+# İstemcinin katılabileceği oda tipleri
+SOCKET_ROOM_TYPES = ['subgroup', 'community', 'private', 'group']
+
+def get_socket_token(environ: dict, auth) -> Optional[str]:
+    """Token'ı socket auth verisinden veya Authorization header'ından al"""
+    if isinstance(auth, dict) and auth.get('token'):
+        return auth['token']
+    header = environ.get('HTTP_AUTHORIZATION', '')
+    if header.lower().startswith('bearer '):
+        return header[7:].strip()
+    return None
+
+async def can_join_room(uid: str, room_type: str, room_id: str) -> bool:
+    """Kullanıcının odaya katılma yetkisi var mı (üyelik kontrolü)"""
+    if room_type == 'subgroup':
+        return (await resolve_roles(uid, subgroup_id=room_id)).is_member
+    if room_type == 'community':
+        return (await resolve_roles(uid, community_id=room_id)).is_member
+    if room_type == 'private':
+        # chatId = sıralı iki uid'nin "_" ile birleşimi
+        return uid in room_id.split('_')
+    if room_type == 'group':
+        group = await db.groups.find_one(
+            {"id": room_id},
+            {"_id": 0, "members": 1, "bannedUsers": 1, "isPublic": 1}
+        )
+        if not group or uid in group.get('bannedUsers', []):
+            return False
+        return uid in group.get('members', []) or group.get('isPublic', True)
+    return False
+
+def local_room_viewers(room_id: str) -> List[str]:
+    """Odayı bu düğümde açık tutan kullanıcılar"""
+    uids = {presence.uid_for(sid) for sid, _ in sio.manager.get_participants('/', room_id)}
+    uids.discard(None)
+    return sorted(uids)
+
+async def room_viewer_uids(room_id: str) -> set:
+    """Odayı herhangi bir düğümde açık tutan kullanıcılar (push bildirimi gönderilmez)"""
+    uids = set(local_room_viewers(room_id))
+    if isinstance(sio.manager, NodeQueryMixin):
+        for viewers in await sio.manager.query_nodes('room_viewers', room_id):
+            uids.update(viewers)
+    return uids
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    """Bağlantıda Firebase token'ını doğrula, uid'yi oturuma kaydet"""
+    token = get_socket_token(environ, auth)
+    try:
+        decoded_token = await authenticate_token(token)
+    except HTTPException as e:
+        raise SocketConnectionRefusedError(e.detail)
+    except Exception as e:
+        logger.error(f"Socket token verification error: {type(e).__name__}")
+        raise SocketConnectionRefusedError("Kimlik doğrulama başarısız")
+
+    # authenticate_token'ın yüklediği doküman tekrar kullanılır (ek sorgu yok)
+    user = await load_request_user(decoded_token['uid']) or {}
+    await sio.save_session(sid, {
+        "uid": decoded_token['uid'],
+        "name": f"{user.get('firstName', '')} {user.get('lastName', '')}".strip()
+    })
+    presence.connect(sid, decoded_token['uid'])
+
+@sio.event
+async def disconnect(sid):
+    presence.disconnect(sid)
+    session = await sio.get_session(sid)
+    if session.get('uid'):
+        typing_tracker.remove_user(session['uid'], rooms=sio.rooms(sid))
+
+@sio.event
+async def join_room(sid, data):
+    """Yetkili kullanıcıyı alt grup / özel sohbet / topluluk / eski grup odasına al"""
+    session = await sio.get_session(sid)
+    uid = session.get('uid')
+    room_type = (data or {}).get('type')
+    room_id = (data or {}).get('id')
+
+    if not uid:
+        return {"ok": False, "error": "Kimlik doğrulama gerekli"}
+    if room_type not in SOCKET_ROOM_TYPES or not validate_uuid(room_id or ''):
+        return {"ok": False, "error": "Geçersiz oda"}
+    if not await can_join_room(uid, room_type, room_id):
+        logger.warning(f"Unauthorized room join attempt: {uid} -> {room_type}:{room_id}")
+        return {"ok": False, "error": "Bu odaya katılma yetkiniz yok"}
+
+    await sio.enter_room(sid, room_id)
+    return {"ok": True, "room": room_id}
+
+@sio.event
+async def leave_room(sid, data):
+    room_id = (data or {}).get('id')
+    if room_id:
+        session = await sio.get_session(sid)
+        if session.get('uid'):
+            typing_tracker.stop_typing(room_id, session['uid'])
+        await sio.leave_room(sid, room_id)
+    return {"ok": True}
+
+@sio.event
+async def heartbeat(sid, data=None):
+    """Bağlantıyı çevrimiçi tut (yalnızca bellekte; veritabanına yazılmaz)"""
+    if not presence.heartbeat(sid):
+        # Süresi dolmuş ama hâlâ bağlı soket: yeniden kaydet
+        session = await sio.get_session(sid)
+        if session.get('uid'):
+            presence.connect(sid, session['uid'])
+    return {"ok": True}
+
+@sio.event
+async def presence_subscribe(sid, data):
+    """Verilen kullanıcıların durum değişikliklerine abone ol; her düğümde
+    çevrimiçi olanlar düğüm bazında hemen döner (sonraki güncellemeler de
+    düğüm kimliğiyle gelir)"""
+    session = await sio.get_session(sid)
+    uids = (data or {}).get('uids')
+    if not session.get('uid') or not isinstance(uids, list):
+        return {"ok": False, "error": "Geçersiz istek"}
+    uids = [uid for uid in uids[:PRESENCE_SUBSCRIBE_LIMIT] if isinstance(uid, str) and uid]
+
+    for uid in uids:
+        await sio.enter_room(sid, presence_room(uid))
+    nodes = await online_by_node(uids)
+    return {"ok": True, "online": sorted({uid for online in nodes.values() for uid in online}), "nodes": nodes}
+
+@sio.event
+async def presence_unsubscribe(sid, data):
+    for uid in ((data or {}).get('uids') or [])[:PRESENCE_SUBSCRIBE_LIMIT]:
+        if isinstance(uid, str):
+            await sio.leave_room(sid, presence_room(uid))
+    return {"ok": True}
+
+@sio.event
+async def typing(sid, data):
+    """Yazıyor durumu - yalnızca katılınmış odalar için, veritabanına dokunmaz"""
+    room_id = (data or {}).get('id')
+    if not room_id or room_id not in sio.rooms(sid):
+        return
+    session = await sio.get_session(sid)
+    if not session.get('uid'):
+        return
+    if data.get('isTyping', True):
+        typing_tracker.start_typing(room_id, session['uid'], session.get('name', ''))
+    else:
+        typing_tracker.stop_typing(room_id, session['uid'])
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -3043,6 +4153,12 @@ def is_allowed_origin(origin: str) -> bool:
         return True
     return False
 
+# Parça yükleme PATCH + Upload-Offset, indirme Range kullanır; istemcinin
+# okuyabilmesi için ofset ve aralık yanıt başlıkları açılır
+CORS_ALLOW_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+CORS_ALLOW_HEADERS = ["Authorization", "Content-Type", "Accept", "Upload-Offset", "Range"]
+CORS_EXPOSE_HEADERS = ["Upload-Offset", "Content-Range", "Accept-Ranges"]
+
 # Custom CORS middleware for better security
 class SecureCORSMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -3054,8 +4170,8 @@ class SecureCORSMiddleware(BaseHTTPMiddleware):
             if origin and is_allowed_origin(origin):
                 response.headers["Access-Control-Allow-Origin"] = origin
                 response.headers["Access-Control-Allow-Credentials"] = "true"
-                response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-                response.headers["Access-Control-Allow-Headers"] = "Authorization, Content-Type, Accept"
+                response.headers["Access-Control-Allow-Methods"] = ", ".join(CORS_ALLOW_METHODS)
+                response.headers["Access-Control-Allow-Headers"] = ", ".join(CORS_ALLOW_HEADERS)
                 response.headers["Access-Control-Max-Age"] = "86400"
             return response
         
@@ -3065,6 +4181,7 @@ class SecureCORSMiddleware(BaseHTTPMiddleware):
         if origin and is_allowed_origin(origin):
             response.headers["Access-Control-Allow-Origin"] = origin
             response.headers["Access-Control-Allow-Credentials"] = "true"
+            response.headers["Access-Control-Expose-Headers"] = ", ".join(CORS_EXPOSE_HEADERS)
         
         return response
 
@@ -3076,23 +4193,91 @@ app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],  # Production'da ALLOWED_ORIGINS kullanılmalı
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Authorization", "Content-Type", "Accept"],
+    allow_methods=CORS_ALLOW_METHODS,
+    allow_headers=CORS_ALLOW_HEADERS,
+    expose_headers=CORS_EXPOSE_HEADERS,
     max_age=86400,  # 24 saat CORS preflight cache
 )
 
 @app.on_event("startup")
 async def startup_event():
-    """Uygulama başlatıldığında 81 şehir topluluğunu oluştur"""
+    """Uygulama başlatıldığında index'leri ve 81 şehir topluluğunu oluştur"""
+    # Firebase imza sertifikalarını arka planda güncel tut
+    token_verifier.start()
+    # Düğüm sorgularına yanıt verebilmek için kanal ilk soket bağlantısını beklemeden dinlenir
+    if isinstance(sio.manager, NodeQueryMixin) and not sio.manager_initialized:
+        sio.manager_initialized = True
+        sio.manager.initialize()
+    typing_tracker.start()
+    presence.start()
+    await file_links.load(db)
+    platform_stats.start()
+    push_dispatcher.start()
+    
     try:
-        await initialize_city_communities()
-        await ensure_admin_in_all_communities()
-        logger.info("✅ Şehir toplulukları başarıyla kontrol edildi/oluşturuldu")
+        failed = await ensure_indexes(db)
+        if failed:
+            logger.warning(f"⚠️ Bazı index'ler oluşturulamadı: {failed}")
+        else:
+            logger.info("✅ Veritabanı index'leri kontrol edildi/oluşturuldu")
+    except Exception as e:
+        logger.error(f"❌ Index oluşturma hatası: {e}")
+    
+    try:
+        await backfill_user_search_tokens()
+    except Exception as e:
+        logger.error(f"❌ Kullanıcı arama alanları güncellenemedi: {e}")
+    
+    try:
+        await backfill_post_counters()
+    except Exception as e:
+        logger.error(f"❌ Gönderi sayaçları güncellenemedi: {e}")
+    
+    # Eski mesajların arama kelimeleri arka planda doldurulur (açılışı bekletmez)
+    app.state.message_search_backfill = asyncio.create_task(run_message_search_backfill())
+    
+    # Taşıma ve tohumlama tek bir süreçte çalışır; diğer worker'lar beklemeden açılır
+    migration = StartupTask(db, "membership-migration", "embedded" if memberships.embedded else "dropped")
+    if await migration.claim():
+        try:
+            # Gömülü üye dizilerini memberships koleksiyonuna taşı (yarıda kalırsa devam eder)
+            for scope_type in (SCOPE_COMMUNITY, SCOPE_SUBGROUP):
+                migrated = await memberships.migrate(
+                    scope_type, drop_embedded=not memberships.embedded, task=migration
+                )
+                if migrated:
+                    logger.info(f"✅ {migrated} {scope_type} üyeliği memberships koleksiyonuna taşındı")
+            await migration.complete()
+        except Exception as e:
+            await migration.release()
+            logger.error(f"❌ Üyelik taşıma hatası: {e}")
+    
+    try:
+        admin_user = await db.users.find_one({"email": ADMIN_EMAIL}, {"_id": 0, "uid": 1})
+        seeding = StartupTask(db, "city-communities", community_seed_version(admin_user['uid'] if admin_user else None))
+        if await seeding.claim():
+            try:
+                await initialize_city_communities()
+                await ensure_admin_in_all_communities()
+                await seeding.complete()
+                logger.info("✅ Şehir toplulukları başarıyla kontrol edildi/oluşturuldu")
+            except Exception:
+                await seeding.release()
+                raise
+        else:
+            logger.info("⏭️ Şehir toplulukları güncel veya başka bir süreçte oluşturuluyor")
     except Exception as e:
         logger.error(f"❌ Topluluk oluşturma hatası: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await token_verifier.stop()
+    await typing_tracker.stop()
+    await presence.stop()
+    await platform_stats.stop()
+    await media_processor.stop()
+    await push_dispatcher.stop()
+    await message_writer.close()
     client.close()
 
 # Wrap FastAPI app with Socket.IO
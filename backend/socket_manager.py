@@ -0,0 +1,264 @@
+"""Socket.IO istemci yöneticisi - çoklu worker/pod yayını.
+
+Varsayılan AsyncManager yalnızca kendi sürecindeki soketlere yayın yapar.
+SOCKETIO_MESSAGE_QUEUE ayarlanırsa emit'ler bir pub/sub kanalı üzerinden
+bütün düğümlere dağıtılır ve her düğüm kendi odalarındaki soketlere iletir:
+
+- redis://...  (veya rediss://) -> Redis pub/sub ("redis" paketi gerekir)
+- mongodb://... (veya mongodb+srv://) -> capped koleksiyon + tailable cursor
+- memory://    -> aynı süreçteki sunucular arasında bellek içi kanal (testler)
+- boş          -> tek süreç, varsayılan yönetici
+
+Kanal adı SOCKETIO_CHANNEL ile değiştirilebilir.
+
+Kanal ayrıca düğümler arası sorgular için kullanılır (query_nodes): her
+düğüm yalnızca kendi bellek içi durumunu bilir (ör. çevrimiçi kullanıcılar),
+sorgu tüm düğümlerde çalışır ve yanıtlar sorgulayan düğümde toplanır.
+Yanıt beklenmeyen duyurular (ör. önbellek geçersizleştirme) notify_nodes ile
+yayınlanır.
+"""
+import asyncio
+import inspect
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import socketio
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL = 'rehber-socketio'
+# Düğüm sorguları bu namespace'e emit olarak yayınlanır; istemcisi yoktur
+NODE_QUERY_NAMESPACE = '/_node-query'
+NODE_QUERY_REPLY = 'reply'
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} JSON'a çevrilemez")
+
+
+class SocketJSON:
+    """Socket.IO paketleri için json modülü: datetime/ObjectId içeren
+    mesaj dokümanları doğrudan emit edilebilir"""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        kwargs.setdefault('default', _json_default)
+        return json.dumps(obj, **kwargs)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return json.loads(s, **kwargs)
+
+
+def json_safe(data):
+    """Kanal mesajını her düğümde aynı şekilde çözülecek düz JSON tiplerine indir"""
+    return json.loads(SocketJSON.dumps(data))
+
+
+class NodeQueryMixin:
+    """Pub/sub kanalı üzerinden tüm düğümlere sorgu.
+
+    Sorgu ve yanıtlar NODE_QUERY_NAMESPACE'e emit olarak yayınlanır;
+    _handle_emit bunları istemcilere iletmek yerine kayıtlı işleyiciye verir.
+    Düğüm sayısı bilinmediğinden, son node_ttl saniyede yanıt vermiş düğüm
+    sayısına ulaşılınca ya da zaman aşımında dönülür.
+    """
+    query_timeout = 0.5
+    node_ttl = 300.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._query_handlers: Dict[str, Callable[[Any], Any]] = {}
+        self._pending: Dict[str, tuple] = {}
+        # host_id -> son yanıt anı
+        self._nodes: Dict[str, float] = {}
+
+    def on_node_query(self, name: str, handler: Callable[[Any], Any]):
+        """Bu düğümde sorguya yanıt verecek işleyiciyi kaydet (sync veya async)"""
+        self._query_handlers[name] = handler
+
+    def _live_nodes(self) -> int:
+        cutoff = time.monotonic() - self.node_ttl
+        for host_id in [host_id for host_id, seen in self._nodes.items() if seen < cutoff]:
+            del self._nodes[host_id]
+        return max(len(self._nodes), 1)
+
+    async def query_nodes(self, name: str, data: Any, timeout: float = None) -> List[Any]:
+        """Sorguyu bu düğüm dahil tüm düğümlerde çalıştır, yanıtları döndür"""
+        query_id = uuid.uuid4().hex
+        replies, done = [], asyncio.Event()
+        self._pending[query_id] = (replies, done)
+        try:
+            await self.emit(name, {"id": query_id, "data": data}, namespace=NODE_QUERY_NAMESPACE)
+            try:
+                await asyncio.wait_for(done.wait(), timeout or self.query_timeout)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            self._pending.pop(query_id, None)
+        return list(replies)
+
+    async def notify_nodes(self, name: str, data: Any):
+        """İşleyiciyi bu düğüm dahil tüm düğümlerde çalıştır; yanıt beklenmez"""
+        await self.emit(name, {"data": data}, namespace=NODE_QUERY_NAMESPACE)
+
+    async def _handle_node_query(self, event: str, data: dict):
+        if event == NODE_QUERY_REPLY:
+            self._nodes[data['host']] = time.monotonic()
+            pending = self._pending.get(data['id'])
+            if pending:
+                replies, done = pending
+                replies.append(data['result'])
+                if len(replies) >= self._live_nodes():
+                    done.set()
+            return
+
+        handler = self._query_handlers.get(event)
+        if handler is None:
+            return
+        result = handler(data['data'])
+        if inspect.isawaitable(result):
+            result = await result
+        if 'id' not in data:
+            return
+        await self.emit(NODE_QUERY_REPLY, {"id": data['id'], "host": self.host_id, "result": result},
+                        namespace=NODE_QUERY_NAMESPACE)
+
+    async def _handle_emit(self, message):
+        if message.get('namespace') != NODE_QUERY_NAMESPACE:
+            return await super()._handle_emit(message)
+        try:
+            await self._handle_node_query(message['event'], message['data'])
+        except Exception as e:
+            logger.error(f"Düğüm sorgusu işlenemedi: {type(e).__name__}")
+
+
+class RedisManager(NodeQueryMixin, socketio.AsyncRedisManager):
+    async def _publish(self, data):
+        return await super()._publish(json_safe(data))
+
+
+class MongoManager(NodeQueryMixin, socketio.AsyncPubSubManager):
+    """MongoDB capped koleksiyonu üzerinden pub/sub.
+
+    Her düğüm koleksiyonu tailable cursor ile izler; yayınlanan mesajlar
+    insert ile eklenir. Ek bir servis gerektirmez, gecikme Redis'e göre
+    biraz daha yüksektir.
+    """
+    name = 'mongodb'
+
+    def __init__(self, url, db_name, channel=DEFAULT_CHANNEL, collection='socketio_queue',
+                 size=16 * 1024 * 1024, write_only=False, logger=None):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.client = AsyncIOMotorClient(url)
+        self.db = self.client[db_name]
+        self.collection_name = collection
+        self.size = size
+        self._ready = False
+
+    async def _collection(self):
+        if not self._ready:
+            try:
+                await self.db.create_collection(self.collection_name, capped=True, size=self.size)
+            except CollectionInvalid:
+                pass  # Başka bir düğüm zaten oluşturdu
+            self._ready = True
+        return self.db[self.collection_name]
+
+    async def _publish(self, data):
+        collection = await self._collection()
+        await collection.insert_one({"channel": self.channel, "data": json_safe(data)})
+
+    async def _listen(self):
+        collection = await self._collection()
+        query = {"channel": self.channel}
+        # Yalnızca dinlemeye başladıktan sonra gelen mesajlar
+        last = await collection.find_one(query, {"_id": 1}, sort=[("$natural", -1)])
+        last_id = last["_id"] if last else None
+
+        while True:
+            # Capped koleksiyon ekleme sırasıyla ($natural) okunur. Farklı
+            # düğümlerin ürettiği ObjectId'ler sıralı olmadığından _id ile
+            # filtrelenmez; yeniden açılan cursor son görülen mesaja kadar atlar.
+            # O mesaj koleksiyondan düşmüşse mevcut mesajların hepsi atlanır.
+            skipping = last_id is not None
+            skipped_id = last_id
+            cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT, sort=[("$natural", 1)])
+            try:
+                while cursor.alive:
+                    async for doc in cursor:
+                        if skipping:
+                            skipping = doc["_id"] != last_id
+                            skipped_id = doc["_id"]
+                            continue
+                        last_id = doc["_id"]
+                        yield doc["data"]
+                    if skipping:
+                        # Son görülen mesaj bulunamadı; bundan sonrasını ilet
+                        skipping = False
+                        last_id = skipped_id
+                    await asyncio.sleep(0.1)
+            except PyMongoError as e:
+                logger.error(f"Socket.IO mongo kanalı okunamadı: {type(e).__name__}")
+            finally:
+                await cursor.close()
+            await asyncio.sleep(1)
+
+
+class LocalManager(NodeQueryMixin, socketio.AsyncPubSubManager):
+    """Aynı süreçteki birden fazla sunucuyu ayrı düğümler gibi bağlayan
+    bellek içi kanal (testler ve yerel geliştirme için)"""
+    name = 'memory'
+    _subscribers = {}
+
+    def __init__(self, channel=DEFAULT_CHANNEL, write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    async def _publish(self, data):
+        message = json_safe(data)
+        for queue in self._subscribers.get(self.channel, []):
+            queue.put_nowait(message)
+
+    async def _listen(self):
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(self.channel, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[self.channel].remove(queue)
+
+
+def create_client_manager(url=None, channel=None, write_only=False):
+    """SOCKETIO_MESSAGE_QUEUE'ya göre istemci yöneticisini oluştur (None: tek süreç)"""
+    url = url if url is not None else os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+    channel = channel or os.environ.get('SOCKETIO_CHANNEL', DEFAULT_CHANNEL)
+    if not url:
+        return None
+
+    scheme = url.split('://', 1)[0].lower()
+    if scheme in ('redis', 'rediss', 'unix'):
+        manager = RedisManager(url, channel=channel, write_only=write_only)
+    elif scheme in ('mongodb', 'mongodb+srv'):
+        manager = MongoManager(url, os.environ['DB_NAME'], channel=channel, write_only=write_only)
+    elif scheme == 'memory':
+        manager = LocalManager(channel=channel, write_only=write_only)
+    else:
+        raise ValueError(f"Desteklenmeyen Socket.IO mesaj kuyruğu: {scheme}")
+
+    logger.info(f"Socket.IO mesaj kuyruğu: {scheme} (kanal: {channel})")
+    return manager
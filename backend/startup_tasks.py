@@ -0,0 +1,61 @@
+"""Birden fazla worker/pod arasında tek seferlik başlangıç görevleri.
+
+Her görev startup_tasks koleksiyonunda bir dokümandır. Bir worker görevi
+claim() ile kiralar (lease); kira süresi dolmadıkça diğer worker'lar görevi
+atlar ve doğrudan istek karşılamaya geçer. Görev bittiğinde complete() ile
+sürümü işaretlenir; aynı sürüm için görev bir daha çalışmaz. Görevi çalıştıran
+süreç çökerse kira ttl sonunda düşer ve bir sonraki başlatma görevi üstlenir.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+
+class StartupTask:
+    def __init__(self, db, name: str, version: str, ttl: float = 300.0):
+        self.collection = db.startup_tasks
+        self.name = name
+        self.version = version
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def claim(self) -> bool:
+        """Görevi kirala; tamamlanmışsa veya başka bir süreç çalıştırıyorsa False"""
+        now = datetime.utcnow()
+        try:
+            await self.collection.update_one(
+                {
+                    "_id": self.name,
+                    "completedVersion": {"$ne": self.version},
+                    "$or": [
+                        {"leaseUntil": {"$exists": False}},
+                        {"leaseUntil": {"$lt": now}},
+                        {"owner": self.owner}
+                    ]
+                },
+                {"$set": {"owner": self.owner, "leaseUntil": now + timedelta(seconds=self.ttl)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Doküman var ama filtreye uymadı: tamamlanmış veya kirada
+            return False
+        return True
+
+    async def complete(self):
+        await self.collection.update_one(
+            {"_id": self.name, "owner": self.owner},
+            {
+                "$set": {"completedVersion": self.version, "completedAt": datetime.utcnow()},
+                "$unset": {"owner": "", "leaseUntil": ""}
+            }
+        )
+
+    async def release(self):
+        """Görev başarısız olduysa kirayı bırak (bir sonraki başlatma tekrar dener)"""
+        await self.collection.update_one(
+            {"_id": self.name, "owner": self.owner},
+            {"$unset": {"owner": "", "leaseUntil": ""}}
+        )
@@ -0,0 +1,191 @@
+"""Önbellekli ve event loop'u bloklamayan Firebase ID token doğrulama.
+
+- Doğrulanmış token'lar, token hash'i ile exp zamanına kadar bellekte tutulur.
+- Google'ın imza sertifikaları bellekte tutulur ve arka planda, Cache-Control
+  max-age süresi dolmadan yenilenir.
+- Sertifika indirme ve imza doğrulama gibi bloklayan işler thread'de çalışır.
+
+Testlerde GoogleCertificateSource yerine StaticKeySource ile yerel bir anahtar
+seti verilebilir.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import requests
+from google.auth import jwt as google_jwt
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+
+
+class TokenVerificationError(Exception):
+    pass
+
+
+class GoogleCertificateSource:
+    """Google'ın securetoken imza sertifikalarını indirir"""
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        """(sertifikalar, max_age_saniye) döndürür - bloklayan çağrı"""
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else 3600
+        return response.json(), max_age
+
+
+class StaticKeySource:
+    """Sabit anahtar seti (kid -> PEM sertifika/public key), testler için"""
+
+    def __init__(self, certs: Dict[str, str], max_age: int = 3600):
+        self.certs = dict(certs)
+        self.max_age = max_age
+
+    def fetch(self):
+        return dict(self.certs), self.max_age
+
+
+class TokenVerifier:
+    def __init__(self, project_id: str, key_source=None, cache_size: int = 10000,
+                 refresh_margin: int = 300, clock_skew: int = 5):
+        self.project_id = project_id
+        self.issuer = f"https://securetoken.google.com/{project_id}"
+        self.key_source = key_source or GoogleCertificateSource()
+        self.cache_size = cache_size
+        self.refresh_margin = refresh_margin
+        self.clock_skew = clock_skew
+
+        self._token_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._certs: Dict[str, str] = {}
+        self._certs_expire_at = 0.0
+        self._certs_fetched_at = 0.0
+        self._certs_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    # ---------- sertifikalar ----------
+
+    async def _fetch_certificates(self) -> int:
+        certs, max_age = await asyncio.to_thread(self.key_source.fetch)
+        self._certs = certs
+        self._certs_fetched_at = time.time()
+        self._certs_expire_at = self._certs_fetched_at + max_age
+        return max_age
+
+    async def refresh_certificates(self) -> int:
+        """Sertifikaları thread'de indir ve bellekteki seti değiştir"""
+        async with self._certs_lock:
+            return await self._fetch_certificates()
+
+    async def _get_certificates(self, force: bool = False) -> Dict[str, str]:
+        if force or not self._certs or time.time() >= self._certs_expire_at:
+            seen_expire_at = self._certs_expire_at
+            async with self._certs_lock:
+                # Beklerken başka bir istek yenilediyse tekrar indirme
+                if self._certs_expire_at == seen_expire_at:
+                    await self._fetch_certificates()
+        return self._certs
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                max_age = await self.refresh_certificates()
+                delay = max(max_age - self.refresh_margin, 60)
+            except Exception as e:
+                logger.error(f"Firebase sertifikaları yenilenemedi: {type(e).__name__}")
+                delay = 60
+            await asyncio.sleep(delay)
+
+    def start(self):
+        """Arka plan sertifika yenilemesini başlat (startup'ta çağrılır)"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    # ---------- token önbelleği ----------
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[dict]:
+        entry = self._token_cache.get(key)
+        if entry is None:
+            return None
+        decoded, expires_at = entry
+        if time.time() >= expires_at:
+            self._token_cache.pop(key, None)
+            return None
+        self._token_cache.move_to_end(key)
+        return decoded
+
+    def _cache_put(self, key: str, decoded: dict):
+        self._token_cache[key] = (decoded, decoded['exp'])
+        self._token_cache.move_to_end(key)
+        while len(self._token_cache) > self.cache_size:
+            self._token_cache.popitem(last=False)
+
+    def invalidate(self, token: str):
+        self._token_cache.pop(self._token_key(token), None)
+
+    # ---------- doğrulama ----------
+
+    def _decode(self, token: str, certs: Dict[str, str]) -> dict:
+        """İmza, exp/iat ve aud kontrolü - CPU işi, thread'de çalışır"""
+        try:
+            decoded = google_jwt.decode(
+                token, certs=certs, audience=self.project_id,
+                clock_skew_in_seconds=self.clock_skew
+            )
+        except ValueError as e:
+            message = str(e)
+            if 'expired' in message.lower():
+                raise TokenVerificationError("Token has expired")
+            raise TokenVerificationError(f"Invalid token: {message}")
+
+        if decoded.get('iss') != self.issuer:
+            raise TokenVerificationError("Invalid token: wrong issuer")
+        sub = decoded.get('sub')
+        if not isinstance(sub, str) or not sub or len(sub) > 128:
+            raise TokenVerificationError("Invalid token: invalid subject")
+        decoded['uid'] = sub
+        return decoded
+
+    async def verify(self, token: str) -> dict:
+        key = self._token_key(token)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            kid = google_jwt.decode_header(token).get('kid')
+        except ValueError as e:
+            raise TokenVerificationError(f"Invalid token: {e}")
+
+        certs = await self._get_certificates()
+        if kid not in certs and time.time() - self._certs_fetched_at > 60:
+            # Anahtar rotasyonu: sertifikaları zorla yenile (dakikada en fazla bir kez)
+            certs = await self._get_certificates(force=True)
+        if kid not in certs:
+            raise TokenVerificationError("Invalid token: unknown signing key")
+
+        decoded = await asyncio.to_thread(self._decode, token, certs)
+        self._cache_put(key, decoded)
+        return decoded
@@ -0,0 +1,114 @@
+"""Bellek içi "yazıyor" göstergesi.
+
+Socket'ten gelen yazıyor olayları veritabanına dokunmadan burada tutulur:
+- Aynı (kullanıcı, oda) için throttle süresi içindeki tekrarlar yok sayılır.
+- Bir kullanıcı ttl süresince yeni olay göndermezse otomatik düşer.
+- Değişen odalar, her tick'te odadaki tüm yazanları içeren tek bir
+  güncelleme ile yayınlanır; yazan varken refresh aralığıyla tekrarlanır.
+
+Her düğüm yalnızca kendi soketlerindeki yazanları bilir; güncellemeler düğüm
+kimliğiyle gönderilir ve istemci düğümlerin listelerini birleştirir.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class TypingTracker:
+    def __init__(self, publish: Callable[[str, dict], Awaitable[None]], throttle: float = 1.0,
+                 ttl: float = 5.0, tick: float = 0.5, refresh: float = 3.0):
+        self.publish = publish
+        self.throttle = throttle
+        self.ttl = ttl
+        self.tick = tick
+        self.refresh = refresh
+        self.node_id = uuid.uuid4().hex[:12]
+
+        # room_id -> uid -> {"name", "expiresAt", "seenAt"}
+        self._rooms: Dict[str, Dict[str, dict]] = {}
+        self._dirty: Set[str] = set()
+        self._published_at: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start_typing(self, room_id: str, uid: str, name: str) -> bool:
+        """Yazıyor olayını kaydet; throttle ile yok sayıldıysa False döner"""
+        now = time.monotonic()
+        typers = self._rooms.setdefault(room_id, {})
+        entry = typers.get(uid)
+        if entry and now - entry['seenAt'] < self.throttle:
+            return False
+        if entry is None:
+            self._dirty.add(room_id)
+        typers[uid] = {"name": name, "expiresAt": now + self.ttl, "seenAt": now}
+        return True
+
+    def stop_typing(self, room_id: str, uid: str):
+        typers = self._rooms.get(room_id)
+        if typers and typers.pop(uid, None) is not None:
+            self._dirty.add(room_id)
+
+    def remove_user(self, uid: str, rooms=None):
+        """Bağlantı kapandığında kullanıcıyı (verilen) odalardan düşür"""
+        for room_id in list(rooms if rooms is not None else self._rooms):
+            self.stop_typing(room_id, uid)
+
+    def typing_users(self, room_id: str) -> list:
+        return [
+            {"userId": uid, "userName": entry['name']}
+            for uid, entry in self._rooms.get(room_id, {}).items()
+        ]
+
+    def _expire(self, now: float):
+        for room_id, typers in list(self._rooms.items()):
+            for uid in [uid for uid, entry in typers.items() if entry['expiresAt'] <= now]:
+                del typers[uid]
+                self._dirty.add(room_id)
+
+    async def flush(self):
+        """Süresi dolanları düşür ve değişen/yenilenmesi gereken odaları yayınla"""
+        now = time.monotonic()
+        self._expire(now)
+        due = {
+            room_id for room_id, typers in self._rooms.items()
+            if typers and now - self._published_at.get(room_id, 0) >= self.refresh
+        }
+        rooms, self._dirty = self._dirty | due, set()
+
+        for room_id in rooms:
+            users = self.typing_users(room_id)
+            if users:
+                self._published_at[room_id] = now
+            else:
+                self._rooms.pop(room_id, None)
+                self._published_at.pop(room_id, None)
+            await self.publish(room_id, {
+                "roomId": room_id,
+                "node": self.node_id,
+                "users": users,
+                "ttl": self.refresh * 2
+            })
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Yazıyor güncellemesi gönderilemedi: {type(e).__name__}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,105 @@
+"""Parçalı (resumable) yükleme oturumlarının yazma kirası.
+
+Oturum files koleksiyonunda tutulur (status: uploading -> complete). Bir
+parçayı yazan istek, kayıtlı ofset (received) istekteki Upload-Offset ile
+eşleşiyorsa yazma kirasını (writingUntil) kendi token'ıyla (writeToken)
+alır ve gövde akarken kirayı uzatır. Ofset yalnızca kira hâlâ bu isteğe
+aitse ve received değişmemişse ilerletilir; kirası düşmüş yavaş bir istek,
+ardından gelen isteğin yazdıklarının üzerine ofset kaydedemez.
+"""
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+
+from pymongo import ReturnDocument
+
+
+class UploadConflict(Exception):
+    """Ofset uyuşmuyor, yükleme tamamlanmış ya da başka bir istek yazıyor (409)"""
+
+    def __init__(self, detail: str, received: Optional[int] = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.received = received
+
+
+def write_conflict(current: dict, offset: int) -> UploadConflict:
+    """Kirası alınamayan yüklemenin durumuna göre çakışma nedeni"""
+    if current['status'] == 'complete':
+        return UploadConflict("Yükleme zaten tamamlandı")
+    if current['received'] != offset:
+        return UploadConflict("Ofset uyuşmuyor", current['received'])
+    return UploadConflict("Bu yüklemeye başka bir istek yazıyor", current['received'])
+
+
+class UploadSessions:
+    def __init__(self, collection, lease: float = 120.0):
+        self.collection = collection
+        self.lease = lease
+
+    def _until(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease)
+
+    async def begin_write(self, upload_id: str, uid: str, offset: int) -> Optional[dict]:
+        """Yazma kirasını al; yükleme yoksa None, alınamazsa UploadConflict.
+
+        Dönen dokümanın writeToken alanı bu isteğin kira token'ıdır.
+        """
+        now = datetime.utcnow()
+        upload = await self.collection.find_one_and_update(
+            {
+                "id": upload_id,
+                "uploaderId": uid,
+                "status": "uploading",
+                "received": offset,
+                "$or": [{"writingUntil": None}, {"writingUntil": {"$lt": now}}]
+            },
+            {"$set": {"writingUntil": self._until(), "writeToken": uuid.uuid4().hex}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if upload:
+            return upload
+
+        current = await self.collection.find_one(
+            {"id": upload_id, "uploaderId": uid}, {"_id": 0, "received": 1, "status": 1}
+        )
+        if not current:
+            return None
+        raise write_conflict(current, offset)
+
+    async def renew(self, upload_id: str, token: str) -> bool:
+        """Kirayı uzat; kira başka bir isteğe geçtiyse False"""
+        result = await self.collection.update_one(
+            {"id": upload_id, "writeToken": token}, {"$set": {"writingUntil": self._until()}}
+        )
+        return result.matched_count > 0
+
+    async def keep_alive(self, upload_id: str, token: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Parçaları aktarırken kirayı süresinin üçte birinde bir uzat"""
+        renew_at = time.monotonic() + self.lease / 3
+        async for chunk in chunks:
+            if time.monotonic() >= renew_at:
+                if not await self.renew(upload_id, token):
+                    raise UploadConflict("Yazma kirası başka bir isteğe geçti")
+                renew_at = time.monotonic() + self.lease / 3
+            yield chunk
+
+    async def release(self, upload_id: str, token: str):
+        """Ofseti değiştirmeden kirayı bırak (istemci aynı ofsetten tekrar dener)"""
+        await self.collection.update_one(
+            {"id": upload_id, "writeToken": token}, {"$unset": {"writingUntil": "", "writeToken": ""}}
+        )
+
+    async def finish(self, upload_id: str, token: str, offset: int, changes: dict) -> bool:
+        """Yeni ofseti (ve varsa tamamlanma bilgisini) kaydedip kirayı bırak.
+
+        Kira bu isteğe ait değilse veya ofset bu arada değiştiyse hiçbir şey
+        yazılmaz ve False döner.
+        """
+        result = await self.collection.update_one(
+            {"id": upload_id, "writeToken": token, "received": offset},
+            {"$set": changes, "$unset": {"writingUntil": "", "writeToken": ""}}
+        )
+        return result.matched_count > 0
@@ -1,6 +1,7 @@
 import { createContext, useContext, useEffect, useState, useCallback } from 'react';
 import { onAuthStateChanged, signInWithEmailAndPassword, createUserWithEmailAndPassword, signOut as firebaseSignOut } from 'firebase/auth';
 import { auth } from '../lib/firebase';
+import { registerPushToken, unregisterPushToken } from '../lib/pushNotification';
 
 const AuthContext = createContext(undefined);
 
@@ -38,6 +39,8 @@ export const AuthProvider = ({ children }) => {
           setUserProfile(profile);
           localStorage.setItem('userProfile', JSON.stringify(profile));
           setProfileLoading(false);
+          // Token kaydı profil yüklemesini bekletmez
+          registerPushToken(firebaseUser);
           return profile;
         }
       }
@@ -78,6 +81,7 @@ export const AuthProvider = ({ children }) => {
   };
 
   const signOut = async () => {
+    await unregisterPushToken(auth.currentUser);
     await firebaseSignOut(auth);
     setUserProfile(null);
     localStorage.removeItem('userProfile');
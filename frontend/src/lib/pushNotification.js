@@ -33,6 +33,46 @@ export const getFCMToken = async () => {
   }
 };
 
+// Register this device's FCM token with the backend (offline message notifications)
+export const registerPushToken = async (firebaseUser) => {
+  const token = await getFCMToken();
+  if (!token || !firebaseUser) return null;
+
+  try {
+    const idToken = await firebaseUser.getIdToken();
+    await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/devices`, {
+      method: 'POST',
+      headers: {
+        'Authorization': `Bearer ${idToken}`,
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ token, platform: 'web' })
+    });
+    localStorage.setItem('pushToken', token);
+    return token;
+  } catch (error) {
+    console.error('Push token registration error:', error);
+    return null;
+  }
+};
+
+// Remove this device's token before signing out
+export const unregisterPushToken = async (firebaseUser) => {
+  const token = localStorage.getItem('pushToken');
+  if (!token || !firebaseUser) return;
+
+  try {
+    const idToken = await firebaseUser.getIdToken();
+    await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/devices/${encodeURIComponent(token)}`, {
+      method: 'DELETE',
+      headers: { 'Authorization': `Bearer ${idToken}` }
+    });
+  } catch (error) {
+    console.error('Push token removal error:', error);
+  }
+  localStorage.removeItem('pushToken');
+};
+
 // Listen for foreground messages
 export const onForegroundMessage = (callback) => {
   if (!messaging) return () => {};
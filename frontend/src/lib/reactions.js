@@ -0,0 +1,30 @@
+// Tepki değişikliklerini (emoji, userId, delta) yerel mesaj listesine uygular.
+// İdempotenttir: hem HTTP yanıtı hem socket olayı uygulanabilir.
+
+// Sözlük biçimi: { emoji: [uid, ...] } (grup ve özel sohbet)
+export const applyReactionToMap = (reactions, { emoji, userId, delta }) => {
+  const current = reactions && !Array.isArray(reactions) ? reactions : {};
+  const users = current[emoji] || [];
+  const hasReacted = users.includes(userId);
+  if ((delta > 0 && hasReacted) || (delta < 0 && !hasReacted) || !delta) return reactions;
+
+  const next = { ...current };
+  if (delta > 0) {
+    next[emoji] = [...users, userId];
+  } else {
+    next[emoji] = users.filter(uid => uid !== userId);
+    if (next[emoji].length === 0) delete next[emoji];
+  }
+  return next;
+};
+
+// Liste biçimi: [{ emoji, userId, userName }] (alt grup mesajları)
+export const applyReactionToList = (reactions, { emoji, userId, userName, delta }) => {
+  const current = reactions || [];
+  const hasReacted = current.some(r => r.userId === userId && r.emoji === emoji);
+  if ((delta > 0 && hasReacted) || (delta < 0 && !hasReacted) || !delta) return reactions;
+
+  return delta > 0
+    ? [...current, { emoji, userId, userName }]
+    : current.filter(r => !(r.userId === userId && r.emoji === emoji));
+};
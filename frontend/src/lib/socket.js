@@ -0,0 +1,69 @@
+// Socket.IO helper - token ile kimlik doğrulamalı bağlantı ve oda aboneliği
+import io from 'socket.io-client';
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
+// Her (yeniden) bağlantıda güncel Firebase token'ı gönderilir
+export const createSocket = (user) => {
+  const backendUrl = BACKEND_URL?.replace('/api', '') || '';
+  const socket = io(backendUrl, {
+    auth: async (cb) => {
+      const token = await user?.getIdToken();
+      cb({ token });
+    }
+  });
+
+  // Bağlı kaldıkça çevrimiçi görünmek için heartbeat (sunucu ttl'i 75 sn)
+  let heartbeatTimer = null;
+  socket.on('connect', () => {
+    clearInterval(heartbeatTimer);
+    heartbeatTimer = setInterval(() => socket.emit('heartbeat'), 25000);
+  });
+  socket.on('disconnect', () => clearInterval(heartbeatTimer));
+  return socket;
+};
+
+// Odaya katıl - yeniden bağlanıldığında otomatik tekrar katılır
+export const joinRoom = (socket, type, id, onJoined) => {
+  const join = () => {
+    socket.emit('join_room', { type, id }, (ack) => {
+      if (ack?.ok) {
+        onJoined?.();
+      } else {
+        console.error('Odaya katılınamadı:', ack?.error);
+      }
+    });
+  };
+  socket.on('connect', join);
+  if (socket.connected) join();
+};
+
+// Kullanıcıların çevrimiçi durumunu izle - her düğüm kendi bağlantılarını
+// bildirir, herhangi bir düğümde çevrimiçi olan çevrimiçi sayılır
+export const subscribePresence = (socket, uids, onChange) => {
+  const onlineByNode = {};
+  const notify = () => {
+    const online = new Set();
+    Object.values(onlineByNode).forEach(set => set.forEach(uid => online.add(uid)));
+    onChange(online);
+  };
+  const subscribe = () => {
+    // Yanıt tüm düğümlerin o anki durumunu düğüm bazında içerir
+    socket.emit('presence_subscribe', { uids }, (ack) => {
+      if (ack?.ok) {
+        Object.entries(ack.nodes || {}).forEach(([node, online]) => {
+          onlineByNode[node] = new Set(online);
+        });
+        notify();
+      }
+    });
+  };
+  socket.on('presence_update', ({ userId, online, node }) => {
+    if (!uids.includes(userId)) return;
+    const set = onlineByNode[node] || (onlineByNode[node] = new Set());
+    if (online) set.add(userId); else set.delete(userId);
+    notify();
+  });
+  socket.on('connect', subscribe);
+  if (socket.connected) subscribe();
+};
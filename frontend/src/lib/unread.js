@@ -0,0 +1,21 @@
+// Okunmamış sayıları - tüm odalar için tek istek (/api/unread)
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
+export const fetchUnread = async (user) => {
+  const token = await user?.getIdToken();
+  const response = await fetch(`${BACKEND_URL}/api/unread`, {
+    headers: { 'Authorization': `Bearer ${token}` }
+  });
+  if (!response.ok) return { byRoom: {}, byUser: {}, totalUnread: 0 };
+
+  const { rooms, totalUnread } = await response.json();
+  const byRoom = {};
+  const byUser = {};
+  rooms.forEach(room => {
+    byRoom[room.roomId] = room;
+    if (room.type === 'private') byUser[room.otherUserId] = room;
+  });
+  return { byRoom, byUser, totalUnread };
+};
+
+export const formatUnread = (count) => (count > 99 ? '99+' : String(count));
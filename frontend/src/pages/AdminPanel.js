@@ -32,6 +32,7 @@ export default function AdminPanel() {
   const [activeTab, setActiveTab] = useState('dashboard');
   const [dashboard, setDashboard] = useState(null);
   const [users, setUsers] = useState([]);
+  const [usersCursor, setUsersCursor] = useState(null);
   const [communities, setCommunities] = useState([]);
   const [searchQuery, setSearchQuery] = useState('');
   const [selectedCommunity, setSelectedCommunity] = useState(null);
@@ -62,15 +63,18 @@ export default function AdminPanel() {
     }
   };
 
-  const fetchUsers = async () => {
+  const fetchUsers = async (cursor = null) => {
     try {
       const token = await user.getIdToken();
-      const res = await fetch(`${BACKEND_URL}/api/admin/users?search=${searchQuery}`, {
+      const params = new URLSearchParams({ search: searchQuery });
+      if (cursor) params.set('cursor', cursor);
+      const res = await fetch(`${BACKEND_URL}/api/admin/users?${params}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       if (res.ok) {
         const data = await res.json();
-        setUsers(data.users);
+        setUsers(prev => cursor ? [...prev, ...data.users] : data.users);
+        setUsersCursor(data.nextCursor);
       }
     } catch (error) {
       console.error('Kullanıcılar yüklenirken hata:', error);
@@ -350,6 +354,14 @@ export default function AdminPanel() {
                   </DropdownMenu>
                 </div>
               ))}
+              {usersCursor && (
+                <button
+                  onClick={() => fetchUsers(usersCursor)}
+                  className="w-full py-3 text-[#4A90E2] text-sm font-medium"
+                >
+                  Daha fazla göster
+                </button>
+              )}
             </div>
           </div>
         )}
@@ -397,11 +409,11 @@ export default function AdminPanel() {
               {/* Stats */}
               <div className="grid grid-cols-3 gap-3">
                 <div className="bg-[#0e1621] rounded-lg p-3 text-center">
-                  <p className="text-2xl font-bold text-[#4A90E2]">{selectedCommunity.membersList?.length || 0}</p>
+                  <p className="text-2xl font-bold text-[#4A90E2]">{selectedCommunity.memberCount || 0}</p>
                   <p className="text-gray-400 text-sm">Üye</p>
                 </div>
                 <div className="bg-[#0e1621] rounded-lg p-3 text-center">
-                  <p className="text-2xl font-bold text-purple-400">{selectedCommunity.superAdmins?.length || 0}</p>
+                  <p className="text-2xl font-bold text-purple-400">{selectedCommunity.superAdminCount || 0}</p>
                   <p className="text-gray-400 text-sm">Süper Admin</p>
                 </div>
                 <div className="bg-[#0e1621] rounded-lg p-3 text-center">
@@ -3,7 +3,8 @@ import { useParams, useSearchParams, useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
 import { format } from 'date-fns';
 import { tr } from 'date-fns/locale';
-import io from 'socket.io-client';
+import { createSocket, joinRoom } from '../lib/socket';
+import { applyReactionToMap } from '../lib/reactions';
 import { 
   ArrowLeft, Users, Paperclip, Send, Smile, Mic,
   Image as ImageIcon, FileText, MapPin, User, X, Download, Phone, Loader2,
@@ -45,8 +46,8 @@ export default function Chat() {
     fetchMembers();
     fetchPinnedMessages();
     
-    const backendUrl = BACKEND_URL?.replace('/api', '') || '';
-    socketRef.current = io(backendUrl);
+    socketRef.current = createSocket(user);
+    joinRoom(socketRef.current, 'group', id);
     
     socketRef.current.on('new_message', (message) => {
       if (message.groupId === id) {
@@ -60,9 +61,9 @@ export default function Chat() {
       ));
     });
 
-    socketRef.current.on('message_reaction', ({ messageId, reactions }) => {
+    socketRef.current.on('message_reaction', (update) => {
       setMessages(prev => prev.map(m => 
-        m.id === messageId ? { ...m, reactions } : m
+        m.id === update.messageId ? { ...m, reactions: applyReactionToMap(m.reactions, update) } : m
       ));
     });
 
@@ -95,7 +96,7 @@ export default function Chat() {
       
       if (response.ok) {
         const data = await response.json();
-        setMessages(data.reverse());
+        setMessages(data.messages.reverse());
       }
     } catch (error) {
       console.error('Error fetching messages:', error);
@@ -233,9 +234,9 @@ export default function Chat() {
       });
       
       if (response.ok) {
-        const { reactions } = await response.json();
+        const update = await response.json();
         setMessages(prev => prev.map(m => 
-          m.id === messageId ? { ...m, reactions } : m
+          m.id === messageId ? { ...m, reactions: applyReactionToMap(m.reactions, update) } : m
         ));
       }
     } catch (error) {
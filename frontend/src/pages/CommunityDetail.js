@@ -22,6 +22,8 @@ import { Switch } from "../components/ui/switch";
 import { Label } from "../components/ui/label";
 import { toast } from "../hooks/use-toast";
 
+import { fetchUnread, formatUnread } from '../lib/unread';
+
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 
 export default function CommunityDetail() {
@@ -55,9 +57,13 @@ export default function CommunityDetail() {
   const [addAdminDialog, setAddAdminDialog] = useState(false);
   const [communityMembers, setCommunityMembers] = useState([]);
   const [loadingCommunityMembers, setLoadingCommunityMembers] = useState(false);
+  const [unreadByRoom, setUnreadByRoom] = useState({});
 
   useEffect(() => {
     fetchCommunity();
+    fetchUnread(user)
+      .then(({ byRoom }) => setUnreadByRoom(byRoom))
+      .catch(error => console.error('Error fetching unread counts:', error));
   }, [id]);
 
   useEffect(() => {
@@ -88,7 +94,7 @@ export default function CommunityDetail() {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       const data = await res.json();
-      setAnnouncements(data);
+      setAnnouncements(data.messages || []);
     } catch (error) {
       console.error('Duyurular yüklenirken hata:', error);
     }
@@ -102,7 +108,7 @@ export default function CommunityDetail() {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       const data = await res.json();
-      setSubgroupMembers(data);
+      setSubgroupMembers(data.members || []);
     } catch (error) {
       console.error('Üyeler yüklenirken hata:', error);
       toast({ title: "Hata", description: "Üyeler yüklenemedi", variant: "destructive" });
@@ -131,23 +137,12 @@ export default function CommunityDetail() {
     setLoadingCommunityMembers(true);
     try {
       const token = await user.getIdToken();
-      // Topluluk üyelerini getir
-      const memberIds = community?.members || [];
-      const members = [];
-      for (const uid of memberIds.slice(0, 50)) {
-        try {
-          const res = await fetch(`${BACKEND_URL}/api/users/${uid}`, {
-            headers: { 'Authorization': `Bearer ${token}` }
-          });
-          if (res.ok) {
-            const userData = await res.json();
-            members.push(userData);
-          }
-        } catch (e) {
-          // Skip failed fetches
-        }
-      }
-      setCommunityMembers(members);
+      // Üye özetlerinin ilk sayfası (tek istek)
+      const res = await fetch(`${BACKEND_URL}/api/communities/${id}/members`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      const data = await res.json();
+      setCommunityMembers(data.members || []);
     } catch (error) {
       console.error('Topluluk üyeleri yüklenirken hata:', error);
     } finally {
@@ -698,6 +693,11 @@ export default function CommunityDetail() {
                           {!subgroup.isPublic && <Lock className="w-3 h-3 text-gray-500" />}
                           {subgroup.isMember && <UserCheck className="w-4 h-4 text-green-500" />}
                           {subgroup.isGroupAdmin && <Crown className="w-4 h-4 text-yellow-500" />}
+                          {unreadByRoom[subgroup.id]?.unreadCount > 0 && (
+                            <span className="min-w-[20px] h-5 px-1.5 bg-[#4A90E2] text-white text-xs font-semibold rounded-full flex items-center justify-center">
+                              {formatUnread(unreadByRoom[subgroup.id].unreadCount)}
+                            </span>
+                          )}
                         </div>
                         {subgroup.description && (
                           <p className="text-sm text-gray-400 truncate">{subgroup.description}</p>
@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
 import { Search, User, Loader2 } from 'lucide-react';
+import { fetchUnread, formatUnread } from '../lib/unread';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 
@@ -10,10 +11,14 @@ export default function Messages() {
   const [users, setUsers] = useState([]);
   const [loading, setLoading] = useState(true);
   const [searchQuery, setSearchQuery] = useState('');
+  const [unreadByUser, setUnreadByUser] = useState({});
   const navigate = useNavigate();
 
   useEffect(() => {
     fetchUsers();
+    fetchUnread(user)
+      .then(({ byUser }) => setUnreadByUser(byUser))
+      .catch(error => console.error('Error fetching unread counts:', error));
   }, []);
 
   const fetchUsers = async () => {
@@ -77,32 +82,41 @@ export default function Messages() {
             <p className="text-gray-400">Kullanıcı bulunamadı</p>
           </div>
         ) : (
-          filteredUsers.map((u) => (
-            <button
-              key={u.uid}
-              onClick={() => openChat(u.uid, `${u.firstName} ${u.lastName}`)}
-              className="w-full flex items-center gap-3 p-3 bg-[#17212b] rounded-xl mb-2 hover:bg-[#1e2c3a] transition-colors"
-              data-testid={`user-item-${u.uid}`}
-            >
-              <div className="relative">
-                {u.profileImageUrl ? (
-                  <img src={u.profileImageUrl} alt="" className="w-12 h-12 rounded-full" />
-                ) : (
-                  <div className="w-12 h-12 bg-green-600 rounded-full flex items-center justify-center">
-                    <span className="text-white font-semibold text-lg">
-                      {u.firstName?.charAt(0)?.toUpperCase()}
-                    </span>
-                  </div>
+          filteredUsers.map((u) => {
+            const chat = unreadByUser[u.uid];
+            return (
+              <button
+                key={u.uid}
+                onClick={() => openChat(u.uid, `${u.firstName} ${u.lastName}`)}
+                className="w-full flex items-center gap-3 p-3 bg-[#17212b] rounded-xl mb-2 hover:bg-[#1e2c3a] transition-colors"
+                data-testid={`user-item-${u.uid}`}
+              >
+                <div className="relative">
+                  {u.profileImageUrl ? (
+                    <img src={u.profileImageUrl} alt="" className="w-12 h-12 rounded-full" />
+                  ) : (
+                    <div className="w-12 h-12 bg-green-600 rounded-full flex items-center justify-center">
+                      <span className="text-white font-semibold text-lg">
+                        {u.firstName?.charAt(0)?.toUpperCase()}
+                      </span>
+                    </div>
+                  )}
+                  <div className="absolute bottom-0 right-0 w-3.5 h-3.5 bg-green-500 rounded-full border-2 border-[#17212b]" />
+                </div>
+                
+                <div className="flex-1 text-left min-w-0">
+                  <p className="text-white font-semibold">{u.firstName} {u.lastName}</p>
+                  <p className="text-gray-500 text-sm truncate">{chat?.lastMessage?.content || u.city}</p>
+                </div>
+
+                {chat?.unreadCount > 0 && (
+                  <span className="min-w-[22px] h-[22px] px-1.5 bg-[#4A90E2] text-white text-xs font-semibold rounded-full flex items-center justify-center">
+                    {formatUnread(chat.unreadCount)}
+                  </span>
                 )}
-                <div className="absolute bottom-0 right-0 w-3.5 h-3.5 bg-green-500 rounded-full border-2 border-[#17212b]" />
-              </div>
-              
-              <div className="flex-1 text-left">
-                <p className="text-white font-semibold">{u.firstName} {u.lastName}</p>
-                <p className="text-gray-500 text-sm">{u.city}</p>
-              </div>
-            </button>
-          ))
+              </button>
+            );
+          })
         )}
       </div>
     </div>
@@ -23,27 +23,35 @@ export default function Posts() {
   const [commentsLoading, setCommentsLoading] = useState(false);
   const [likeAnimations, setLikeAnimations] = useState({});
   const [showPostMenu, setShowPostMenu] = useState(null);
+  // Keyset sayfalama: sonraki sayfanın imleci (null = son sayfa)
+  const [postsCursor, setPostsCursor] = useState(null);
+  const [commentsCursor, setCommentsCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const fileInputRef = useRef(null);
 
   useEffect(() => {
     fetchPosts();
   }, []);
 
-  const fetchPosts = async () => {
+  const fetchPosts = async (cursor = null) => {
+    if (cursor) setLoadingMore(true);
     try {
       const token = await user?.getIdToken();
-      const response = await fetch(`${BACKEND_URL}/api/posts`, {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${BACKEND_URL}/api/posts${query}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       
       if (response.ok) {
         const data = await response.json();
-        setPosts(data);
+        setPosts(prev => cursor ? [...prev, ...data.posts.filter(p => !prev.some(x => x.id === p.id))] : data.posts);
+        setPostsCursor(data.nextCursor);
       }
     } catch (error) {
       console.error('Error fetching posts:', error);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -149,7 +157,7 @@ export default function Posts() {
       
       if (response.ok) {
         const { liked, likeCount } = await response.json();
-        setPosts(posts.map(p => 
+        setPosts(prev => prev.map(p => 
           p.id === postId ? { ...p, isLiked: liked, likeCount } : p
         ));
       }
@@ -165,28 +173,34 @@ export default function Posts() {
     }
   };
 
-  const openComments = async (post) => {
-    setSelectedPost(post);
-    setShowComments(true);
-    setCommentsLoading(true);
-    
+  const fetchComments = async (post, cursor = null) => {
     try {
       const token = await user?.getIdToken();
-      const response = await fetch(`${BACKEND_URL}/api/posts/${post.id}/comments`, {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${BACKEND_URL}/api/posts/${post.id}/comments${query}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       
       if (response.ok) {
         const data = await response.json();
-        setComments(data);
+        setComments(prev => cursor ? [...prev, ...data.comments.filter(c => !prev.some(x => x.id === c.id))] : data.comments);
+        setCommentsCursor(data.nextCursor);
       }
     } catch (error) {
       console.error('Error fetching comments:', error);
-    } finally {
-      setCommentsLoading(false);
     }
   };
 
+  const openComments = async (post) => {
+    setSelectedPost(post);
+    setShowComments(true);
+    setComments([]);
+    setCommentsCursor(null);
+    setCommentsLoading(true);
+    await fetchComments(post);
+    setCommentsLoading(false);
+  };
+
   const addComment = async () => {
     if (!newComment.trim() || !selectedPost) return;
 
@@ -202,11 +216,11 @@ export default function Posts() {
       });
       
       if (response.ok) {
-        const comment = await response.json();
-        setComments([...comments, comment]);
+        const { postCommentCount, ...comment } = await response.json();
+        setComments(prev => [...prev, comment]);
         setNewComment('');
-        setPosts(posts.map(p => 
-          p.id === selectedPost.id ? { ...p, commentCount: p.commentCount + 1 } : p
+        setPosts(prev => prev.map(p => 
+          p.id === selectedPost.id ? { ...p, commentCount: postCommentCount ?? p.commentCount + 1 } : p
         ));
       }
     } catch (error) {
@@ -224,7 +238,7 @@ export default function Posts() {
       
       if (response.ok) {
         const { liked, likeCount } = await response.json();
-        setComments(comments.map(c => 
+        setComments(prev => prev.map(c => 
           c.id === commentId ? { ...c, isLiked: liked, likeCount } : c
         ));
       }
@@ -242,9 +256,10 @@ export default function Posts() {
       });
       
       if (response.ok) {
-        setComments(comments.filter(c => c.id !== commentId));
-        setPosts(posts.map(p => 
-          p.id === selectedPost?.id ? { ...p, commentCount: Math.max(0, p.commentCount - 1) } : p
+        const { commentCount } = await response.json();
+        setComments(prev => prev.filter(c => c.id !== commentId));
+        setPosts(prev => prev.map(p => 
+          p.id === selectedPost?.id ? { ...p, commentCount: commentCount ?? Math.max(0, p.commentCount - 1) } : p
         ));
       }
     } catch (error) {
@@ -499,6 +514,16 @@ export default function Posts() {
             </article>
           ))
         )}
+        {postsCursor && (
+          <button
+            onClick={() => fetchPosts(postsCursor)}
+            disabled={loadingMore}
+            className="w-full py-3 text-emerald-500 text-sm font-medium flex items-center justify-center gap-2"
+          >
+            {loadingMore && <Loader2 className="w-4 h-4 animate-spin" />}
+            Daha fazla göster
+          </button>
+        )}
       </div>
 
       {/* Click outside to close menu */}
@@ -660,6 +685,14 @@ export default function Posts() {
                     </div>
                   </div>
                 ))}
+                {commentsCursor && (
+                  <button
+                    onClick={() => fetchComments(selectedPost, commentsCursor)}
+                    className="w-full py-2 text-emerald-500 text-sm font-medium"
+                  >
+                    Daha fazla yorum
+                  </button>
+                )}
               </div>
             )}
           </div>
@@ -3,7 +3,8 @@ import { useParams, useSearchParams, useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
 import { format } from 'date-fns';
 import { tr } from 'date-fns/locale';
-import io from 'socket.io-client';
+import { createSocket, joinRoom, subscribePresence } from '../lib/socket';
+import { applyReactionToMap } from '../lib/reactions';
 import { ArrowLeft, Send, Loader2, X, Trash2, Copy, Reply, Pin } from 'lucide-react';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -22,17 +23,19 @@ export default function PrivateChat() {
   const [selectedMessage, setSelectedMessage] = useState(null);
   const [showMessageMenu, setShowMessageMenu] = useState(false);
   const [replyingTo, setReplyingTo] = useState(null);
+  const [isOnline, setIsOnline] = useState(false);
   const messagesEndRef = useRef(null);
   const navigate = useNavigate();
 
   useEffect(() => {
     fetchMessages();
     
-    const backendUrl = BACKEND_URL?.replace('/api', '') || '';
-    const socket = io(backendUrl);
+    const socket = createSocket(user);
     
     const userIds = [user?.uid, id].sort();
     const chatId = `${userIds[0]}_${userIds[1]}`;
+    joinRoom(socket, 'private', chatId);
+    subscribePresence(socket, [id], (online) => setIsOnline(online.has(id)));
     
     socket.on('new_private_message', (message) => {
       if (message.chatId === chatId) {
@@ -46,9 +49,9 @@ export default function PrivateChat() {
       ));
     });
 
-    socket.on('message_reaction', ({ messageId, reactions }) => {
+    socket.on('message_reaction', (update) => {
       setMessages(prev => prev.map(m => 
-        m.id === messageId ? { ...m, reactions } : m
+        m.id === update.messageId ? { ...m, reactions: applyReactionToMap(m.reactions, update) } : m
       ));
     });
 
@@ -68,7 +71,7 @@ export default function PrivateChat() {
       
       if (response.ok) {
         const data = await response.json();
-        setMessages(data.reverse());
+        setMessages(data.messages.reverse());
       }
     } catch (error) {
       console.error('Error fetching messages:', error);
@@ -161,9 +164,9 @@ export default function PrivateChat() {
       });
       
       if (response.ok) {
-        const { reactions } = await response.json();
+        const update = await response.json();
         setMessages(prev => prev.map(m => 
-          m.id === messageId ? { ...m, reactions } : m
+          m.id === messageId ? { ...m, reactions: applyReactionToMap(m.reactions, update) } : m
         ));
       }
     } catch (error) {
@@ -212,7 +215,11 @@ export default function PrivateChat() {
         
         <div className="flex-1">
           <h1 className="text-white font-semibold">{name}</h1>
-          <p className="text-green-500 text-sm">çevrimiçi</p>
+          {isOnline ? (
+            <p className="text-green-500 text-sm">çevrimiçi</p>
+          ) : (
+            <p className="text-gray-500 text-sm">çevrimdışı</p>
+          )}
         </div>
       </div>
 
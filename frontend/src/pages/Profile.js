@@ -17,6 +17,7 @@ export default function Profile() {
   const [profileData, setProfileData] = useState(null);
   const [activeTab, setActiveTab] = useState('posts');
   const [myPosts, setMyPosts] = useState([]);
+  const [postsCursor, setPostsCursor] = useState(null);
   const [myGroups, setMyGroups] = useState([]);
   const [postsLoading, setPostsLoading] = useState(false);
   const [groupsLoading, setGroupsLoading] = useState(false);
@@ -40,18 +41,20 @@ export default function Profile() {
     }
   }, [user]);
 
-  const fetchMyPosts = async () => {
-    setPostsLoading(true);
+  const fetchMyPosts = async (cursor = null) => {
+    if (!cursor) setPostsLoading(true);
     try {
       const token = await user?.getIdToken();
-      const response = await fetch(`${BACKEND_URL}/api/my-posts`, {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${BACKEND_URL}/api/my-posts${query}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       
       if (response.ok) {
-        const posts = await response.json();
-        setMyPosts(posts);
-        setStats(prev => ({ ...prev, posts: posts.length }));
+        const data = await response.json();
+        setMyPosts(prev => cursor ? [...prev, ...data.posts] : data.posts);
+        setPostsCursor(data.nextCursor);
+        if (!cursor) setStats(prev => ({ ...prev, posts: data.total ?? data.posts.length }));
       }
     } catch (error) {
       console.error('Error fetching posts:', error);
@@ -474,15 +477,23 @@ export default function Profile() {
                     <div className="flex items-center gap-6 px-4 py-3 border-t border-[#242f3d]">
                       <div className="flex items-center gap-2 text-gray-400">
                         <Heart className="w-5 h-5" />
-                        <span className="text-sm">{post.likes?.length || 0}</span>
+                        <span className="text-sm">{post.likeCount || 0}</span>
                       </div>
                       <div className="flex items-center gap-2 text-gray-400">
                         <MessageCircle className="w-5 h-5" />
-                        <span className="text-sm">{post.comments?.length || 0}</span>
+                        <span className="text-sm">{post.commentCount || 0}</span>
                       </div>
                     </div>
                   </div>
                 ))}
+                {postsCursor && (
+                  <button
+                    onClick={() => fetchMyPosts(postsCursor)}
+                    className="w-full py-3 text-emerald-500 text-sm font-medium"
+                  >
+                    Daha fazla göster
+                  </button>
+                )}
               </div>
             )}
           </div>
@@ -3,13 +3,15 @@ import { useParams, useNavigate } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
 import { ref, uploadBytes, getDownloadURL } from 'firebase/storage';
 import { storage } from '../lib/firebase';
+import { createSocket, joinRoom } from '../lib/socket';
+import { applyReactionToList } from '../lib/reactions';
 import { 
   ArrowLeft, Send, Loader2, Users, Crown,
   MoreVertical, UserPlus, UserMinus,
   Check, X, Reply, Copy, Forward, Trash2,
   Edit3, Smile, Paperclip, Image,
   FileText, Video, CheckCheck, ChevronDown,
-  File, Music, MessageCircle, Briefcase, MapPin, Mail, Phone
+  File, Music, MessageCircle, Briefcase, MapPin, Mail, Phone, Search
 } from 'lucide-react';
 import {
   DropdownMenu,
@@ -30,6 +32,22 @@ import { Input } from "../components/ui/input";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 
+// Sunucuya yüklenen dosyaların URL'leri göreli (/api/...) döner
+const mediaUrl = (url) => (url && url.startsWith('/') ? `${BACKEND_URL}${url}` : url);
+
+// Arama sonucu alıntısı: sunucunun döndürdüğü eşleşme konumları vurgulanır
+const renderSnippet = ({ text, highlights }) => {
+  const parts = [];
+  let last = 0;
+  highlights.forEach(([start, end]) => {
+    if (start > last) parts.push(text.slice(last, start));
+    parts.push(<mark key={start} className="bg-[#4A90E2]/30 text-white rounded px-0.5">{text.slice(start, end)}</mark>);
+    last = end;
+  });
+  parts.push(text.slice(last));
+  return parts;
+};
+
 // Telegram tarzı emoji listesi
 const QUICK_REACTIONS = ['👍', '👎', '❤️', '🔥', '🥰', '👏', '😁', '🤔', '🤯', '😢', '🎉', '🤮', '💩', '🙏'];
 
@@ -68,22 +86,105 @@ export default function SubGroupChat() {
   const [showMembersDialog, setShowMembersDialog] = useState(false);
   const [members, setMembers] = useState([]);
   const [membersLoading, setMembersLoading] = useState(false);
+  const [membersCursor, setMembersCursor] = useState(null);
+  const [showSearchDialog, setShowSearchDialog] = useState(false);
+  const [searchQuery, setSearchQuery] = useState('');
+  const [searchResults, setSearchResults] = useState([]);
+  const [searchCursor, setSearchCursor] = useState(null);
+  const [searchLoading, setSearchLoading] = useState(false);
   const [selectedProfile, setSelectedProfile] = useState(null);
   const [showProfileCard, setShowProfileCard] = useState(false);
   const messagesEndRef = useRef(null);
   const messagesContainerRef = useRef(null);
   const typingTimeoutRef = useRef(null);
+  const lastTypingSentRef = useRef(0);
+  const socketRef = useRef(null);
+  // Sunucu düğümü başına yazanlar: { node: { users, timer } }
+  const typingByNodeRef = useRef({});
   const inputRef = useRef(null);
   const fileInputRef = useRef(null);
   const imageInputRef = useRef(null);
   const videoInputRef = useRef(null);
   const longPressTimerRef = useRef(null);
+  // Keyset sayfalama imleçleri
+  const olderCursorRef = useRef(null);
+  const latestCursorRef = useRef(null);
+  const hasOlderRef = useRef(false);
+  const loadingOlderRef = useRef(false);
 
   useEffect(() => {
     fetchSubgroup();
     fetchMessages();
-    const interval = setInterval(fetchMessages, 3000);
-    return () => clearInterval(interval);
+
+    // Polling yerine Socket.IO oda aboneliği
+    const socket = createSocket(user);
+    socketRef.current = socket;
+    joinRoom(socket, 'subgroup', id);
+    // Bağlantı koptuysa sadece kaçırılan mesajları al
+    socket.io.on('reconnect', fetchNewMessages);
+
+    socket.on('new_subgroup_message', (message) => {
+      setMessages(prev => prev.some(m => m.id === message.id) ? prev : [...prev, message]);
+    });
+
+    socket.on('message_edited', ({ messageId, content, isEdited, editedAt }) => {
+      setMessages(prev => prev.map(m =>
+        m.id === messageId ? { ...m, content, isEdited, editedAt } : m
+      ));
+    });
+
+    socket.on('message_deleted', ({ messageId }) => {
+      setMessages(prev => prev.map(m =>
+        m.id === messageId ? { ...m, isDeleted: true, deletedForEveryone: true, content: 'Bu mesaj silindi' } : m
+      ));
+    });
+
+    socket.on('message_reaction_update', (update) => {
+      setMessages(prev => prev.map(m =>
+        m.id === update.messageId ? { ...m, reactions: applyReactionToList(m.reactions, update) } : m
+      ));
+    });
+
+    // Diğer üyelerin okundu imleci: o ana kadarki kendi mesajlarımız okundu
+    socket.on('messages_read', ({ userId, lastReadAt }) => {
+      if (userId === user?.uid || !lastReadAt) return;
+      const readAt = new Date(lastReadAt);
+      setMessages(prev => prev.map(m =>
+        m.senderId === user?.uid && m.status !== 'read' && new Date(m.timestamp) <= readAt
+          ? { ...m, status: 'read' } : m
+      ));
+    });
+
+    // Her düğüm odadaki yazanların tamamını periyodik olarak gönderir;
+    // yenilenmeyen liste ttl sonunda düşer
+    const updateTypingUsers = () => {
+      const names = new Set();
+      Object.values(typingByNodeRef.current).forEach(({ users }) => {
+        users.forEach(u => { if (u.userId !== user?.uid) names.add(u.userName); });
+      });
+      setTypingUsers([...names]);
+    };
+
+    socket.on('typing_update', ({ node, users, ttl }) => {
+      const nodes = typingByNodeRef.current;
+      clearTimeout(nodes[node]?.timer);
+      if (users.length === 0) {
+        delete nodes[node];
+      } else {
+        nodes[node] = {
+          users,
+          timer: setTimeout(() => { delete nodes[node]; updateTypingUsers(); }, ttl * 1000)
+        };
+      }
+      updateTypingUsers();
+    });
+
+    return () => {
+      Object.values(typingByNodeRef.current).forEach(({ timer }) => clearTimeout(timer));
+      typingByNodeRef.current = {};
+      socketRef.current = null;
+      socket.disconnect();
+    };
   }, [id]);
 
   useEffect(() => {
@@ -113,6 +214,7 @@ export default function SubGroupChat() {
   const handleScroll = (e) => {
     const { scrollTop, scrollHeight, clientHeight } = e.target;
     setShowScrollButton(scrollHeight - scrollTop - clientHeight > 200);
+    if (scrollTop < 50) loadOlderMessages();
   };
 
   const fetchSubgroup = async () => {
@@ -138,41 +240,76 @@ export default function SubGroupChat() {
       });
       if (res.ok) {
         const data = await res.json();
-        setMessages(data.reverse());
+        olderCursorRef.current = data.beforeCursor;
+        latestCursorRef.current = data.afterCursor;
+        hasOlderRef.current = data.hasMore;
+        setMessages(data.messages.reverse());
       }
     } catch (error) {
       console.error('Mesajlar yüklenirken hata:', error);
     }
   };
 
-  const fetchMembers = async () => {
+  const mergeMessages = (prev, incoming) => {
+    const byId = new Map(prev.map(m => [m.id, m]));
+    incoming.forEach(m => byId.set(m.id, m));
+    return Array.from(byId.values()).sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp));
+  };
+
+  // Son imleçten sonraki yeni mesajlar (delta)
+  const fetchNewMessages = async () => {
+    if (!latestCursorRef.current) return fetchMessages();
+    try {
+      const token = await user.getIdToken();
+      const res = await fetch(`${BACKEND_URL}/api/subgroups/${id}/messages?since=${encodeURIComponent(latestCursorRef.current)}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (res.ok) {
+        const data = await res.json();
+        latestCursorRef.current = data.afterCursor;
+        setMessages(prev => mergeMessages(prev, data.messages));
+        if (data.hasMore) fetchNewMessages();
+      }
+    } catch (error) {
+      console.error('Mesajlar yüklenirken hata:', error);
+    }
+  };
+
+  // Daha eski mesajları getir (geriye sayfalama)
+  const loadOlderMessages = async () => {
+    if (!hasOlderRef.current || loadingOlderRef.current) return;
+    loadingOlderRef.current = true;
+    try {
+      const token = await user.getIdToken();
+      const res = await fetch(`${BACKEND_URL}/api/subgroups/${id}/messages?before=${encodeURIComponent(olderCursorRef.current)}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (res.ok) {
+        const data = await res.json();
+        olderCursorRef.current = data.beforeCursor;
+        hasOlderRef.current = data.hasMore;
+        setMessages(prev => mergeMessages(prev, data.messages));
+      }
+    } catch (error) {
+      console.error('Eski mesajlar yüklenirken hata:', error);
+    } finally {
+      loadingOlderRef.current = false;
+    }
+  };
+
+  const fetchMembers = async (cursor = null) => {
     setMembersLoading(true);
     try {
       const token = await user.getIdToken();
-      // Alt grup üyelerini getir
-      const res = await fetch(`${BACKEND_URL}/api/subgroups/${id}`, {
+      // Üye özetleri sayfa sayfa gelir
+      const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const res = await fetch(`${BACKEND_URL}/api/subgroups/${id}/members${params}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       if (res.ok) {
         const data = await res.json();
-        // Üye detaylarını getir
-        const memberIds = data.members || [];
-        const memberDetails = await Promise.all(
-          memberIds.slice(0, 50).map(async (uid) => {
-            try {
-              const userRes = await fetch(`${BACKEND_URL}/api/user/${uid}`, {
-                headers: { 'Authorization': `Bearer ${token}` }
-              });
-              if (userRes.ok) {
-                return await userRes.json();
-              }
-            } catch (e) {
-              // Ignore member fetch errors
-            }
-            return null;
-          })
-        );
-        setMembers(memberDetails.filter(m => m !== null));
+        setMembers(prev => cursor ? [...prev, ...(data.members || [])] : (data.members || []));
+        setMembersCursor(data.nextCursor || null);
       }
     } catch (error) {
       console.error('Üyeler yüklenirken hata:', error);
@@ -181,6 +318,28 @@ export default function SubGroupChat() {
     }
   };
 
+  const searchMessages = async (cursor = null) => {
+    if (!searchQuery.trim()) return;
+    setSearchLoading(true);
+    try {
+      const token = await user.getIdToken();
+      const params = new URLSearchParams({ scope: 'subgroup', id, q: searchQuery.trim() });
+      if (cursor) params.set('cursor', cursor);
+      const res = await fetch(`${BACKEND_URL}/api/search/messages?${params}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (res.ok) {
+        const data = await res.json();
+        setSearchResults(prev => cursor ? [...prev, ...data.results] : data.results);
+        setSearchCursor(data.nextCursor || null);
+      }
+    } catch (error) {
+      console.error('Mesaj araması başarısız:', error);
+    } finally {
+      setSearchLoading(false);
+    }
+  };
+
   const fetchUserProfile = async (userId) => {
     try {
       const token = await user.getIdToken();
@@ -289,6 +448,8 @@ export default function SubGroupChat() {
       setNewMessage('');
       setReplyingTo(null);
       setShowEmojiPicker(false);
+      if (typingTimeoutRef.current) clearTimeout(typingTimeoutRef.current);
+      lastTypingSentRef.current = 0;
       fetchMessages();
     } catch (error) {
       console.error('Mesaj gönderilirken hata:', error);
@@ -343,13 +504,18 @@ export default function SubGroupChat() {
   const handleReaction = async (messageId, emoji) => {
     try {
       const token = await user.getIdToken();
-      await fetch(`${BACKEND_URL}/api/subgroups/${id}/messages/${messageId}/react`, {
+      const response = await fetch(`${BACKEND_URL}/api/subgroups/${id}/messages/${messageId}/react`, {
         method: 'POST',
         headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
         body: JSON.stringify({ emoji })
       });
       setContextMenu({ show: false, x: 0, y: 0, message: null });
-      fetchMessages();
+      if (response.ok) {
+        const update = await response.json();
+        setMessages(prev => prev.map(m =>
+          m.id === messageId ? { ...m, reactions: applyReactionToList(m.reactions, update) } : m
+        ));
+      }
     } catch (error) {
       console.error('Reaksiyon eklenirken hata:', error);
     }
@@ -429,27 +595,21 @@ export default function SubGroupChat() {
     }
   };
 
-  const handleTyping = useCallback(async () => {
-    try {
-      const token = await user.getIdToken();
-      await fetch(`${BACKEND_URL}/api/subgroups/${id}/typing`, {
-        method: 'POST',
-        headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
-        body: JSON.stringify({ isTyping: true })
-      });
-      if (typingTimeoutRef.current) clearTimeout(typingTimeoutRef.current);
-      typingTimeoutRef.current = setTimeout(async () => {
-        const token = await user.getIdToken();
-        await fetch(`${BACKEND_URL}/api/subgroups/${id}/typing`, {
-          method: 'POST',
-          headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
-          body: JSON.stringify({ isTyping: false })
-        });
-      }, 2000);
-    } catch (error) {
-      // Ignore typing indicator errors
+  // Yazıyor olayı socket üzerinden, saniyede en fazla bir kez gönderilir
+  const handleTyping = useCallback(() => {
+    const socket = socketRef.current;
+    if (!socket) return;
+    const now = Date.now();
+    if (now - lastTypingSentRef.current > 1000) {
+      lastTypingSentRef.current = now;
+      socket.emit('typing', { id, isTyping: true });
     }
-  }, [id, user]);
+    if (typingTimeoutRef.current) clearTimeout(typingTimeoutRef.current);
+    typingTimeoutRef.current = setTimeout(() => {
+      lastTypingSentRef.current = 0;
+      socket.emit('typing', { id, isTyping: false });
+    }, 2000);
+  }, [id]);
 
   const handleLeaveGroup = async () => {
     if (!window.confirm('Gruptan ayrılmak istediğinize emin misiniz?')) return;
@@ -487,8 +647,7 @@ export default function SubGroupChat() {
 
   const getMessageStatus = (msg) => {
     if (msg.senderId !== user.uid) return null;
-    const readCount = msg.readBy?.length || 0;
-    if (readCount > 1) return 'read';
+    if (msg.status === 'read') return 'read';
     if (msg.status === 'delivered' || msg.deliveredTo?.length > 0) return 'delivered';
     return 'sent';
   };
@@ -522,13 +681,13 @@ export default function SubGroupChat() {
   const renderMediaContent = (msg) => {
     if (msg.type === 'image' && msg.fileUrl) {
       return (
-        <a href={msg.fileUrl} target="_blank" rel="noopener noreferrer" className="block mb-1">
-          <img src={msg.fileUrl} alt="Paylaşılan görsel" className="rounded-lg max-w-full max-h-64 object-cover cursor-pointer hover:opacity-90 transition-opacity" />
+        <a href={mediaUrl(msg.fileUrl)} target="_blank" rel="noopener noreferrer" className="block mb-1">
+          <img src={mediaUrl(msg.previewUrl || msg.fileUrl)} loading="lazy" alt="Paylaşılan görsel" className="rounded-lg max-w-full max-h-64 object-cover cursor-pointer hover:opacity-90 transition-opacity" />
         </a>
       );
     }
     if (msg.type === 'video' && msg.fileUrl) {
-      return <div className="mb-1"><video src={msg.fileUrl} controls className="rounded-lg max-w-full max-h-64" /></div>;
+      return <div className="mb-1"><video src={mediaUrl(msg.fileUrl)} poster={mediaUrl(msg.previewUrl)} preload="metadata" controls className="rounded-lg max-w-full max-h-64" /></div>;
     }
     if (msg.type === 'file' && msg.fileUrl) {
       const isAudio = msg.fileMimeType?.startsWith('audio/');
@@ -617,6 +776,10 @@ export default function SubGroupChat() {
               <Users className="w-4 h-4 mr-3 text-gray-400" />
               Üyeleri Gör
             </DropdownMenuItem>
+            <DropdownMenuItem className="text-white hover:bg-white/5 cursor-pointer py-2.5" onClick={() => setShowSearchDialog(true)}>
+              <Search className="w-4 h-4 mr-3 text-gray-400" />
+              Mesajlarda Ara
+            </DropdownMenuItem>
             <DropdownMenuItem className="text-white hover:bg-white/5 cursor-pointer py-2.5" onClick={() => navigate(`/community/${subgroup.communityId}`)}>
               <ArrowLeft className="w-4 h-4 mr-3 text-gray-400" />
               Topluluğa Git
@@ -968,7 +1131,7 @@ export default function SubGroupChat() {
             </DialogTitle>
           </DialogHeader>
           <ScrollArea className="max-h-[60vh]">
-            {membersLoading ? (
+            {membersLoading && members.length === 0 ? (
               <div className="flex items-center justify-center py-8">
                 <Loader2 className="w-6 h-6 text-[#4A90E2] animate-spin" />
               </div>
@@ -990,7 +1153,7 @@ export default function SubGroupChat() {
                     <div className="flex-1 min-w-0">
                       <div className="flex items-center gap-2">
                         <p className="text-white font-medium truncate">{member.firstName} {member.lastName}</p>
-                        {member.isAdmin && <Crown className="w-3.5 h-3.5 text-yellow-500 flex-shrink-0" />}
+                        {member.isGroupAdmin && <Crown className="w-3.5 h-3.5 text-yellow-500 flex-shrink-0" />}
                       </div>
                       {member.profession && (
                         <p className="text-gray-400 text-sm truncate">{member.profession}</p>
@@ -1005,6 +1168,58 @@ export default function SubGroupChat() {
                     )}
                   </div>
                 ))}
+                {membersCursor && (
+                  <Button variant="ghost" className="w-full text-[#4A90E2]" disabled={membersLoading} onClick={() => fetchMembers(membersCursor)}>
+                    {membersLoading ? <Loader2 className="w-4 h-4 animate-spin" /> : 'Daha fazla üye'}
+                  </Button>
+                )}
+              </div>
+            )}
+          </ScrollArea>
+        </DialogContent>
+      </Dialog>
+
+      {/* Search Dialog */}
+      <Dialog open={showSearchDialog} onOpenChange={setShowSearchDialog}>
+        <DialogContent className="bg-[#17212b] border-gray-700 max-w-md max-h-[80vh]">
+          <DialogHeader>
+            <DialogTitle className="text-white flex items-center gap-2">
+              <Search className="w-5 h-5 text-[#4A90E2]" />
+              Mesajlarda Ara
+            </DialogTitle>
+          </DialogHeader>
+          <form onSubmit={(e) => { e.preventDefault(); searchMessages(); }}>
+            <Input
+              value={searchQuery}
+              onChange={(e) => setSearchQuery(e.target.value)}
+              placeholder="Kelime yazın..."
+              className="bg-[#0e1621] border-gray-700 text-white"
+              autoFocus
+            />
+          </form>
+          <ScrollArea className="max-h-[55vh]">
+            {searchLoading && searchResults.length === 0 ? (
+              <div className="flex items-center justify-center py-8">
+                <Loader2 className="w-6 h-6 text-[#4A90E2] animate-spin" />
+              </div>
+            ) : searchResults.length === 0 ? (
+              <p className="text-gray-400 text-center py-8">Sonuç yok</p>
+            ) : (
+              <div className="space-y-2">
+                {searchResults.map((result) => (
+                  <div key={result.id} className="p-3 bg-[#0e1621] rounded-xl">
+                    <div className="flex items-center justify-between gap-2 mb-1">
+                      <p className="text-[#4A90E2] text-sm font-medium truncate">{result.senderName}</p>
+                      <span className="text-gray-500 text-xs flex-shrink-0">{new Date(result.timestamp).toLocaleDateString('tr-TR')}</span>
+                    </div>
+                    <p className="text-gray-300 text-sm break-words">{renderSnippet(result.snippet)}</p>
+                  </div>
+                ))}
+                {searchCursor && (
+                  <Button variant="ghost" className="w-full text-[#4A90E2]" disabled={searchLoading} onClick={() => searchMessages(searchCursor)}>
+                    {searchLoading ? <Loader2 className="w-4 h-4 animate-spin" /> : 'Daha fazla sonuç'}
+                  </Button>
+                )}
               </div>
             )}
           </ScrollArea>
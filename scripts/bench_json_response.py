@@ -0,0 +1,106 @@
+"""100 mesajlık sayfa için JSON yanıt süresi: eski yol (clean_doc +
+jsonable_encoder + JSONResponse) ile MongoJSONResponse karşılaştırması.
+
+Kullanım: python scripts/bench_json_response.py [tekrar]
+"""
+import copy
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from bson import ObjectId  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from fast_json import MongoJSONResponse  # noqa: E402
+
+
+def clean_doc(doc):
+    """Eski yardımcı (karşılaştırma için birebir)"""
+    if doc is None:
+        return None
+    if isinstance(doc, list):
+        return [clean_doc(d) for d in doc]
+    if isinstance(doc, dict):
+        doc.pop('_id', None)
+        for key, value in doc.items():
+            if isinstance(value, datetime):
+                doc[key] = value.isoformat()
+            elif isinstance(value, ObjectId):
+                doc[key] = str(value)
+            elif isinstance(value, dict):
+                doc[key] = clean_doc(value)
+            elif isinstance(value, list):
+                doc[key] = [clean_doc(item) if isinstance(item, dict) else item for item in value]
+        return doc
+    return doc
+
+
+def message(i: int, now: datetime) -> dict:
+    ts = now - timedelta(seconds=i)
+    return {
+        "id": str(uuid.uuid4()),
+        "groupId": "subgroup-community-istanbul-start",
+        "chatId": None,
+        "senderId": f"uid-{i % 7}",
+        "senderName": "Ayşe Yılmaz",
+        "senderProfileImage": "https://ui-avatars.com/api/?name=Ayse",
+        "receiverId": None,
+        "content": "Merhaba, yarınki buluşma saat kaçta? Konum paylaşır mısınız? " * 2,
+        "type": "text",
+        "fileUrl": None,
+        "reactions": [{"emoji": "👍", "userId": f"uid-{j}", "userName": "Mehmet"} for j in range(i % 3)],
+        "isPinned": False,
+        "isDeleted": False,
+        "deletedForEveryone": False,
+        "deletedFor": [],
+        "replyTo": None,
+        "isEdited": i % 10 == 0,
+        "editHistory": [{"content": "eski", "editedAt": ts}] if i % 10 == 0 else [],
+        "editedAt": ts if i % 10 == 0 else None,
+        "status": "sent",
+        "timestamp": ts,
+    }
+
+
+def page() -> dict:
+    now = datetime.utcnow()
+    messages = [message(i, now) for i in range(100)]
+    return {"messages": messages, "hasMore": True, "beforeCursor": "abc", "afterCursor": "def", "readCursor": None}
+
+
+def bench(label: str, render, pages) -> float:
+    start = time.perf_counter()
+    for p in pages:
+        render(p)
+    elapsed = (time.perf_counter() - start) / len(pages) * 1000
+    print(f"{label:<45} {elapsed:7.3f} ms/sayfa")
+    return elapsed
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    new_template = page()
+    # Eski sorgular _id'yi projeksiyonla dışlamıyordu
+    old_template = copy.deepcopy(new_template)
+    for msg in old_template['messages']:
+        msg['_id'] = ObjectId()
+    # İki yol aynı gövdeyi üretmeli
+    assert JSONResponse(jsonable_encoder(clean_doc(copy.deepcopy(old_template)))).body == \
+        MongoJSONResponse(new_template).body
+
+    # clean_doc dokümanı yerinde değiştirdiği için her tur kendi kopyasını alır
+    old_pages = [copy.deepcopy(old_template) for _ in range(repeat)]
+    new_pages = [new_template] * repeat
+
+    old = bench("clean_doc + jsonable_encoder + JSONResponse", lambda p: JSONResponse(jsonable_encoder(clean_doc(p))), old_pages)
+    new = bench("MongoJSONResponse (orjson)", MongoJSONResponse, new_pages)
+    print(f"hızlanma: {old / new:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import asyncio
+
+from file_storage import LocalStorage, parse_byte_range
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def read_all(storage: LocalStorage, key: str, start: int, end: int) -> bytes:
+    return b''.join([chunk async for chunk in storage.read(key, start, end)])
+
+
+def test_parse_byte_range():
+    assert parse_byte_range('bytes=0-99', 1000) == (0, 99)
+    assert parse_byte_range('bytes=500-', 1000) == (500, 999)
+    assert parse_byte_range('bytes=-100', 1000) == (900, 999)
+    # Dosya sonunu aşan bitiş ve sonek kırpılır
+    assert parse_byte_range('bytes=900-5000', 1000) == (900, 999)
+    assert parse_byte_range('bytes=-5000', 1000) == (0, 999)
+
+
+def test_parse_byte_range_invalid():
+    assert parse_byte_range('items=0-1', 1000) is None
+    assert parse_byte_range('bytes=1000-', 1000) is None
+    assert parse_byte_range('bytes=10-5', 1000) is None
+    assert parse_byte_range('bytes=-0', 1000) is None
+    assert parse_byte_range('bytes=a-b', 1000) is None
+    assert parse_byte_range('bytes=-', 1000) is None
+
+
+def test_local_storage_resumes_from_offset(tmp_path):
+    storage = LocalStorage(tmp_path)
+
+    async def run():
+        assert await storage.append('f', 0, chunks(b'hello ', b'wor')) == 9
+        assert await storage.append('f', 9, chunks(b'ld')) == 11
+        return await read_all(storage, 'f', 0, 10)
+
+    assert asyncio.run(run()) == b'hello world'
+
+
+def test_local_storage_truncates_past_offset(tmp_path):
+    """Yarıda kalan yazmanın kayıtlı ofsetin ötesinde bıraktığı veri atılır"""
+    storage = LocalStorage(tmp_path)
+
+    async def run():
+        await storage.append('f', 0, chunks(b'hello', b' stale data'))
+        assert await storage.append('f', 5, chunks(b'!')) == 6
+        return await read_all(storage, 'f', 0, 100)
+
+    assert asyncio.run(run()) == b'hello!'
+    assert (tmp_path / 'f').stat().st_size == 6
+
+
+def test_local_storage_reads_ranges(tmp_path):
+    storage = LocalStorage(tmp_path)
+    data = bytes(range(256)) * 2048  # READ_CHUNK_SIZE'ı aşan 512 KB
+
+    async def run():
+        await storage.append('f', 0, chunks(data))
+        return (
+            await read_all(storage, 'f', 10, 19),
+            await read_all(storage, 'f', 200_000, len(data) - 1),
+            await read_all(storage, 'f', 0, len(data) - 1)
+        )
+
+    head, tail, whole = asyncio.run(run())
+    assert head == data[10:20]
+    assert tail == data[200_000:]
+    assert whole == data
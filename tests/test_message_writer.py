@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from message_writer import MessageWriter
+
+
+class FailingCollection:
+    """insert_many'de verilen BulkWriteError ayrıntılarıyla hata veren koleksiyon"""
+
+    def __init__(self, details):
+        self.details = details
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def insert_many(self, documents, ordered=True):
+        raise BulkWriteError(self.details)
+
+
+def write_batch(details, count=3):
+    writer = MessageWriter(FailingCollection(details), max_batch=count, max_delay=1)
+
+    async def run():
+        return await asyncio.gather(*(writer.insert({"n": n}) for n in range(count)), return_exceptions=True)
+
+    return asyncio.run(run())
+
+
+def test_write_errors_fail_only_their_documents():
+    results = write_batch({"writeErrors": [{"index": 1, "errmsg": "duplicate key"}], "writeConcernErrors": []})
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], RuntimeError)
+
+
+def test_write_concern_errors_fail_the_whole_batch():
+    results = write_batch({
+        "writeErrors": [{"index": 1, "errmsg": "duplicate key"}],
+        "writeConcernErrors": [{"code": 64, "errmsg": "waiting for replication timed out"}]
+    })
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert "duplicate key" in str(results[1])
+    with pytest.raises(RuntimeError, match="onaylanamadı"):
+        raise results[0]
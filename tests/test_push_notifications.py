@@ -0,0 +1,97 @@
+import asyncio
+
+from push_notifications import DEAD, RETRY, SENT, MemoryTransport, NotificationDispatcher
+
+
+class MemoryRegistry:
+    """Cihaz token'larını bellekte tutan kayıt defteri"""
+
+    def __init__(self, tokens):
+        self.tokens = dict(tokens)  # token -> uid
+
+    async def tokens_for(self, uids):
+        return [token for token, uid in self.tokens.items() if uid in uids]
+
+    async def prune(self, tokens):
+        for token in tokens:
+            self.tokens.pop(token, None)
+
+
+async def drain(dispatcher, rounds=50):
+    """Kuyruk ve bekleyen yeniden denemeler bitene kadar bekle"""
+    for _ in range(rounds):
+        await asyncio.sleep(0.01)
+        if dispatcher._queue.empty() and not dispatcher._retry_handles:
+            await asyncio.sleep(0.01)
+            return
+
+
+def run_dispatch(registry, transport, recipients, room_id=None, **kwargs):
+    dispatcher = NotificationDispatcher(registry, transport, retry_delay=0.01, **kwargs)
+
+    async def run():
+        dispatcher.start()
+        dispatcher.notify(recipients, {"title": "Yeni mesaj"}, room_id=room_id)
+        await drain(dispatcher)
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    return dispatcher
+
+
+def test_tokens_are_sent_in_batches():
+    registry = MemoryRegistry({f"t{n}": f"u{n}" for n in range(5)})
+    transport = MemoryTransport()
+    dispatcher = run_dispatch(registry, transport, [f"u{n}" for n in range(5)], batch_size=2)
+
+    assert [len(tokens) for tokens, _ in transport.sent] == [2, 2, 1]
+    assert dispatcher.metrics()[SENT] == 5
+
+
+def test_transient_failures_are_retried():
+    registry = MemoryRegistry({"t1": "u1", "t2": "u2"})
+    transport = MemoryTransport()
+    transport.results["t2"] = RETRY
+    original_send = transport.send
+
+    async def send(tokens, notification):
+        results = await original_send(tokens, notification)
+        transport.results.pop("t2", None)  # İkinci denemede başarılı
+        return results
+
+    transport.send = send
+    dispatcher = run_dispatch(registry, transport, ["u1", "u2"])
+
+    assert [tokens for tokens, _ in transport.sent] == [["t1", "t2"], ["t2"]]
+    assert dispatcher.metrics()[SENT] == 2
+
+
+def test_retries_stop_after_max_retries():
+    registry = MemoryRegistry({"t1": "u1"})
+    transport = MemoryTransport()
+    transport.results["t1"] = RETRY
+    dispatcher = run_dispatch(registry, transport, ["u1"], max_retries=3)
+
+    assert len(transport.sent) == 3
+    assert dispatcher.metrics()["failed"] == 1
+
+
+def test_dead_tokens_are_pruned():
+    registry = MemoryRegistry({"t1": "u1", "t2": "u1"})
+    transport = MemoryTransport()
+    transport.results["t2"] = DEAD
+    run_dispatch(registry, transport, ["u1"])
+
+    assert registry.tokens == {"t1": "u1"}
+
+
+def test_room_viewers_are_skipped():
+    registry = MemoryRegistry({"t1": "u1", "t2": "u2"})
+    transport = MemoryTransport()
+
+    async def active_uids(room_id):
+        return {"u2"}
+
+    run_dispatch(registry, transport, ["u1", "u2"], room_id="room", active_uids=active_uids)
+
+    assert [tokens for tokens, _ in transport.sent] == [["t1"]]
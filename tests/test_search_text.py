@@ -0,0 +1,12 @@
+from search_text import prefix_tokens, search_tokens, tokenize
+
+
+def test_prefix_tokens_match_every_partial_word():
+    prefixes = set(prefix_tokens(search_tokens("Ahmet", "Yılmaz"), 10))
+    assert all(word in prefixes for word in tokenize("ahm yıl"))
+    assert {"a", "ahmet", "yilmaz"} <= prefixes
+
+
+def test_prefix_tokens_are_bounded_but_keep_whole_word():
+    prefixes = prefix_tokens(["karamanoglu"], 4)
+    assert prefixes == ["k", "ka", "kar", "kara", "karamanoglu"]
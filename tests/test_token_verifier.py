@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("google.auth")
+pytest.importorskip("cryptography")
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt
+from google.auth import jwt as google_jwt
+
+import token_verifier
+from token_verifier import StaticKeySource, TokenVerificationError, TokenVerifier
+
+PROJECT_ID = "rehber-test"
+
+
+def rsa_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return private, public
+
+
+PRIVATE_KEY, PUBLIC_KEY = rsa_key()
+OTHER_PRIVATE_KEY, OTHER_PUBLIC_KEY = rsa_key()
+
+
+def make_token(kid="key-1", private_key=PRIVATE_KEY, uid="user-1", lifetime=600):
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "iat": now,
+        "exp": now + lifetime,
+    }
+    return google_jwt.encode(crypt.RSASigner.from_string(private_key, kid), payload).decode()
+
+
+class CountingSource(StaticKeySource):
+    """İndirme sayısını tutan anahtar seti"""
+
+    def __init__(self, certs):
+        super().__init__(certs)
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return super().fetch()
+
+
+def make_verifier(certs=None):
+    source = CountingSource(certs or {"key-1": PUBLIC_KEY})
+    verifier = TokenVerifier(PROJECT_ID, key_source=source)
+    decodes = []
+    decode = verifier._decode
+
+    def counting_decode(token, certs):
+        decodes.append(token)
+        return decode(token, certs)
+
+    verifier._decode = counting_decode
+    return verifier, source, decodes
+
+
+def test_verified_token_is_served_from_cache_until_exp(monkeypatch):
+    verifier, source, decodes = make_verifier()
+    token = make_token()
+
+    async def run():
+        first = await verifier.verify(token)
+        second = await verifier.verify(token)
+        assert first['uid'] == second['uid'] == "user-1"
+        assert len(decodes) == 1 and source.fetches == 1
+
+        # exp anında önbellek kaydı düşer ve token yeniden doğrulanır
+        key = verifier._token_key(token)
+        monkeypatch.setattr(token_verifier.time, "time", lambda: first['exp'])
+        assert verifier._cache_get(key) is None
+        monkeypatch.undo()
+        await verifier.verify(token)
+        assert len(decodes) == 2
+
+    asyncio.run(run())
+
+
+def test_bad_signature_is_rejected():
+    verifier, _, _ = make_verifier()
+    # Bilinen kid ile ama başka bir anahtarla imzalanmış token
+    forged = make_token(private_key=OTHER_PRIVATE_KEY)
+
+    with pytest.raises(TokenVerificationError):
+        asyncio.run(verifier.verify(forged))
+    assert verifier._token_cache == {}
+
+
+def test_unknown_kid_refreshes_certificates():
+    verifier, source, _ = make_verifier()
+
+    async def run():
+        await verifier.verify(make_token())
+        assert source.fetches == 1
+
+        # Anahtar rotasyonu: yeni kid bir dakikadan eski sette yoksa set yenilenir
+        source.certs["key-2"] = OTHER_PUBLIC_KEY
+        verifier._certs_fetched_at -= 120
+        decoded = await verifier.verify(make_token(kid="key-2", private_key=OTHER_PRIVATE_KEY, uid="user-2"))
+        assert decoded['uid'] == "user-2"
+        assert source.fetches == 2
+
+        # Son bir dakikada yenilendiyse bilinmeyen kid için tekrar indirilmez
+        with pytest.raises(TokenVerificationError):
+            await verifier.verify(make_token(kid="key-3"))
+        assert source.fetches == 2
+
+    asyncio.run(run())
@@ -0,0 +1,67 @@
+import pytest
+
+from file_links import FileLinkSigner
+from uploads import UploadConflict, write_conflict
+
+
+def test_offset_mismatch_reports_stored_offset():
+    conflict = write_conflict({"status": "uploading", "received": 1024}, 512)
+    assert isinstance(conflict, UploadConflict)
+    assert conflict.detail == "Ofset uyuşmuyor"
+    # İstemci Upload-Offset başlığındaki ofsetten devam eder
+    assert conflict.received == 1024
+
+
+def test_concurrent_writer_conflict():
+    conflict = write_conflict({"status": "uploading", "received": 512}, 512)
+    assert conflict.detail == "Bu yüklemeye başka bir istek yazıyor"
+    assert conflict.received == 512
+
+
+def test_completed_upload_conflict():
+    conflict = write_conflict({"status": "complete", "received": 2048}, 2048)
+    assert conflict.detail == "Yükleme zaten tamamlandı"
+    assert conflict.received is None
+
+
+def test_signed_link_round_trip():
+    signer = FileLinkSigner('test-secret', ttl=60)
+    url = signer.sign('/api/files/abc', now=1000)
+    path, _, query = url.partition('?')
+    params = dict(pair.split('=') for pair in query.split('&'))
+    expires, signature = int(params['expires']), params['signature']
+
+    assert path == '/api/files/abc'
+    # Son geçerlilik ttl'lik pencereye yuvarlanır: en az ttl, en çok 2 * ttl
+    assert expires == 1080
+    assert signer.sign('/api/files/abc', now=1019) == url
+    assert signer.remaining(path, expires, signature, now=1010) == 70
+    # Süresi dolmuş, başka yola ait veya değiştirilmiş bağlantılar reddedilir
+    assert signer.remaining(path, expires, signature, now=1080) is None
+    assert signer.remaining('/api/files/other', expires, signature, now=1010) is None
+    assert signer.remaining(path, expires + 3600, signature, now=1010) is None
+    assert signer.remaining(path, None, None) is None
+
+
+def test_signing_requires_a_key():
+    with pytest.raises(RuntimeError):
+        FileLinkSigner().sign('/api/files/abc')
+
+
+def test_sign_fields_signs_only_local_file_paths():
+    signer = FileLinkSigner('test-secret', ttl=60)
+    thumb = '/api/media/' + 'a' * 64 + '/thumb'
+    doc = {
+        "content": thumb,
+        "thumbnailUrl": thumb,
+        "fileUrl": "https://example.com/a.png",
+        "reactions": [{"senderProfileImage": "/api/files/123e4567-e89b-12d3-a456-426614174000"}]
+    }
+    signed = signer.sign_fields([doc])[0]
+
+    assert signed['content'] == thumb
+    assert signed['thumbnailUrl'].startswith(thumb + '?expires=')
+    assert signed['fileUrl'] == doc['fileUrl']
+    assert '?expires=' in signed['reactions'][0]['senderProfileImage']
+    # Saklanan doküman değişmez
+    assert doc['thumbnailUrl'] == thumb